@@ -3,7 +3,7 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.contrib import messages
 from django.db.models import Count
-from .models import Usuario, Corredor, Calificacion, Factor, Archivocarga, Reporte, Auditoria, Permiso, UsuarioPermiso, CalificacionFactor
+from .models import Usuario, Corredor, Calificacion, Factor, Archivocarga, Reporte, Auditoria, Permiso, UsuarioPermiso, CalificacionFactor, TrabajoCarga, SubidaFragmentada, PlantillaPdf
 
 # ==================== FILTROS PERSONALIZADOS ====================
 class ConRelacionesFilter(admin.SimpleListFilter):
@@ -352,9 +352,9 @@ class FactorAdmin(admin.ModelAdmin):
 class ArchivocargaAdmin(admin.ModelAdmin):
     list_display = ('id_archivo', 'tipo_archivo', 'fecha_carga', 'estado', 'usuario_link', 'archivo_preview')
     list_filter = ('tipo_archivo', 'estado', 'fecha_carga')
-    search_fields = ('tipo_archivo', 'archivo_url')
+    search_fields = ('tipo_archivo', 'archivo_url', 'hash_sha256')
     list_per_page = 20
-    readonly_fields = ('fecha_carga',)
+    readonly_fields = ('fecha_carga', 'hash_sha256')
     
     def usuario_link(self, obj):
         if obj.fk_id_usuario:
@@ -373,8 +373,65 @@ class ArchivocargaAdmin(admin.ModelAdmin):
         ('Información del Archivo', {
             'fields': ('tipo_archivo', 'estado', 'archivo_url')
         }),
+        ('Resultado', {
+            'fields': ('registros_procesados', 'registros_fallidos', 'resultado'),
+        }),
         ('Metadatos', {
-            'fields': ('fecha_carga', 'fk_id_usuario'),
+            'fields': ('fecha_carga', 'fk_id_usuario', 'hash_sha256'),
+        }),
+    )
+
+
+# ==================== TRABAJO CARGA ADMIN ====================
+@admin.register(TrabajoCarga)
+class TrabajoCargaAdmin(admin.ModelAdmin):
+    list_display = ('id_trabajo', 'carga_link', 'estado', 'intentos', 'worker', 'fecha_creacion', 'fecha_heartbeat')
+    list_filter = ('estado',)
+    search_fields = ('worker', 'ruta_archivo')
+    list_per_page = 20
+    readonly_fields = ('fecha_creacion', 'fecha_inicio', 'fecha_heartbeat', 'fecha_fin')
+    
+    def carga_link(self, obj):
+        url = reverse('admin:NuamApp_archivocarga_change', args=[obj.fk_id_archivo_id])
+        return format_html('<a href="{}">Carga #{}</a>', url, obj.fk_id_archivo_id)
+    carga_link.short_description = "Carga"
+
+
+# ==================== SUBIDA FRAGMENTADA ADMIN ====================
+@admin.register(SubidaFragmentada)
+class SubidaFragmentadaAdmin(admin.ModelAdmin):
+    list_display = ('id_subida', 'nombre_archivo', 'tipo_archivo', 'tamano_total', 'estado', 'fk_id_usuario', 'fecha_actualizacion')
+    list_filter = ('estado', 'tipo_archivo')
+    search_fields = ('nombre_archivo',)
+    list_per_page = 20
+    readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'ruta_temporal', 'hash_sha256')
+
+
+# ==================== PLANTILLA PDF ADMIN ====================
+@admin.register(PlantillaPdf)
+class PlantillaPdfAdmin(admin.ModelAdmin):
+    list_display = ('id_plantilla', 'nombre', 'corredor_link', 'encabezado', 'pagina_inicio', 'pagina_fin', 'activa')
+    list_filter = ('activa',)
+    search_fields = ('nombre', 'encabezado', 'fk_id_corredor__nombre')
+    list_editable = ('activa',)
+    list_per_page = 20
+    raw_id_fields = ('fk_id_corredor',)
+
+    def corredor_link(self, obj):
+        url = reverse('admin:NuamApp_corredor_change', args=[obj.fk_id_corredor_id])
+        return format_html('<a href="{}">{}</a>', url, obj.fk_id_corredor.nombre)
+    corredor_link.short_description = "Corredor"
+
+    fieldsets = (
+        ('Plantilla', {
+            'fields': ('nombre', 'fk_id_corredor', 'activa')
+        }),
+        ('Tabla', {
+            'fields': ('encabezado', 'columnas', 'formato_fecha'),
+        }),
+        ('Ubicación en el PDF', {
+            'fields': ('area', 'bordes_columnas', 'pagina_inicio', 'pagina_fin'),
+            'description': 'Coordenadas en puntos desde la esquina superior izquierda de la página.',
         }),
     )
 
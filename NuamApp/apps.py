@@ -10,6 +10,7 @@ class NuamappConfig(AppConfig):
     name = 'NuamApp'
 
     def ready(self):
+        from . import estadisticas_utils  # noqa: F401 (conecta las señales de los resúmenes del dashboard)
         from django.contrib.auth.models import User
         if not User.objects.filter(username='admin').exists():
             User.objects.create_superuser(
@@ -0,0 +1,644 @@
+# NuamApp/carga_utils.py
+import codecs
+import csv
+import io
+import os
+import time
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+from functools import partial
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction, DatabaseError
+from .models import Calificacion, Corredor, Factor
+from .estadisticas_utils import contar_calificaciones, sumar_calificaciones
+from .pdf_utils import CAMPOS_CALIFICACION_PDF, resumir_omitidas
+from .parse_utils import parsear_lote, parsear_fechas, parsear_montos, parsear_anos, parsear_enteros
+from .xlsx_utils import LectorXlsx, es_xlsx, leer_encabezados_xlsx
+
+# ========== LECTURA DE CSV EN STREAMING ==========
+
+CSV_BLOQUE_INICIAL = 64 * 1024  # 64KB para detectar encoding y delimitador
+DELIMITADORES_CSV = (',', ';', '\t')
+
+def _detectar_encoding(bloque):
+    """Detecta el encoding a partir del BOM o de los primeros bytes"""
+    if bloque.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if bloque.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # final=False tolera un carácter multibyte cortado al final del bloque
+        codecs.getincrementaldecoder('utf-8')().decode(bloque, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        # Exportaciones de Excel en Windows
+        return 'cp1252'
+
+def _detectar_delimitador(texto):
+    """Elige el delimitador más frecuente en la línea de encabezados"""
+    lineas = texto.splitlines()
+    encabezado = lineas[0] if lineas else ''
+    # Ante empate (o ningún delimitador) gana la coma
+    return max(DELIMITADORES_CSV, key=encabezado.count)
+
+def _normalizar_columna(nombre):
+    """Quita BOM y espacios de un nombre de columna"""
+    return nombre.strip().replace('\ufeff', '')
+
+def _detectar_formato(binario):
+    """Lee el primer bloque y retorna (encoding, delimitador, texto_decodificado)"""
+    binario.seek(0)
+    bloque = binario.read(CSV_BLOQUE_INICIAL)
+    binario.seek(0)
+
+    encoding = _detectar_encoding(bloque)
+    texto = codecs.getincrementaldecoder(encoding)(errors='replace').decode(bloque)
+    return encoding, _detectar_delimitador(texto), texto
+
+def leer_encabezados(archivo):
+    """Retorna las columnas del CSV (o XLSX) leyendo solo el primer bloque"""
+    binario = getattr(archivo, 'file', archivo)
+    if es_xlsx(binario):
+        return leer_encabezados_xlsx(binario)
+    _, delimiter, texto = _detectar_formato(binario)
+    encabezado = next(csv.reader(io.StringIO(texto), delimiter=delimiter), [])
+    return [_normalizar_columna(fn) for fn in encabezado]
+
+def abrir_csv(archivo):
+    """
+    Abre un archivo subido como csv.DictReader sin cargarlo entero en memoria.
+
+    El encoding (BOM incluido) y el delimitador se detectan sobre el primer
+    bloque; luego el archivo se decodifica de forma incremental y las filas
+    se entregan a medida que se leen. Los nombres de columna se normalizan.
+    """
+    binario = getattr(archivo, 'file', archivo)
+    encoding, delimiter, _ = _detectar_formato(binario)
+
+    stream = io.TextIOWrapper(binario, encoding=encoding, errors='replace', newline='')
+    reader = csv.DictReader(stream, delimiter=delimiter)
+    reader.fieldnames = [_normalizar_columna(fn) for fn in (reader.fieldnames or [])]
+    return reader
+
+# Extensiones que aceptan las cargas masivas; el formato real se detecta por contenido
+EXTENSIONES_CARGA = ('.csv', '.xlsx')
+
+def abrir_filas(archivo):
+    """Abre un CSV o un XLSX (detectado por su firma) como lector de filas en streaming"""
+    binario = getattr(archivo, 'file', archivo)
+    if es_xlsx(binario):
+        return LectorXlsx(binario)
+    return abrir_csv(archivo)
+
+# ========== ERRORES POR CARGA ==========
+
+class RegistroErrores:
+    """
+    Colector acotado de las filas con error de una carga.
+
+    Cuenta todos los errores pero guarda como muestra solo los primeros
+    CARGA_ERRORES_MAX_MUESTRAS. Los errores se acumulan en memoria y se
+    escriben una vez por lote (volcar) a errores/carga_<id>.csv, que queda
+    enlazado en Archivocarga.ruta_errores.
+    """
+
+    def __init__(self, carga=None, max_muestras=None):
+        self.carga = carga
+        self.max_muestras = max_muestras or getattr(settings, 'CARGA_ERRORES_MAX_MUESTRAS', 1000)
+        self.total = 0
+        self.muestras = 0
+        # Sin carga (validación o carga aún no creada) los errores quedan aquí
+        self.pendientes = []
+        self._archivo_creado = False
+
+    def agregar(self, fila, mensaje):
+        self.total += 1
+        if self.muestras + len(self.pendientes) < self.max_muestras:
+            self.pendientes.append((fila, str(mensaje)[:300]))
+
+    def extend(self, errores):
+        for fila, mensaje in errores:
+            self.agregar(fila, mensaje)
+
+    def volcar(self):
+        """Escribe los errores pendientes al reporte de la carga (sin carga, solo los descarta)"""
+        if not self.pendientes or self.carga is None:
+            return
+        ruta = f"errores/carga_{self.carga.id_archivo}.csv"
+        ruta_local = default_storage.path(ruta)
+        os.makedirs(os.path.dirname(ruta_local), exist_ok=True)
+
+        # El primer volcado reemplaza el reporte de un intento anterior
+        with open(ruta_local, 'a' if self._archivo_creado else 'w', newline='', encoding='utf-8') as destino:
+            writer = csv.writer(destino)
+            if not self._archivo_creado:
+                writer.writerow(['fila', 'error'])
+            writer.writerows(self.pendientes)
+
+        self.muestras += len(self.pendientes)
+        self.pendientes = []
+        if not self._archivo_creado:
+            self._archivo_creado = True
+            self.carga.ruta_errores = ruta
+            type(self.carga).objects.filter(pk=self.carga.pk).update(ruta_errores=ruta)
+
+# ========== INSERCIÓN POR LOTES ==========
+
+def get_batch_size():
+    """Tamaño de lote configurado para las cargas masivas"""
+    return getattr(settings, 'CARGA_BATCH_SIZE', 1000)
+
+def _insertar_lote(lote, errores):
+    """Inserta un lote con bulk_create; si la BD lo rechaza, aísla las filas malas"""
+    modelo = type(lote[0][1])
+    try:
+        with transaction.atomic():
+            modelo.objects.bulk_create([obj for _, obj in lote])
+            if modelo is Calificacion:
+                # bulk_create no dispara señales; fila a fila (abajo) sí
+                sumar_calificaciones(contar_calificaciones(obj for _, obj in lote))
+        return len(lote)
+    except DatabaseError:
+        pass
+
+    # Reintentar fila a fila (cada una en su savepoint) para no perder el lote completo
+    insertados = 0
+    for row_num, obj in lote:
+        obj.pk = None
+        obj._state.adding = True
+        try:
+            with transaction.atomic():
+                obj.save()
+            insertados += 1
+        except DatabaseError as e:
+            errores.append((row_num, str(e)))
+    return insertados
+
+def cargar_por_lotes(filas, construir_lote, batch_size=None, al_completar_lote=None, insertar_lote=_insertar_lote,
+                     registro_errores=None):
+    """
+    Construye instancias sin guardar y las inserta por lotes con bulk_create.
+
+    `filas` entrega tuplas (row_num, row). `construir_lote(lote)` recibe
+    hasta batch_size de esas tuplas, parsea las columnas de una vez y
+    retorna (objetos, errores) como listas de (row_num, instancia) y
+    (row_num, mensaje). Cada lote se confirma en su propia transacción,
+    así el avance queda visible para la cola de cargas; las filas con error
+    van a `registro_errores` (un RegistroErrores) en vez de abortar y se
+    vuelcan al reporte al cerrar cada lote. `al_completar_lote(procesados,
+    fallidos)` se llama tras cada lote. `insertar_lote(objetos, errores)`
+    reemplaza al bulk_create por defecto y retorna cuántas filas quedaron
+    guardadas; si además tiene un método cerrar(errores) (IngestaCopy) se
+    llama al terminar y retorna cuántas de esas filas terminaron fallando.
+
+    Retorna (registros_procesados, registros_fallidos, registro_errores).
+    """
+    batch_size = batch_size or get_batch_size()
+    registro_errores = registro_errores or RegistroErrores()
+    registros_procesados = 0
+
+    for lote in _en_lotes(filas, batch_size):
+        objetos, errores_lote = construir_lote(lote)
+        if objetos:
+            registros_procesados += insertar_lote(objetos, errores_lote)
+        registro_errores.extend(errores_lote)
+        registro_errores.volcar()
+        if al_completar_lote:
+            al_completar_lote(registros_procesados, registro_errores.total)
+
+    cerrar = getattr(insertar_lote, 'cerrar', None)
+    if cerrar:
+        errores_cierre = []
+        registros_procesados -= cerrar(errores_cierre)
+        registro_errores.extend(errores_cierre)
+        registro_errores.volcar()
+        if al_completar_lote:
+            al_completar_lote(registros_procesados, registro_errores.total)
+
+    return registros_procesados, registro_errores.total, registro_errores
+
+def _en_lotes(filas, batch_size):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= batch_size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+# ========== INGESTA CON COPY (POSTGRESQL) ==========
+
+# Con CARGA_INGESTA_COPY las calificaciones de los CSV no pasan por
+# INSERT ... VALUES: cada lote se envía con COPY ... FROM STDIN a una tabla
+# temporal que vive toda la carga, y al final se pasa a `calificacion` con
+# un solo INSERT ... SELECT. En SQLite (u otra BD sin COPY) se usa el
+# bulk_create de siempre.
+
+def copy_disponible():
+    """True si la ingesta por COPY está activada y la BD es PostgreSQL"""
+    return getattr(settings, 'CARGA_INGESTA_COPY', False) and connection.vendor == 'postgresql'
+
+def _valor_copy(valor):
+    """Formato de texto de COPY: \\N para NULL y escape de separadores"""
+    if valor is None:
+        return '\\N'
+    return (str(valor).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def _copiar_a_staging(cursor, staging, columnas, filas):
+    """Envía las filas por COPY con el driver que esté instalado (psycopg 3 o psycopg2)"""
+    sql = f"COPY {staging} ({', '.join(columnas)}) FROM STDIN"
+    crudo = cursor.cursor
+    if hasattr(crudo, 'copy'):
+        with crudo.copy(sql) as copy:
+            for fila in filas:
+                copy.write('\t'.join(fila) + '\n')
+    else:
+        buffer = io.StringIO()
+        for fila in filas:
+            buffer.write('\t'.join(fila) + '\n')
+        buffer.seek(0)
+        crudo.copy_expert(sql, buffer)
+
+class IngestaCopy:
+    """
+    Inserción de las calificaciones de una carga por COPY.
+
+    Se usa como `insertar_lote` de cargar_por_lotes (una instancia por
+    carga): el primer lote crea la tabla temporal de staging y cada lote se
+    le envía con COPY, junto a su número de fila. cerrar() la pasa a
+    `calificacion` con un solo INSERT ... SELECT y la elimina; si la BD
+    rechaza ese INSERT se repite fila a fila, cada una en su savepoint, y
+    las rechazadas quedan como errores. Un lote que no entra por COPY se
+    inserta de inmediato con _insertar_lote.
+    """
+
+    def __init__(self):
+        quote = connection.ops.quote_name
+        self.campos = [f for f in Calificacion._meta.concrete_fields if not f.primary_key]
+        self.tabla = quote(Calificacion._meta.db_table)
+        self.staging = quote(f'{Calificacion._meta.db_table}_staging')
+        self.columnas = ', '.join(quote(f.column) for f in self.campos)
+        self.conteo = Counter()
+        self.creada = False
+
+    def _crear_staging(self, cursor):
+        # Una carga anterior que falló antes de cerrar() pudo dejarla en la sesión
+        cursor.execute(f"DROP TABLE IF EXISTS {self.staging}")
+        cursor.execute(f"CREATE TEMP TABLE {self.staging} AS SELECT {self.columnas} FROM {self.tabla} WITH NO DATA")
+        cursor.execute(f"ALTER TABLE {self.staging} ADD COLUMN fila_origen integer")
+
+    def __call__(self, lote, errores):
+        campos = self.campos
+        # La conexión real y no el proxy `connection`, que resuelve la
+        # conexión del hilo en cada acceso (una vez por campo y fila)
+        conexion = connections[connection.alias]
+        filas = (
+            [str(row_num)] + [_valor_copy(f.get_db_prep_save(f.pre_save(obj, True), conexion)) for f in campos]
+            for row_num, obj in lote
+        )
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if not self.creada:
+                    self._crear_staging(cursor)
+                _copiar_a_staging(cursor, self.staging, ['fila_origen', self.columnas], filas)
+        except DatabaseError:
+            return _insertar_lote(lote, errores)
+        self.creada = True
+        self.conteo.update(contar_calificaciones(obj for _, obj in lote))
+        return len(lote)
+
+    def cerrar(self, errores):
+        """Pasa el staging a `calificacion`; retorna cuántas filas de él rechazó la BD"""
+        if not self.creada:
+            return 0
+        rechazadas = 0
+        with connection.cursor() as cursor:
+            try:
+                with transaction.atomic():
+                    cursor.execute(f"INSERT INTO {self.tabla} ({self.columnas}) "
+                                   f"SELECT {self.columnas} FROM {self.staging} ORDER BY fila_origen")
+                    sumar_calificaciones(self.conteo)
+            except DatabaseError:
+                rechazadas = self._insertar_fila_a_fila(cursor, errores)
+            cursor.execute(f"DROP TABLE {self.staging}")
+        self.creada = False
+        return rechazadas
+
+    def _insertar_fila_a_fila(self, cursor, errores):
+        clave = ', '.join(connection.ops.quote_name(Calificacion._meta.get_field(nombre).column)
+                          for nombre in ('fecha_creacion', 'mercado', 'origen'))
+        cursor.execute(f"SELECT fila_origen, {clave} FROM {self.staging} ORDER BY fila_origen")
+        insertadas = []
+        rechazadas = 0
+        for row_num, fecha_creacion, mercado, origen in cursor.fetchall():
+            try:
+                with transaction.atomic():
+                    cursor.execute(f"INSERT INTO {self.tabla} ({self.columnas}) "
+                                   f"SELECT {self.columnas} FROM {self.staging} WHERE fila_origen = %s", [row_num])
+                insertadas.append(Calificacion(fecha_creacion=fecha_creacion, mercado=mercado, origen=origen))
+            except DatabaseError as e:
+                errores.append((row_num, str(e)))
+                rechazadas += 1
+        sumar_calificaciones(contar_calificaciones(insertadas))
+        return rechazadas
+
+def insertador_calificaciones():
+    """Inserción por lote para las calificaciones de una carga según la BD y la configuración"""
+    return IngestaCopy() if copy_disponible() else _insertar_lote
+
+# ========== PROCESAMIENTO POR TIPO DE CARGA ==========
+
+COLUMNAS_REQUERIDAS = {
+    'factores': ['nombre_factor', 'valor_factor', 'fecha_inicio'],
+    'montos': ['fecha', 'mercado', 'ano', 'monto', 'descripcion'],
+    'calificaciones': ['fecha', 'mercado', 'ano', 'descripcion', 'factor_actualizado'],
+}
+
+def _separar_errores(lote, errores):
+    """Retorna las filas válidas (indice, row_num, row) y los errores como (row_num, mensaje)"""
+    validas = [(i, row_num, row) for i, (row_num, row) in enumerate(lote) if i not in errores]
+    return validas, [(lote[i][0], mensaje) for i, mensaje in sorted(errores.items())]
+
+# Reglas equivalentes a CalificacionForm (más los largos de columna del
+# modelo), para que una fila que pasa aquí no falle recién al insertar.
+ANO_MINIMO = 2000
+LARGO_MERCADO = Calificacion._meta.get_field('mercado').max_length
+LARGO_DESCRIPCION = Calificacion._meta.get_field('descripcion').max_length
+_campo_factor = Calificacion._meta.get_field('factor_actualizado')
+LIMITE_FACTOR = Decimal(10) ** (_campo_factor.max_digits - _campo_factor.decimal_places)
+LARGO_NOMBRE_FACTOR = Factor._meta.get_field('nombre_factor').max_length
+
+def validar_calificacion(fecha, ano, monto, mercado, descripcion, columna_monto, hoy=None):
+    """Mensaje de la primera regla de negocio que viola una calificación ya parseada (None si es válida)"""
+    hoy = hoy or date.today()
+    ano_maximo = hoy.year + 1
+    if fecha > hoy:
+        return 'fecha: No se pueden crear calificaciones con fecha futura'
+    if not ANO_MINIMO <= ano <= ano_maximo:
+        return f'ano: El año debe estar entre {ANO_MINIMO} y {ano_maximo}'
+    if fecha.year != ano:
+        return f'ano: El año debe coincidir con la fecha ({fecha.year})'
+    if monto < 0:
+        return f'{columna_monto}: El factor no puede ser negativo'
+    if monto >= LIMITE_FACTOR:
+        return f'{columna_monto}: El factor excede el límite permitido'
+    if not mercado.strip():
+        return 'mercado: Valor vacío'
+    if len(mercado) > LARGO_MERCADO:
+        return f'mercado: Máximo {LARGO_MERCADO} caracteres'
+    if len(descripcion or '') > LARGO_DESCRIPCION:
+        return f'descripcion: Máximo {LARGO_DESCRIPCION} caracteres'
+    return None
+
+def _validar_calificaciones(filas, columnas, columna_monto, errores):
+    """Agrega a `errores` {indice: mensaje} las filas parseadas que violan las reglas de negocio"""
+    hoy = date.today()
+    for i, row in enumerate(filas):
+        if i in errores:
+            continue
+        error = validar_calificacion(columnas['fecha'][i], columnas['ano'][i], columnas[columna_monto][i],
+                                     row.get('mercado') or '', row.get('descripcion'), columna_monto, hoy)
+        if error:
+            errores[i] = error
+
+def _validar_factores(filas, columnas, errores):
+    for i, row in enumerate(filas):
+        if i in errores:
+            continue
+        nombre = (row.get('nombre_factor') or '').strip()
+        if not nombre:
+            errores[i] = 'nombre_factor: Valor vacío'
+        elif len(nombre) > LARGO_NOMBRE_FACTOR:
+            errores[i] = f'nombre_factor: Máximo {LARGO_NOMBRE_FACTOR} caracteres'
+        elif columnas['fecha_fin'][i] < columnas['fecha_inicio'][i]:
+            errores[i] = 'fecha_fin: No puede ser anterior a fecha_inicio'
+
+def _construir_factores(lote):
+    filas = [row for _, row in lote]
+    for row in filas:
+        # Sin columna fecha_fin el factor vence el mismo día que inicia
+        row.setdefault('fecha_fin', row.get('fecha_inicio'))
+    columnas, errores = parsear_lote(filas, {
+        'valor_factor': parsear_enteros,
+        'fecha_inicio': parsear_fechas,
+        'fecha_fin': parsear_fechas,
+    })
+    _validar_factores(filas, columnas, errores)
+    validas, errores = _separar_errores(lote, errores)
+
+    objetos = [
+        (row_num, Factor(
+            nombre_factor=row['nombre_factor'],
+            valor_factor=columnas['valor_factor'][i],
+            fecha_inicio=columnas['fecha_inicio'][i],
+            fecha_fin=columnas['fecha_fin'][i]
+        ))
+        for i, row_num, row in validas
+    ]
+    return objetos, errores
+
+def _upsert_factores(lote, errores, conteo):
+    """
+    Upsert por la clave natural (nombre_factor, fecha_inicio).
+
+    Se consulta una vez qué claves del lote ya existen para clasificar cada
+    fila como insertada, actualizada o sin cambios; las sin cambios no se
+    escriben. El resto va en un solo bulk_create(update_conflicts=True), que
+    además resuelve la carrera con otra carga de las mismas claves.
+    """
+    existentes = {
+        (f.nombre_factor, f.fecha_inicio): (f.valor_factor, f.fecha_fin)
+        for f in Factor.objects.filter(
+            nombre_factor__in={obj.nombre_factor for _, obj in lote},
+            fecha_inicio__in={obj.fecha_inicio for _, obj in lote}
+        )
+    }
+
+    sin_cambios = 0
+    pendientes = {}  # clave -> (objeto, [(row_num, 'insertados'|'actualizados')])
+    for row_num, obj in lote:
+        clave = (obj.nombre_factor, obj.fecha_inicio)
+        valores = (obj.valor_factor, obj.fecha_fin)
+        anterior = existentes.get(clave)
+        if anterior == valores:
+            sin_cambios += 1
+            continue
+        # Si la clave se repite en el archivo, gana la última fila
+        existentes[clave] = valores
+        filas = pendientes[clave][1] if clave in pendientes else []
+        filas.append((row_num, 'insertados' if anterior is None else 'actualizados'))
+        pendientes[clave] = (obj, filas)
+    conteo['sin_cambios'] += sin_cambios
+
+    if not pendientes:
+        return sin_cambios
+
+    opciones = dict(
+        update_conflicts=True,
+        unique_fields=['nombre_factor', 'fecha_inicio'],
+        update_fields=['valor_factor', 'fecha_fin'],
+    )
+    try:
+        with transaction.atomic():
+            Factor.objects.bulk_create([obj for obj, _ in pendientes.values()], **opciones)
+        guardadas = list(pendientes.values())
+    except DatabaseError:
+        # Reintentar clave a clave para aislar la que falla
+        guardadas = []
+        for obj, filas in pendientes.values():
+            obj.pk = None
+            try:
+                with transaction.atomic():
+                    Factor.objects.bulk_create([obj], **opciones)
+                guardadas.append((obj, filas))
+            except DatabaseError as e:
+                errores.extend((row_num, str(e)) for row_num, _ in filas)
+
+    for _, filas in guardadas:
+        for _, tipo in filas:
+            conteo[tipo] += 1
+    return sin_cambios + sum(len(filas) for _, filas in guardadas)
+
+def _construir_calificaciones(lote, corredor, carga, columna_monto, monto_vacio=None):
+    filas = [row for _, row in lote]
+    columnas, errores = parsear_lote(filas, {
+        'fecha': parsear_fechas,
+        'ano': parsear_anos,
+        columna_monto: (parsear_montos, monto_vacio),
+    })
+    _validar_calificaciones(filas, columnas, columna_monto, errores)
+    validas, errores = _separar_errores(lote, errores)
+
+    objetos = [
+        (row_num, Calificacion(
+            fecha=columnas['fecha'][i],
+            mercado=row['mercado'],
+            ano=columnas['ano'][i],
+            descripcion=row['descripcion'],
+            factor_actualizado=columnas[columna_monto][i],
+            fk_id_corredor=corredor,
+            fk_id_archivo=carga
+        ))
+        for i, row_num, row in validas
+    ]
+    return objetos, errores
+
+def guardar_calificaciones_pdf(carga, corredor, datos, al_completar_lote=None):
+    """
+    Inserta por lotes las calificaciones extraídas de un PDF.
+
+    `datos` son las tuplas de pdf_utils.extraer_calificaciones_pdf; cada
+    una se convierte en dict recién al armar su lote y pasa por el mismo
+    parseo por columnas que los CSV (la "fila" del reporte de errores es
+    la posición del registro extraído). Retorna (procesados, fallidos,
+    registro_errores) como cargar_por_lotes.
+    """
+    construir_lote = partial(_construir_calificaciones, corredor=corredor, carga=carga,
+                             columna_monto='factor')
+    filas = ((row_num, dict(zip(CAMPOS_CALIFICACION_PDF, dato))) for row_num, dato in enumerate(datos, start=1))
+    return cargar_por_lotes(filas, construir_lote, al_completar_lote=al_completar_lote,
+                            registro_errores=RegistroErrores(carga))
+
+def cerrar_carga_pdf(carga, procesados, fallidos, omitidas=(), memoria_pico=None):
+    """
+    Deja en la carga (sin guardarla) el resultado de un PDF. Si hubo
+    páginas omitidas por el presupuesto de extracción queda 'parcial'.
+    """
+    carga.estado = 'parcial' if omitidas else 'completado'
+    carga.registros_procesados = procesados
+    carga.registros_fallidos = fallidos
+    carga.paginas_omitidas = len(omitidas)
+    carga.memoria_pico = memoria_pico or None
+    carga.resultado = f'{procesados} registros extraídos del PDF'
+    if omitidas:
+        carga.resultado = f'{carga.resultado}; {resumir_omitidas(omitidas)}'[:500]
+
+def _preparar_lotes(tipo_archivo, usuario, carga=None):
+    """Retorna (construir_lote, insertar_lote, conteo) para un tipo de carga"""
+    if tipo_archivo == 'factores':
+        conteo = {'insertados': 0, 'actualizados': 0, 'sin_cambios': 0}
+        return _construir_factores, partial(_upsert_factores, conteo=conteo), conteo
+
+    corredor = Corredor.objects.get(fk_usuario=usuario)
+    if tipo_archivo == 'montos':
+        construir_lote = partial(_construir_calificaciones, corredor=corredor, carga=carga,
+                                 columna_monto='monto')
+    else:
+        # En calificaciones el factor es opcional (vacío = 0)
+        construir_lote = partial(_construir_calificaciones, corredor=corredor, carga=carga,
+                                 columna_monto='factor_actualizado', monto_vacio=Decimal('0'))
+    return construir_lote, insertador_calificaciones(), None
+
+def _abrir_csv_validado(archivo, tipo_archivo):
+    reader = abrir_filas(archivo)
+    required_columns = COLUMNAS_REQUERIDAS[tipo_archivo]
+    if not all(col in reader.fieldnames for col in required_columns):
+        raise ValueError(f'El CSV debe contener: {", ".join(required_columns)}')
+    return reader
+
+def procesar_archivo(carga, archivo, al_completar_lote=None):
+    """
+    Procesa el CSV de una carga según su tipo_archivo.
+
+    `al_completar_lote(procesados, fallidos, bytes_leidos)` se llama al
+    cerrar cada lote para informar el avance.
+
+    Retorna (procesados, fallidos, registro_errores, resumen). Los
+    factores se cargan en modo upsert y su resumen detalla insertados,
+    actualizados y sin cambios; para el resto resumen es None.
+    """
+    binario = getattr(archivo, 'file', archivo)
+    reader = _abrir_csv_validado(archivo, carga.tipo_archivo)
+    construir_lote, insertar_lote, conteo = _preparar_lotes(carga.tipo_archivo, carga.fk_id_usuario, carga)
+
+    def avance(procesados, fallidos):
+        if al_completar_lote:
+            al_completar_lote(procesados, fallidos, binario.tell())
+
+    procesados, fallidos, errores = cargar_por_lotes(
+        enumerate(reader, start=2), construir_lote,
+        al_completar_lote=avance, insertar_lote=insertar_lote,
+        registro_errores=RegistroErrores(carga)
+    )
+
+    resumen = None
+    if conteo is not None:
+        resumen = (f"{conteo['insertados']} insertados, {conteo['actualizados']} actualizados, "
+                   f"{conteo['sin_cambios']} sin cambios, {fallidos} fallidos")
+    return procesados, fallidos, errores, resumen
+
+# ========== VALIDACIÓN SIN GUARDAR (DRY-RUN) ==========
+
+VALIDACION_MAX_ERRORES = 50
+
+def validar_archivo(tipo_archivo, archivo, usuario, max_errores=VALIDACION_MAX_ERRORES):
+    """
+    Corre el mismo parseo y validación que procesar_archivo sin escribir en la BD.
+
+    Lee el CSV en streaming por lotes y solo guarda los primeros
+    `max_errores` errores, así la memoria no depende del tamaño del archivo.
+    Las restricciones que solo detecta la BD al insertar no se evalúan.
+    Retorna un dict con filas, validas, con_error, errores y segundos.
+    """
+    inicio = time.perf_counter()
+    reader = _abrir_csv_validado(archivo, tipo_archivo)
+    construir_lote, _, _ = _preparar_lotes(tipo_archivo, usuario)
+
+    registro = RegistroErrores(max_muestras=max_errores)
+    validas, con_error, _ = cargar_por_lotes(
+        enumerate(reader, start=2), construir_lote,
+        insertar_lote=lambda objetos, errores: len(objetos),
+        registro_errores=registro
+    )
+    return {
+        'tipo_archivo': tipo_archivo,
+        'filas': validas + con_error,
+        'validas': validas,
+        'con_error': con_error,
+        'errores': registro.pendientes,
+        'segundos': round(time.perf_counter() - inicio, 2),
+    }
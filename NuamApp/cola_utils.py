@@ -0,0 +1,310 @@
+# NuamApp/cola_utils.py
+import hashlib
+import os
+import socket
+import uuid
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import Archivocarga, Auditoria, Calificacion, Corredor, TrabajoCarga
+from .carga_utils import cerrar_carga_pdf, guardar_calificaciones_pdf, procesar_archivo
+from .estadisticas_utils import agrupar_estadisticas
+from .pdf_utils import extraer_calificaciones_pdf
+from .security_utils import sanitize_filename
+
+# ========== ENCOLADO ==========
+
+def identificador_worker():
+    """Identifica al proceso que toma los trabajos (host-pid)"""
+    return f"{socket.gethostname()}-{os.getpid()}"[:100]
+
+def guardar_archivo_carga(archivo):
+    """Guarda el archivo subido en MEDIA_ROOT/cargas y retorna su nombre en el storage"""
+    nombre = f"cargas/{uuid.uuid4().hex}_{sanitize_filename(archivo.name)}"
+    return default_storage.save(nombre, archivo)
+
+def calcular_sha256(archivo):
+    """Calcula la huella SHA-256 del archivo leyéndolo por bloques"""
+    huella = hashlib.sha256()
+    for bloque in archivo.chunks():
+        huella.update(bloque)
+    archivo.seek(0)
+    return huella.hexdigest()
+
+def buscar_carga_previa(usuario, tipo_archivo, hash_sha256):
+    """
+    Retorna la carga más reciente del usuario con el mismo contenido.
+
+    Las cargas en error no cuentan: ese archivo se puede volver a subir.
+    Tampoco las extracciones de PDF que nunca se confirmaron ni los
+    miembros de un ZIP que se omitieron por repetidos.
+    """
+    if not hash_sha256:
+        return None
+    return Archivocarga.objects.filter(
+        fk_id_usuario=usuario,
+        hash_sha256=hash_sha256,
+        tipo_archivo=tipo_archivo
+    ).exclude(estado__in=['error', 'por_confirmar', 'repetido']).order_by('-fecha_carga').first()
+
+def encolar_carga(tipo_archivo, archivo, usuario, hash_sha256=None, padre=None, forzar=False):
+    """
+    Registra la carga y deja un trabajo pendiente en la cola.
+
+    Si CARGAS_ASINCRONAS está desactivado (no hay worker corriendo) el
+    trabajo se procesa de inmediato dentro del mismo request. `padre` es la
+    carga del ZIP cuando el archivo venía dentro de uno; `forzar` (solo en
+    un ZIP) procesa también sus archivos ya cargados.
+    """
+    if hash_sha256 is None:
+        hash_sha256 = calcular_sha256(archivo)
+    ruta = guardar_archivo_carga(archivo)
+    return encolar_archivo_guardado(tipo_archivo, ruta, archivo.name, archivo.size or 0, usuario,
+                                    hash_sha256=hash_sha256, padre=padre, forzar=forzar)
+
+def crear_trabajo(tipo_archivo, ruta, nombre, tamano, usuario, hash_sha256=None, padre=None, forzar=False):
+    """Registra la carga 'pendiente' y su trabajo en la cola; retorna (carga, trabajo)"""
+    with transaction.atomic():
+        carga = Archivocarga.objects.create(
+            tipo_archivo=tipo_archivo,
+            fecha_carga=timezone.now(),
+            estado='pendiente',
+            archivo_url=nombre[:150],
+            fk_id_usuario=usuario,
+            bytes_totales=tamano,
+            hash_sha256=hash_sha256,
+            fk_id_archivo_padre=padre
+        )
+        trabajo = TrabajoCarga.objects.create(fk_id_archivo=carga, ruta_archivo=ruta, forzar_recarga=forzar)
+    return carga, trabajo
+
+def encolar_archivo_guardado(tipo_archivo, ruta, nombre, tamano, usuario, hash_sha256=None, padre=None,
+                             forzar=False):
+    """Como encolar_carga, para un archivo que ya está en el storage (p. ej. una subida fragmentada)"""
+    carga, trabajo = crear_trabajo(tipo_archivo, ruta, nombre, tamano, usuario, hash_sha256=hash_sha256, padre=padre,
+                                   forzar=forzar)
+
+    if not getattr(settings, 'CARGAS_ASINCRONAS', False):
+        # Sin worker nadie más revisa la cola: un request que el servidor
+        # cortó a medio procesar deja su trabajo 'procesando'; se cierra aquí
+        reclamar_trabajos_abandonados(reintentar=False)
+        worker = identificador_worker()
+        trabajo = tomar_trabajo(worker, id_trabajo=trabajo.id_trabajo)
+        if trabajo:
+            carga = ejecutar_trabajo(trabajo)
+            # Un ZIP deja un trabajo por archivo; sin worker también se procesan aquí
+            for id_trabajo in TrabajoCarga.objects.filter(fk_id_archivo__fk_id_archivo_padre=carga,
+                                                          estado='pendiente').values_list('id_trabajo', flat=True):
+                miembro = tomar_trabajo(worker, id_trabajo=id_trabajo)
+                if miembro:
+                    ejecutar_trabajo(miembro)
+            carga.refresh_from_db()
+
+    return carga
+
+# ========== WORKER ==========
+
+def tomar_trabajo(worker, id_trabajo=None):
+    """
+    Reclama el siguiente trabajo pendiente con SELECT ... FOR UPDATE SKIP LOCKED.
+
+    El cambio de estado se hace con un UPDATE condicionado al estado
+    'pendiente', así dos workers nunca toman el mismo trabajo aunque el
+    motor (SQLite) no soporte bloqueo de filas.
+    """
+    with transaction.atomic():
+        pendientes = TrabajoCarga.objects.select_for_update(skip_locked=True).filter(estado='pendiente')
+        if id_trabajo is not None:
+            pendientes = pendientes.filter(id_trabajo=id_trabajo)
+        trabajo = pendientes.order_by('fecha_creacion', 'id_trabajo').first()
+        if trabajo is None:
+            return None
+
+        ahora = timezone.now()
+        tomado = TrabajoCarga.objects.filter(id_trabajo=trabajo.id_trabajo, estado='pendiente').update(
+            estado='procesando',
+            worker=worker,
+            intentos=trabajo.intentos + 1,
+            fecha_inicio=ahora,
+            fecha_heartbeat=ahora,
+        )
+        if not tomado:
+            return None
+        Archivocarga.objects.filter(id_archivo=trabajo.fk_id_archivo_id).update(estado='procesando')
+
+    trabajo.refresh_from_db()
+    return trabajo
+
+def reclamar_trabajos_abandonados(reintentar=True):
+    """
+    Devuelve a la cola los trabajos cuyo worker dejó de dar señales de vida.
+
+    Un trabajo está abandonado si sigue 'procesando' y su heartbeat es más
+    antiguo que CARGA_TRABAJO_TIMEOUT. Lo que alcanzó a insertar el intento
+    anterior se borra para que el reintento no duplique registros. Tras
+    CARGA_TRABAJO_MAX_INTENTOS (o de inmediato con reintentar=False, cuando
+    no hay worker que lo retome) la carga queda en 'error'.
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'CARGA_TRABAJO_TIMEOUT', 300))
+    max_intentos = getattr(settings, 'CARGA_TRABAJO_MAX_INTENTOS', 3)
+    reclamados = 0
+    cerrados = []
+
+    with transaction.atomic():
+        abandonados = TrabajoCarga.objects.select_for_update(skip_locked=True).filter(
+            estado='procesando',
+            fecha_heartbeat__lt=limite
+        )
+        for trabajo in abandonados:
+            with agrupar_estadisticas():
+                Calificacion.objects.filter(fk_id_archivo_id=trabajo.fk_id_archivo_id).delete()
+
+            if not reintentar or trabajo.intentos >= max_intentos:
+                trabajo.estado = 'error'
+                trabajo.error = f'Abandonado por {trabajo.worker} tras {trabajo.intentos} intento(s)'
+                trabajo.fecha_fin = timezone.now()
+                Archivocarga.objects.filter(id_archivo=trabajo.fk_id_archivo_id).update(
+                    estado='error', resultado=trabajo.error
+                )
+                cerrados.append(trabajo.fk_id_archivo_id)
+            else:
+                trabajo.estado = 'pendiente'
+                trabajo.worker = None
+                Archivocarga.objects.filter(id_archivo=trabajo.fk_id_archivo_id).update(
+                    estado='pendiente', registros_procesados=0, registros_fallidos=0, bytes_procesados=0,
+                    ruta_errores=None
+                )
+            trabajo.save()
+            reclamados += 1
+
+    # Un archivo de ZIP que quedó en error puede ser el último que faltaba
+    padres = Archivocarga.objects.filter(id_archivo__in=cerrados, fk_id_archivo_padre__isnull=False)
+    for id_padre in set(padres.values_list('fk_id_archivo_padre_id', flat=True)):
+        resumir_zip(id_padre)
+    return reclamados
+
+def _procesar_csv(trabajo, carga, heartbeat):
+    """CSV o XLSX: inserción por lotes informando el avance"""
+    with default_storage.open(trabajo.ruta_archivo, 'rb') as archivo:
+        procesados, fallidos, _, resumen = procesar_archivo(carga, archivo, al_completar_lote=heartbeat)
+    carga.estado = 'completado'
+    carga.bytes_procesados = carga.bytes_totales
+    carga.registros_procesados = procesados
+    carga.registros_fallidos = fallidos
+    carga.resultado = resumen or f'{procesados} procesados, {fallidos} fallidos'
+    carga.save()
+
+def _procesar_pdf(trabajo, carga, heartbeat):
+    """PDF de un ZIP: se guarda directo, sin pasar por la confirmación"""
+    corredor = Corredor.objects.get(fk_usuario=carga.fk_id_usuario)
+    datos, omitidas, memoria_pico = extraer_calificaciones_pdf(default_storage.path(trabajo.ruta_archivo))
+    heartbeat(0, 0, carga.bytes_totales)
+    procesados, fallidos, _ = guardar_calificaciones_pdf(
+        carga, corredor, datos, al_completar_lote=lambda procesados, fallidos: heartbeat(
+            procesados, fallidos, carga.bytes_totales)
+    )
+    cerrar_carga_pdf(carga, procesados, fallidos, omitidas, memoria_pico)
+    carga.bytes_procesados = carga.bytes_totales
+    carga.save()
+
+def _repartir_zip(trabajo, carga, heartbeat):
+    """ZIP: deja un trabajo por archivo; el resumen se arma con resumir_zip"""
+    from .zip_utils import repartir_zip  # zip_utils usa este módulo
+    repartir_zip(trabajo, heartbeat)
+
+PROCESAR_POR_TIPO = {
+    'zip': _repartir_zip,
+    'pdf_calificaciones': _procesar_pdf,
+}
+
+def ejecutar_trabajo(trabajo):
+    """
+    Procesa el archivo de un trabajo ya tomado y deja la carga completada o
+    en error. Un ZIP solo se reparte en un trabajo por archivo (ver
+    zip_utils.repartir_zip); cada uno actualiza el resumen del ZIP al
+    terminar. Para procesar varios archivos a la vez se corren varios
+    workers: cada uno toma sus trabajos con SKIP LOCKED.
+    """
+    carga = trabajo.fk_id_archivo
+
+    def heartbeat(procesados, fallidos, bytes_leidos):
+        TrabajoCarga.objects.filter(id_trabajo=trabajo.id_trabajo).update(fecha_heartbeat=timezone.now())
+        Archivocarga.objects.filter(id_archivo=carga.id_archivo).update(
+            registros_procesados=procesados,
+            registros_fallidos=fallidos,
+            bytes_procesados=bytes_leidos
+        )
+
+    try:
+        PROCESAR_POR_TIPO.get(carga.tipo_archivo, _procesar_csv)(trabajo, carga, heartbeat)
+    except Exception as e:
+        # Los lotes ya confirmados se borran (como al reclamar un trabajo
+        # abandonado): la carga queda en error y se puede volver a subir
+        with transaction.atomic(), agrupar_estadisticas():
+            Calificacion.objects.filter(fk_id_archivo=carga).delete()
+        # Solo estado y resultado: el avance lo escribió heartbeat en la BD
+        carga.estado = 'error'
+        carga.resultado = f'Error procesando archivo: {str(e)}'[:500]
+        carga.save(update_fields=['estado', 'resultado'])
+        carga.refresh_from_db()
+        trabajo.estado = 'error'
+        trabajo.error = str(e)[:500]
+        trabajo.fecha_fin = timezone.now()
+        trabajo.save(update_fields=['estado', 'error', 'fecha_fin'])
+        if carga.fk_id_archivo_padre_id:
+            resumir_zip(carga.fk_id_archivo_padre_id)
+        return carga
+
+    trabajo.estado = 'completado'
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save(update_fields=['estado', 'fecha_fin'])
+    if carga.tipo_archivo == 'zip':
+        # Ya repartido: queda completado solo si sus archivos ya terminaron
+        carga = resumir_zip(carga.id_archivo)
+
+    Auditoria.objects.create(
+        accion=f'CARGA_{carga.tipo_archivo.upper()}',
+        fecha_hora=timezone.now(),
+        resultado=carga.resultado,
+        fk_usuario=carga.fk_id_usuario
+    )
+    if carga.fk_id_archivo_padre_id:
+        resumir_zip(carga.fk_id_archivo_padre_id)
+    return carga
+
+# ========== RESUMEN DE UN ZIP ==========
+
+ESTADOS_EN_CURSO = ('pendiente', 'procesando')
+
+def resumir_zip(id_padre):
+    """
+    Recalcula el resumen de la carga de un ZIP desde sus archivos. Queda
+    'completado' cuando el ZIP ya se repartió y ninguno sigue en la cola.
+    La fila del ZIP se bloquea para que dos archivos que terminan a la vez
+    no se pisen el resumen.
+    """
+    with transaction.atomic():
+        padre = Archivocarga.objects.select_for_update().get(id_archivo=id_padre)
+        if padre.estado in ('error', 'completado'):
+            return padre
+        conteo = Counter(padre.miembros.values_list('estado', flat=True))
+        totales = padre.miembros.filter(estado__in=['completado', 'parcial']).aggregate(
+            procesados=Sum('registros_procesados'), fallidos=Sum('registros_fallidos'))
+        padre.registros_procesados = totales['procesados'] or 0
+        padre.registros_fallidos = totales['fallidos'] or 0
+        padre.resultado = (
+            f"{sum(conteo.values())} archivos: {conteo['completado']} completados, {conteo['parcial']} parciales, "
+            f"{conteo['pendiente'] + conteo['procesando']} en cola, {conteo['repetido']} repetidos, "
+            f"{conteo['error']} con error"
+        )
+        repartido = TrabajoCarga.objects.filter(fk_id_archivo=padre, estado='completado').exists()
+        if repartido and not any(conteo[estado] for estado in ESTADOS_EN_CURSO):
+            padre.estado = 'completado'
+            padre.bytes_procesados = padre.bytes_totales
+        padre.save(update_fields=['estado', 'resultado', 'registros_procesados', 'registros_fallidos',
+                                  'bytes_procesados'])
+    return padre
@@ -0,0 +1,270 @@
+# NuamApp/confirmacion_utils.py
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import Archivocarga, Calificacion, PlantillaPdf, RegistroExtraidoPdf
+from .carga_utils import LARGO_DESCRIPCION, LIMITE_FACTOR, RegistroErrores, validar_calificacion
+from .estadisticas_utils import sumar_calificaciones
+from .parse_utils import parsear_fecha, parsear_monto
+from .pdf_utils import resumir_descartadas, resumir_omitidas
+
+# Confirmación de los registros extraídos de un PDF:
+#   1. preparar_confirmacion deja los registros en `registro_extraido_pdf`,
+#      colgando de una Archivocarga 'por_confirmar'. La página de
+#      confirmación solo muestra esas filas; no viajan en el formulario.
+#   2. El formulario devuelve los ids seleccionados como rangos ("3-40,42")
+#      y solo las descripciones que el usuario editó.
+#   3. confirmar_registros marca la selección y copia a `calificacion` con
+#      un único INSERT ... SELECT; después se vacía el staging de la carga.
+
+RANGOS_POR_CONSULTA = 200
+
+# ========== PLANTILLAS ==========
+
+def plantillas_pdf(corredor):
+    """PlantillaTabla activas del corredor, en orden de creación; las que no son válidas se ignoran"""
+    plantillas = []
+    for plantilla in PlantillaPdf.objects.filter(fk_id_corredor=corredor, activa=True).order_by('id_plantilla'):
+        try:
+            plantillas.append(plantilla.como_plantilla())
+        except ValueError:
+            continue
+    return plantillas
+
+# ========== STAGING ==========
+
+def _registro_staging(indice, registro):
+    """
+    Arma un RegistroExtraidoPdf (sin guardar) desde una tupla
+    CAMPOS_REGISTRO_PDF y deja en `error` por qué no se podría guardar:
+    las mismas reglas que una calificación de un CSV (validar_calificacion)
+    """
+    fecha_texto, mercado, ano, monto_original, descripcion, pagina = registro
+    mercado = str(mercado).capitalize()[:30]
+    descripcion = (descripcion or '')[:LARGO_DESCRIPCION]
+    error = None
+    try:
+        fecha = parsear_fecha(fecha_texto)
+    except ValueError:
+        fecha = None
+        error = 'fecha: Formato no válido'
+
+    try:
+        ano = int(ano)
+    except (TypeError, ValueError):
+        ano = None
+        error = error or 'ano: Valor vacío o no numérico'
+
+    try:
+        monto_valor = parsear_monto(monto_original)
+    except ValueError as e:
+        monto_valor = None
+        error = error or f'factor: {e}'
+    else:
+        if abs(monto_valor) >= LIMITE_FACTOR:
+            monto_valor = None
+            error = error or 'factor: El factor excede el límite permitido'
+
+    if error is None:
+        error = validar_calificacion(fecha, ano, monto_valor, mercado, descripcion, 'factor')
+
+    return RegistroExtraidoPdf(
+        indice=indice,
+        fecha=fecha,
+        fecha_texto=str(fecha_texto)[:30],
+        mercado=mercado,
+        ano=ano,
+        monto_original=str(monto_original)[:50],
+        monto_valor=monto_valor,
+        descripcion=descripcion,
+        pagina=pagina,
+        error=error,
+    )
+
+def preparar_confirmacion(usuario, nombre_archivo, hash_sha256, registros, omitidas=(), memoria_pico=None,
+                          descartadas=()):
+    """
+    Guarda en staging los registros extraídos de un PDF (tuplas
+    CAMPOS_REGISTRO_PDF), sin duplicados (misma fecha, mercado, año y
+    monto a dos decimales, o el mismo texto si el monto no se parseó).
+
+    Crea la Archivocarga 'por_confirmar' a la que quedan asociados (con
+    las páginas `omitidas` por el presupuesto de extracción, las
+    `descartadas` por el triaje y el pico de memoria de la extracción) y
+    descarta una confirmación pendiente anterior del mismo PDF. Retorna
+    (carga, registros_unicos); sin registros no se crea la carga.
+    """
+    unicos = []
+    visto = set()
+    for registro in registros:
+        staging = _registro_staging(len(unicos) + 1, registro)
+        # Un monto que no se pudo parsear se compara por su texto: si no,
+        # todos los ilegibles de la misma fecha, mercado y año serían uno
+        if staging.monto_valor is None:
+            monto = (None, staging.monto_original)
+        else:
+            monto = (f'{staging.monto_valor:.2f}', None)
+        clave = (staging.fecha, staging.mercado, staging.ano, monto)
+        if clave not in visto:
+            visto.add(clave)
+            unicos.append(staging)
+    if not unicos:
+        return None, 0
+
+    with transaction.atomic():
+        if hash_sha256:
+            Archivocarga.objects.filter(fk_id_usuario=usuario, tipo_archivo='pdf_calificaciones',
+                                        hash_sha256=hash_sha256, estado='por_confirmar').delete()
+        carga = Archivocarga.objects.create(
+            tipo_archivo='pdf_calificaciones',
+            fecha_carga=timezone.now(),
+            estado='por_confirmar',
+            archivo_url=nombre_archivo[:150],
+            fk_id_usuario=usuario,
+            resultado=(f'{len(unicos)} registros extraídos, pendientes de confirmación'
+                       + (f'; {resumir_omitidas(omitidas)}' if omitidas else '')
+                       + (f'; {resumir_descartadas(descartadas)}' if descartadas else ''))[:500],
+            hash_sha256=hash_sha256,
+            paginas_omitidas=len(omitidas),
+            paginas_descartadas=len(descartadas),
+            memoria_pico=memoria_pico or None
+        )
+        for staging in unicos:
+            staging.fk_id_archivo = carga
+        RegistroExtraidoPdf.objects.bulk_create(unicos, batch_size=1000)
+    return carga, len(unicos)
+
+# ========== CONFIRMACIÓN ==========
+
+def parsear_seleccion(texto):
+    """'3-40,42' -> [(3, 40), (42, 42)]; lanza ValueError si el formato no es válido"""
+    rangos = []
+    for parte in (texto or '').split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        inicio, _, fin = parte.partition('-')
+        inicio = int(inicio)
+        fin = int(fin) if fin else inicio
+        if fin < inicio:
+            raise ValueError(f'Rango no válido: {parte}')
+        rangos.append((inicio, fin))
+    return rangos
+
+def _marcar_seleccion(registros, rangos):
+    """Deja seleccionado=True solo en los ids de `rangos` (un UPDATE por bloque de rangos)"""
+    registros.update(seleccionado=False)
+    for i in range(0, len(rangos), RANGOS_POR_CONSULTA):
+        condicion = reduce(or_, (Q(pk__range=rango) for rango in rangos[i:i + RANGOS_POR_CONSULTA]))
+        registros.filter(condicion).update(seleccionado=True)
+
+def _aplicar_descripciones(registros, descripciones):
+    """Guarda las descripciones editadas ({id: texto}); las demasiado largas quedan como error"""
+    if not descripciones:
+        return
+    editados = list(registros.filter(pk__in=descripciones))
+    for registro in editados:
+        texto = descripciones[registro.pk].strip()
+        if len(texto) > LARGO_DESCRIPCION:
+            registro.error = registro.error or f'descripcion: Máximo {LARGO_DESCRIPCION} caracteres'
+        else:
+            registro.descripcion = texto
+    RegistroExtraidoPdf.objects.bulk_update(editados, ['descripcion', 'error'], batch_size=1000)
+
+def _insertar_desde_staging(carga, corredor):
+    """
+    INSERT ... SELECT de los registros seleccionados y válidos (y su suma
+    en EstadisticaCalificacion); retorna cuántos se insertaron
+    """
+    quote = connection.ops.quote_name
+    campo = Calificacion._meta.get_field
+    staging = RegistroExtraidoPdf._meta.get_field
+    momento = timezone.now()
+    ahora = campo('fecha_creacion').get_db_prep_value(momento, connection)
+    columnas = {
+        'fecha': quote(staging('fecha').column),
+        'mercado': quote(staging('mercado').column),
+        'ano': quote(staging('ano').column),
+        'descripcion': quote(staging('descripcion').column),
+        'factor_actualizado': quote(staging('monto_valor').column),
+        'fk_id_archivo': quote(staging('fk_id_archivo').column),
+        'fk_id_corredor': '%s',
+        'secuencia_evento': '%s',
+        'origen': '%s',
+        'fecha_creacion': '%s',
+        'fecha_modificacion': '%s',
+    }
+    parametros = [corredor.pk, campo('secuencia_evento').default, 'pdf', ahora, ahora, carga.pk]
+    sql = (
+        f"INSERT INTO {quote(Calificacion._meta.db_table)} "
+        f"({', '.join(quote(campo(nombre).column) for nombre in columnas)}) "
+        f"SELECT {', '.join(columnas.values())} FROM {quote(RegistroExtraidoPdf._meta.db_table)} "
+        f"WHERE {quote(staging('fk_id_archivo').column)} = %s "
+        f"AND {quote(staging('seleccionado').column)} AND {quote(staging('error').column)} IS NULL"
+    )
+    por_mercado = (RegistroExtraidoPdf.objects.filter(fk_id_archivo=carga, seleccionado=True, error__isnull=True)
+                   .order_by().values_list('mercado').annotate(total=Count('pk')))
+    dia = timezone.localdate(momento)
+    sumar_calificaciones({(dia, mercado, 'pdf'): total for mercado, total in por_mercado})
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return cursor.rowcount
+
+def confirmar_registros(carga, corredor, rangos, descripciones=None):
+    """
+    Guarda como calificaciones los registros en staging cuyos ids caen en
+    `rangos` (ver parsear_seleccion), con las `descripciones` editadas.
+
+    Los seleccionados con error van al reporte de errores de la carga. La
+    carga queda 'completado' (o 'parcial' si la extracción omitió páginas),
+    o 'error' si todos los seleccionados tenían errores, y su staging
+    vacío; si no se seleccionó nada, la carga se elimina. Retorna
+    (procesados, fallidos).
+    """
+    registros = RegistroExtraidoPdf.objects.filter(fk_id_archivo=carga)
+    with transaction.atomic():
+        _marcar_seleccion(registros, rangos)
+        _aplicar_descripciones(registros, descripciones)
+        procesados = _insertar_desde_staging(carga, corredor)
+
+        registro_errores = RegistroErrores(carga)
+        registro_errores.extend(
+            registros.filter(seleccionado=True, error__isnull=False)
+            .order_by('indice').values_list('indice', 'error')
+        )
+        fallidos = registro_errores.total
+
+        if not procesados and not fallidos:
+            carga.delete()
+            return 0, 0
+
+        registros.delete()
+        carga.fecha_carga = timezone.now()
+        carga.registros_procesados = procesados
+        carga.registros_fallidos = fallidos
+        if not procesados:
+            carga.estado = 'error'
+            carga.resultado = f'Ningún registro guardado: los {fallidos} seleccionados tenían errores'
+        else:
+            carga.estado = 'parcial' if carga.paginas_omitidas else 'completado'
+            carga.resultado = f'{procesados} procesados, {fallidos} fallidos'
+            if carga.paginas_omitidas:
+                carga.resultado += f', {carga.paginas_omitidas} página(s) del PDF omitida(s)'
+            if carga.paginas_descartadas:
+                carga.resultado += f', {carga.paginas_descartadas} página(s) sin registros descartada(s)'
+        carga.save()
+    registro_errores.volcar()
+    return procesados, fallidos
+
+def limpiar_confirmaciones_abandonadas():
+    """Elimina las extracciones sin confirmar más antiguas que CARGA_CONFIRMACION_EXPIRACION"""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'CARGA_CONFIRMACION_EXPIRACION', 24 * 3600))
+    abandonadas = Archivocarga.objects.filter(estado='por_confirmar', fecha_carga__lt=limite)
+    total = abandonadas.count()
+    if total:
+        abandonadas.delete()
+    return total
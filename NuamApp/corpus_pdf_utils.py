@@ -0,0 +1,191 @@
+# NuamApp/corpus_pdf_utils.py
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from .parse_utils import parsear_fecha, parsear_monto
+
+# Generador de PDFs sintéticos con forma de cartola de corredor, para medir
+# la extracción sin depender de PDFs reales. Con la misma semilla genera
+# exactamente el mismo archivo (byte a byte) y entrega junto a él la lista
+# de registros que contiene (la "verdad"), así se puede calcular precisión
+# y exhaustividad de lo que extrae pdf_utils.
+#
+# Cada página tiene un encabezado, líneas de texto (registros con fecha,
+# mercado, año y monto en dos redacciones distintas, mezcladas con líneas
+# de relleno que tienen números pero no son registros) y, en parte de las
+# páginas, una tabla con bordes dibujados. Las fechas van en ISO o
+# dd/mm/aaaa y los montos en formato chileno (1.234.567,89). El PDF se
+# escribe a mano (objetos, xref y trailer), sin dependencias.
+
+MAX_PAGINAS_CORPUS = 1000
+MERCADOS_CORPUS = ['Acciones', 'Bonos', 'Derivados', 'Monedas']
+
+ALTO_PAGINA = 842
+ANCHO_PAGINA = 595
+MARGEN = 50
+ALTO_LINEA = 14
+ALTO_FILA = 16
+COLUMNAS_TABLA = (('Fecha', 90), ('Mercado', 90), ('Año', 60), ('Monto', 120))
+
+_RELLENO = [
+    'Saldo disponible al cierre del periodo $ {monto}',
+    'Comisión de corretaje {monto} folio {folio}',
+    'Fecha de emisión {fecha} folio {folio}',
+    'Detalle de operaciones liquidadas en el periodo',
+    'Los montos se expresan en pesos chilenos',
+]
+
+def clave_registro(fecha, mercado, ano, monto):
+    """
+    Forma comparable de un registro: (date, mercado, año, monto a dos
+    decimales). Retorna None si algún campo no se puede interpretar.
+    """
+    try:
+        return (parsear_fecha(str(fecha)), str(mercado).capitalize(), int(ano),
+                parsear_monto(monto).quantize(Decimal('0.01')))
+    except (ValueError, TypeError, ArithmeticError):
+        return None
+
+# ========== CONTENIDO ==========
+
+def _monto_chileno(monto):
+    """Decimal('1234567.89') -> '1.234.567,89' (sin decimales si son cero)"""
+    entero, _, decimales = f'{monto:.2f}'.partition('.')
+    texto = f'{int(entero):,}'.replace(',', '.')
+    return texto if decimales == '00' else f'{texto},{decimales}'
+
+def _texto_fecha(fecha, rng):
+    return fecha.isoformat() if rng.random() < 0.5 else fecha.strftime('%d/%m/%Y')
+
+class _Generador:
+    """Arma los registros de cada página sin repetir la clave de un registro en el documento"""
+
+    def __init__(self, semilla):
+        self.rng = random.Random(semilla)
+        self.inicio = date(2021, 1, 1)
+        self.vistas = set()
+
+    def registro(self):
+        rng = self.rng
+        while True:
+            fecha = self.inicio + timedelta(days=rng.randrange(1200))
+            mercado = rng.choice(MERCADOS_CORPUS)
+            if rng.random() < 0.7:
+                monto = Decimal(rng.randrange(100_000, 9_999_999_999)) / 100
+            else:
+                monto = Decimal(rng.randrange(1_000, 99_999_999))
+            clave = (fecha, mercado, fecha.year, monto.quantize(Decimal('0.01')))
+            if clave not in self.vistas:
+                self.vistas.add(clave)
+                return clave
+
+    def relleno(self):
+        rng = self.rng
+        fecha = self.inicio + timedelta(days=rng.randrange(1200))
+        return rng.choice(_RELLENO).format(monto=_monto_chileno(Decimal(rng.randrange(100, 99_999_999))),
+                                           folio=rng.randrange(100_000, 999_999),
+                                           fecha=_texto_fecha(fecha, rng))
+
+    def linea(self, registro):
+        """Un registro redactado como línea de texto, en una de dos formas"""
+        fecha, mercado, ano, monto = registro
+        rng = self.rng
+        if rng.random() < 0.5:
+            return f'{_texto_fecha(fecha, rng)} {mercado} {ano} {_monto_chileno(monto)}'
+        return (f'Operación {mercado} liquidada el {_texto_fecha(fecha, rng)} por $ {_monto_chileno(monto)} '
+                f'ref {rng.randrange(100_000, 999_999)}')
+
+    def fila(self, registro):
+        fecha, mercado, ano, monto = registro
+        return [_texto_fecha(fecha, self.rng), mercado, str(ano), _monto_chileno(monto)]
+
+# ========== ESCRITURA DEL PDF ==========
+
+def _escapar(texto):
+    texto = texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return texto.encode('cp1252', errors='replace')
+
+def _texto(x, y, texto):
+    return b'BT /F1 9 Tf 1 0 0 1 %d %d Tm (' % (x, y) + _escapar(texto) + b') Tj ET'
+
+def _tabla(y, filas):
+    """Tabla con borde en cada celda desde `y` hacia abajo; retorna (operaciones, y final)"""
+    operaciones = [b'0.5 w']
+    for fila in filas:
+        y -= ALTO_FILA
+        x = MARGEN
+        for valor, (_, ancho) in zip(fila, COLUMNAS_TABLA):
+            operaciones.append(b'%d %d %d %d re S' % (x, y, ancho, ALTO_FILA))
+            operaciones.append(_texto(x + 4, y + 5, valor))
+            x += ancho
+    return operaciones, y
+
+def _escribir_pdf(contenidos):
+    """PDF mínimo (Helvetica, WinAnsiEncoding) con un stream de contenido por página"""
+    objetos = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>']
+    hojas = []
+    for contenido in contenidos:
+        objetos.append(b'<< /Length %d >>\nstream\n' % len(contenido) + contenido + b'\nendstream')
+        objetos.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+                       b'/Resources << /Font << /F1 3 0 R >> >> >>' % (ANCHO_PAGINA, ALTO_PAGINA, len(objetos)))
+        hojas.append(b'%d 0 R' % len(objetos))
+    objetos[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(hojas), len(hojas))
+
+    partes = [b'%PDF-1.4\n']
+    offsets = []
+    largo = len(partes[0])
+    for numero, objeto in enumerate(objetos, start=1):
+        offsets.append(largo)
+        parte = b'%d 0 obj\n' % numero + objeto + b'\nendobj\n'
+        partes.append(parte)
+        largo += len(parte)
+    partes.append(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1))
+    partes.extend(b'%010d 00000 n \n' % offset for offset in offsets)
+    partes.append(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, largo))
+    return b''.join(partes)
+
+# ========== CORPUS ==========
+
+def generar_pdf_corredor(paginas, semilla=42, lineas_por_pagina=20, filas_por_tabla=8, proporcion_tablas=0.5):
+    """
+    PDF sintético de `paginas` páginas (1 a MAX_PAGINAS_CORPUS).
+
+    Cada página lleva `lineas_por_pagina` líneas de texto (cerca de la
+    mitad son registros) y, con probabilidad `proporcion_tablas`, una
+    tabla con `filas_por_tabla` registros. Retorna (pdf, verdad): los
+    bytes del PDF y la lista de (página, fecha, mercado, año, monto) de
+    todos los registros, con claves únicas (ver clave_registro).
+    """
+    if not 1 <= paginas <= MAX_PAGINAS_CORPUS:
+        raise ValueError(f'La cantidad de páginas debe estar entre 1 y {MAX_PAGINAS_CORPUS}')
+    alto_necesario = (lineas_por_pagina + 3) * ALTO_LINEA + (filas_por_tabla + 2) * ALTO_FILA
+    if alto_necesario > ALTO_PAGINA - 2 * MARGEN:
+        raise ValueError('Las líneas y filas pedidas no caben en una página')
+
+    generador = _Generador(semilla)
+    contenidos = []
+    verdad = []
+    for page_num in range(1, paginas + 1):
+        y = ALTO_PAGINA - MARGEN
+        operaciones = [_texto(MARGEN, y, f'Cartola de movimientos - Corredora Sintética S.A. - Página {page_num} de {paginas}')]
+        y -= 2 * ALTO_LINEA
+
+        for _ in range(lineas_por_pagina):
+            if generador.rng.random() < 0.5:
+                registro = generador.registro()
+                verdad.append((page_num,) + registro)
+                operaciones.append(_texto(MARGEN, y, generador.linea(registro)))
+            else:
+                operaciones.append(_texto(MARGEN, y, generador.relleno()))
+            y -= ALTO_LINEA
+
+        if filas_por_tabla and generador.rng.random() < proporcion_tablas:
+            registros = [generador.registro() for _ in range(filas_por_tabla)]
+            verdad.extend((page_num,) + registro for registro in registros)
+            tabla, y = _tabla(y - ALTO_LINEA, [[nombre for nombre, _ in COLUMNAS_TABLA]]
+                              + [generador.fila(registro) for registro in registros])
+            operaciones.extend(tabla)
+
+        contenidos.append(b'\n'.join(operaciones))
+    return _escribir_pdf(contenidos), verdad
@@ -0,0 +1,161 @@
+# NuamApp/escaner_utils.py
+import re
+from collections import namedtuple
+
+# Escáner de texto de PDF: una sola expresión precompilada recorre la
+# página una vez y entrega aciertos tipados (fecha, mercado, año, monto)
+# con su posición y su línea. Las reglas de extracción de pdf_utils
+# trabajan sobre esa lista en vez de volver a pasar varias regex por cada
+# línea.
+
+Acierto = namedtuple('Acierto', 'tipo texto inicio fin linea')
+_nuevo = tuple.__new__
+
+# Nombre canónico de cada mercado; los plurales van primero en la
+# alternativa para que "Bonos" no se corte en "Bono"
+MERCADOS = {
+    'acciones': 'Acciones', 'bonos': 'Bonos', 'derivados': 'Derivados', 'monedas': 'Monedas',
+    'acción': 'Acción', 'bono': 'Bono', 'derivado': 'Derivado', 'moneda': 'Moneda',
+}
+
+# Piezas compartidas por las expresiones del módulo
+_FECHA = r'\d{2,4}[-/]\d{1,2}[-/]\d{2,4}'
+_ANO_SUELTO = r'(?<![\d.,])(?:19|20)\d{2}(?!\d|[.,]\d)'      # año suelto (no parte de un número)
+_MONTO = (r'\d+(?:\.\d{3})+(?:,\d+)?'                         # 1.234.567,89
+          r'|\d+(?:,\d{3})+(?:\.\d+)?'                        # 1,234,567.89
+          r'|\d+(?:[.,]\d+)?')                                # 1234,5 / 1234.5
+_MERCADO = r'acciones|bonos|derivados|monedas|acción|bono|derivado|moneda'
+
+# El lookahead inicial deja que el motor descarte rápido las posiciones
+# que no pueden empezar un acierto (sin él, cada posición prueba todas las
+# alternativas y la pasada única es más lenta que varias regex simples)
+_ALTERNATIVAS = (
+    rf'(?P<fecha>{_FECHA})'
+    rf'|(?P<ano>{_ANO_SUELTO})'
+    rf'|(?P<monto>{_MONTO})'
+    rf'|(?P<mercado>{_MERCADO})'
+    r'|(?P<salto>\n)'
+)
+_TOKENS = re.compile(rf'(?=[\dabdmABDM\n])(?:{_ALTERNATIVAS})', re.IGNORECASE)
+
+# Con los rótulos "Año: 2024" y "Factor: 1.5" (para el resumen de patrones
+# de un PDF). El rótulo solo consume la etiqueta: el número que sigue sale
+# como su propio acierto. Va al final de la alternancia y la "F" candidata
+# es solo mayúscula; aun así es otra expresión para no sumar posiciones
+# candidatas a las extracciones, que no usan los rótulos.
+_TOKENS_ETIQUETAS = re.compile(
+    rf'(?=[\dabdmABDM\n]|(?-i:F))(?:{_ALTERNATIVAS}'
+    rf'|(?P<etiqueta_ano>(?-i:Año)[:\s]+(?=\d{{4}}))|(?P<etiqueta_factor>(?-i:Factor)[:\s]+(?=\d)))',
+    re.IGNORECASE
+)
+
+# Secuencia fecha → año → monto directa sobre el texto, equivalente a
+# secuencias(escanear(texto)) pero sin armar aciertos. Los números que no
+# empiezan una secuencia se consumen como un acierto más, así cada búsqueda
+# parte donde el escáner empezaría el siguiente; entre los tres números de
+# una secuencia solo hay texto sin dígitos (los mercados quedan en `entre`)
+_SECUENCIA = re.compile(
+    rf'(?=\d)(?:(?P<fecha>{_FECHA})(?P<entre>\D*)(?!{_FECHA})(?P<ano>{_ANO_SUELTO})\D*(?!{_FECHA})'
+    rf'(?P<monto>{_ANO_SUELTO}|{_MONTO})|{_FECHA}|{_ANO_SUELTO}|{_MONTO})',
+    re.IGNORECASE
+)
+_MERCADOS = re.compile(_MERCADO, re.IGNORECASE)
+
+_ANO = re.compile(r'(?:19|20)\d{2}')
+_SEPARADOR_FECHA = re.compile(r'[-/]')
+_FACTOR_VALOR = re.compile(r'Factor:\s*(\w+)\s*Valor:\s*(\d+)')
+
+def escanear(texto, etiquetas=False):
+    """
+    Recorre el texto una vez y retorna la lista de Acierto en orden.
+
+    Un número de cuatro cifras entre 1900 y 2099 se entrega como 'ano' y
+    no como 'monto'; los dígitos de una fecha no generan otros aciertos.
+    `linea` es el índice de la línea (como en texto.split('\\n')). Con
+    `etiquetas` también salen los rótulos 'etiqueta_ano' y
+    'etiqueta_factor' (ver etiquetados).
+    """
+    aciertos = []
+    linea = 0
+    for match in (_TOKENS_ETIQUETAS if etiquetas else _TOKENS).finditer(texto):
+        tipo = match.lastgroup
+        if tipo == 'salto':
+            linea += 1
+            continue
+        # tuple.__new__ evita el constructor en Python de namedtuple
+        aciertos.append(_nuevo(Acierto, (tipo, match.group(), match.start(), match.end(), linea)))
+    return aciertos
+
+def por_linea(aciertos):
+    """Agrupa los aciertos en {linea: [aciertos]} conservando el orden"""
+    lineas = {}
+    for acierto in aciertos:
+        lineas.setdefault(acierto.linea, []).append(acierto)
+    return lineas
+
+# ========== CONSULTAS SOBRE LOS ACIERTOS ==========
+
+def mercado_canonico(acierto):
+    return MERCADOS[acierto.texto.lower()]
+
+def primer_mercado(aciertos, orden):
+    """
+    Mercado presente según la prioridad de `orden` (lista de nombres
+    canónicos), no según su posición en el texto; None si no hay.
+    """
+    presentes = {mercado_canonico(a) for a in aciertos if a.tipo == 'mercado'}
+    return next((m for m in orden if m in presentes), None)
+
+def primer_ano(aciertos):
+    """Primer año: suelto o, si una fecha aparece antes, el de esa fecha"""
+    for acierto in aciertos:
+        if acierto.tipo == 'ano':
+            return acierto.texto
+        if acierto.tipo == 'fecha':
+            for parte in _SEPARADOR_FECHA.split(acierto.texto):
+                if _ANO.fullmatch(parte):
+                    return parte
+    return None
+
+def primero(aciertos, tipo):
+    return next((a for a in aciertos if a.tipo == tipo), None)
+
+def etiquetados(aciertos, etiqueta, tipos=('ano', 'monto')):
+    """Textos de los aciertos de `tipos` que van justo después de un rótulo `etiqueta`"""
+    return [siguiente.texto for acierto, siguiente in zip(aciertos, aciertos[1:])
+            if acierto.tipo == etiqueta and siguiente.tipo in tipos and siguiente.inicio == acierto.fin]
+
+def secuencias(aciertos, texto):
+    """
+    Secuencias fecha → año → monto consecutivas; los mercados entre medio
+    no cortan la secuencia. Retorna tuplas (fecha, ano, monto, mercados,
+    entre) con los aciertos de mercado y el texto que hay entre la fecha y
+    el año. Las secuencias no se solapan.
+    """
+    numericos = [i for i, a in enumerate(aciertos) if a.tipo in ('fecha', 'ano', 'monto')]
+    resultado = []
+    siguiente = 0
+    for k in range(len(numericos) - 2):
+        if k < siguiente or aciertos[numericos[k]].tipo != 'fecha':
+            continue
+        i, j, m = numericos[k], numericos[k + 1], numericos[k + 2]
+        ano, monto = aciertos[j], aciertos[m]
+        if ano.tipo == 'ano' and monto.tipo != 'fecha':
+            fecha = aciertos[i]
+            resultado.append((fecha, ano, monto, aciertos[i + 1:j], texto[fecha.fin:ano.inicio]))
+            siguiente = k + 3
+    return resultado
+
+def secuencias_texto(texto):
+    """
+    (fecha, entre, ano, monto, mercados) de cada secuencia fecha → año →
+    monto del texto, como textos; `mercados` son los nombres canónicos
+    presentes entre la fecha y el año. Para cuando no hacen falta los
+    aciertos (posiciones, líneas) sino solo las secuencias.
+    """
+    return [(fecha, entre, ano, monto, {MERCADOS[m.lower()] for m in _MERCADOS.findall(entre)})
+            for fecha, entre, ano, monto in _SECUENCIA.findall(texto) if fecha]
+
+def factores_valor(texto):
+    """Pares (nombre, valor) de las líneas 'Factor: X Valor: N'"""
+    return _FACTOR_VALOR.findall(texto)
@@ -0,0 +1,153 @@
+# NuamApp/estadisticas_utils.py
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Auditoria, Calificacion, EstadisticaAuditoria, EstadisticaCalificacion
+
+# Resúmenes del dashboard de administración: en vez de contar sobre toda
+# `calificacion` y `auditoria` en cada visita, se mantienen cantidades por
+# día (y mercado y origen, en las calificaciones) que se actualizan al
+# escribir:
+#   - save() y delete() de a una fila (también los borrados en cascada)
+#     llegan por las señales de este módulo (apps.ready lo importa).
+#   - Las inserciones por lote (bulk_create, COPY, INSERT ... SELECT) no
+#     disparan señales: quien las hace llama a sumar_calificaciones.
+#   - Dentro de agrupar_estadisticas los cambios de las señales se juntan
+#     y se aplican al salir, un UPDATE por clave en vez de uno por fila.
+# Un UPDATE masivo de mercado u origen no queda reflejado; para eso (y para
+# cargar la historia) está el comando reconstruir_estadisticas.
+
+_local = threading.local()
+
+def _dia(momento):
+    """Día local de un datetime (el mismo que daría TruncDate)"""
+    if momento is None:
+        return timezone.localdate()
+    if timezone.is_aware(momento):
+        return timezone.localdate(momento)
+    return momento.date()
+
+def _clave_calificacion(calificacion):
+    return _dia(calificacion.fecha_creacion), calificacion.mercado, calificacion.origen
+
+# ========== ACTUALIZACIÓN INCREMENTAL ==========
+
+_CAMPOS_CLAVE = {
+    EstadisticaCalificacion: ('dia', 'mercado', 'origen'),
+    EstadisticaAuditoria: ('dia',),
+}
+
+def _aplicar(resumen, deltas):
+    """Suma cada delta ({clave: n}) a su fila del resumen; crea las filas que falten"""
+    campos = _CAMPOS_CLAVE[resumen]
+    for clave, delta in deltas.items():
+        if not delta:
+            continue
+        filtro = dict(zip(campos, clave))
+        if resumen.objects.filter(**filtro).update(cantidad=F('cantidad') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                resumen.objects.create(cantidad=delta, **filtro)
+        except IntegrityError:
+            # Otra transacción creó la fila entre el UPDATE y el INSERT
+            resumen.objects.filter(**filtro).update(cantidad=F('cantidad') + delta)
+
+def _sumar(resumen, deltas):
+    pendientes = getattr(_local, 'pendientes', None)
+    if pendientes is None:
+        _aplicar(resumen, deltas)
+    else:
+        pendientes.setdefault(resumen, Counter()).update(deltas)
+
+@contextmanager
+def agrupar_estadisticas():
+    """
+    Junta los cambios que llegan por señales (un borrado en cascada puede
+    traer miles) y los aplica al salir. Si el bloque falla se descartan:
+    debe ir dentro de la misma transacción que los cambios.
+    """
+    if getattr(_local, 'pendientes', None) is not None:
+        yield
+        return
+    _local.pendientes = pendientes = {}
+    try:
+        yield
+    finally:
+        _local.pendientes = None
+    for resumen, deltas in pendientes.items():
+        _aplicar(resumen, deltas)
+
+def contar_calificaciones(calificaciones):
+    """Counter {(día, mercado, origen): n} de instancias de Calificacion ya guardadas"""
+    return Counter(_clave_calificacion(calificacion) for calificacion in calificaciones)
+
+def sumar_calificaciones(deltas):
+    """Suma al resumen {(día, mercado, origen): n}; para las inserciones que no pasan por save()"""
+    _sumar(EstadisticaCalificacion, deltas)
+
+# ========== SEÑALES ==========
+
+@receiver(pre_save, sender=Calificacion)
+def _recordar_clave_anterior(sender, instance, **kwargs):
+    instance._clave_estadistica = None
+    if instance.pk is not None and not instance._state.adding:
+        anterior = sender.objects.filter(pk=instance.pk).values_list('fecha_creacion', 'mercado', 'origen').first()
+        if anterior:
+            instance._clave_estadistica = (_dia(anterior[0]), anterior[1], anterior[2])
+
+@receiver(post_save, sender=Calificacion)
+def _calificacion_guardada(sender, instance, created, **kwargs):
+    clave = _clave_calificacion(instance)
+    anterior = getattr(instance, '_clave_estadistica', None)
+    if created or anterior is None:
+        _sumar(EstadisticaCalificacion, {clave: 1})
+    elif anterior != clave:
+        _sumar(EstadisticaCalificacion, {anterior: -1, clave: 1})
+
+@receiver(post_delete, sender=Calificacion)
+def _calificacion_borrada(sender, instance, **kwargs):
+    _sumar(EstadisticaCalificacion, {_clave_calificacion(instance): -1})
+
+@receiver(post_save, sender=Auditoria)
+def _auditoria_guardada(sender, instance, created, **kwargs):
+    if created:
+        _sumar(EstadisticaAuditoria, {(_dia(instance.fecha_hora),): 1})
+
+@receiver(post_delete, sender=Auditoria)
+def _auditoria_borrada(sender, instance, **kwargs):
+    _sumar(EstadisticaAuditoria, {(_dia(instance.fecha_hora),): -1})
+
+# ========== RECONSTRUCCIÓN ==========
+
+def _reconstruir(resumen, filas, campo_fecha, desde, hasta):
+    """Reemplaza las filas del resumen entre `desde` y `hasta` por los conteos de `filas`"""
+    existentes = resumen.objects.all()
+    filas = filas.annotate(dia=TruncDate(campo_fecha))
+    if desde:
+        existentes = existentes.filter(dia__gte=desde)
+        filas = filas.filter(dia__gte=desde)
+    if hasta:
+        existentes = existentes.filter(dia__lte=hasta)
+        filas = filas.filter(dia__lte=hasta)
+    existentes.delete()
+    conteos = filas.order_by().values(*_CAMPOS_CLAVE[resumen]).annotate(cantidad=Count('pk'))
+    return len(resumen.objects.bulk_create([resumen(**conteo) for conteo in conteos], batch_size=1000))
+
+def reconstruir_estadisticas(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes desde `calificacion` y `auditoria`, completos
+    o solo los días entre `desde` y `hasta`. Retorna cuántas filas quedaron
+    en (EstadisticaCalificacion, EstadisticaAuditoria) para esos días.
+    """
+    with transaction.atomic():
+        return (
+            _reconstruir(EstadisticaCalificacion, Calificacion.objects.all(), 'fecha_creacion', desde, hasta),
+            _reconstruir(EstadisticaAuditoria, Auditoria.objects.all(), 'fecha_hora', desde, hasta),
+        )
@@ -0,0 +1,118 @@
+# NuamApp/management/commands/benchmark_escaner.py
+import random
+import re
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from NuamApp.parse_utils import parsear_monto
+from NuamApp.pdf_utils import extraer_calificaciones_pagina, registros_de_contenido
+
+
+def _confirmacion_legacy(text, page_num):
+    """Referencia: búsqueda línea a línea como la hacía extraer_datos_pdf antes del escáner"""
+    registros = []
+    patron1 = r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})[^\d]*(Acciones|Bonos|Derivados|Monedas)[^\d]*(\d{4})[^\d]*([\d\.,]+)'
+    for match in re.findall(patron1, text, re.IGNORECASE | re.DOTALL):
+        registros.append((match[0], match[1], match[2], match[3], page_num))
+
+    for linea in text.split('\n'):
+        linea = linea.strip()
+        if len(linea) < 20:
+            continue
+        montos_validos = []
+        for monto in re.findall(r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+(?:,\d{2})?)', linea):
+            try:
+                valor = parsear_monto(monto)
+            except ValueError:
+                continue
+            if valor > 100:
+                montos_validos.append((valor, monto))
+        if not montos_validos:
+            continue
+        montos_validos.sort(key=lambda m: m[0], reverse=True)
+        fecha_match = re.search(r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})', linea)
+        mercado = None
+        for m in ['Acciones', 'Bonos', 'Derivados', 'Monedas']:
+            if m.lower() in linea.lower():
+                mercado = m
+                break
+        ano_match = re.search(r'(?:20\d{2})', linea)
+        if fecha_match and mercado:
+            registros.append((fecha_match.group(1), mercado, ano_match.group(0) if ano_match else None,
+                              montos_validos[0][1], page_num))
+    return registros
+
+
+def _carga_legacy(text, page_num):
+    """Referencia: los tres patrones que usaba carga_pdf, cada uno sobre toda la página"""
+    datos = []
+    patrones = [
+        r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})[^\d]*([A-Za-zñÑáéíóúÁÉÍÓÚ\s]+)[^\d]*(\d{4})[^\d]*([\d\.,]+)',
+        r'(\d{4}-\d{2}-\d{2})[^0-9]*([\d]{1,3}(?:\.\d{3})*(?:,\d{2})?)',
+        r'Fecha[:\s]*(\d{4}-\d{2}-\d{2}).*?Mercado[:\s]*([A-Za-z]+).*?Año[:\s]*(\d{4}).*?(?:Monto|Factor)[:\s]*([\d\.,]+)',
+    ]
+    mercados = ['Acciones', 'Bonos', 'Derivados', 'Monedas', 'Acción', 'Bono', 'Derivado', 'Moneda']
+    for patron in patrones:
+        for match in re.findall(patron, text, re.IGNORECASE | re.DOTALL):
+            if len(match) < 4:
+                continue
+            try:
+                monto = parsear_monto(match[3])
+            except ValueError:
+                continue
+            mercado = next((m for m in mercados if m.lower() in match[1].strip().lower()), 'Otro')
+            datos.append((match[0], mercado, match[2], monto, page_num))
+    return datos
+
+
+def generar_paginas(cantidad, lineas_por_pagina, semilla):
+    """Texto sintético parecido al de una cartola de corredor"""
+    rng = random.Random(semilla)
+    mercados = ['Acciones', 'Bonos', 'Derivados', 'Monedas', 'CFI']
+    relleno = ['Saldo disponible al cierre del periodo', 'Cartola de movimientos del cliente',
+               'Detalle de operaciones liquidadas', 'Página generada automáticamente']
+    inicio = date(2022, 1, 1)
+    paginas = []
+    for _ in range(cantidad):
+        lineas = []
+        for _ in range(lineas_por_pagina):
+            fecha = inicio + timedelta(days=rng.randrange(700))
+            texto_fecha = fecha.isoformat() if rng.random() < 0.6 else fecha.strftime('%d/%m/%Y')
+            monto = f"{rng.randrange(100, 9_999_999):,}".replace(',', '.') + f",{rng.randrange(100):02d}"
+            tipo = rng.random()
+            if tipo < 0.35:
+                lineas.append(f'{texto_fecha} {rng.choice(mercados)} {fecha.year} {monto}')
+            elif tipo < 0.7:
+                lineas.append(f'Operación {rng.choice(mercados)} liquidada el {texto_fecha} por {monto} ref {rng.randrange(10**6)}')
+            elif tipo < 0.8:
+                lineas.append(f'Fecha: {fecha.isoformat()} Mercado: {rng.choice(mercados)} Año: {fecha.year} Monto: {monto}')
+            else:
+                lineas.append(rng.choice(relleno))
+        paginas.append('\n'.join(lineas))
+    return paginas
+
+
+class Command(BaseCommand):
+    help = 'Compara páginas/segundo de los patrones por línea contra el escáner de una pasada de escaner_utils'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paginas', type=int, default=2000,
+                            help='Cantidad de páginas sintéticas a generar')
+        parser.add_argument('--lineas', type=int, default=40, help='Líneas por página')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        paginas = generar_paginas(options['paginas'], options['lineas'], options['semilla'])
+
+        casos = (
+            ('confirmación, por línea (legacy)', _confirmacion_legacy),
+            ('confirmación, escáner', lambda text, n: registros_de_contenido(text, [], n)),
+            ('carga_pdf, 3 patrones (legacy)', _carga_legacy),
+            ('carga_pdf, escáner', extraer_calificaciones_pagina),
+        )
+        for nombre, funcion in casos:
+            t0 = time.perf_counter()
+            registros = sum(len(funcion(text, n)) for n, text in enumerate(paginas, start=1))
+            segundos = time.perf_counter() - t0
+            self.stdout.write(f'{nombre:<34} {len(paginas) / segundos:>10,.0f} páginas/s '
+                              f'({segundos:.3f}s, {registros} registros)')
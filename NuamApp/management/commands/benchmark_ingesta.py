@@ -0,0 +1,70 @@
+# NuamApp/management/commands/benchmark_ingesta.py
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from NuamApp.models import Calificacion, Corredor
+from NuamApp.carga_utils import IngestaCopy, _insertar_lote
+
+
+class Command(BaseCommand):
+    help = ('Compara filas/segundo de la inserción con bulk_create contra COPY + INSERT ... SELECT '
+            '(solo PostgreSQL). Todo se hace dentro de una transacción que se revierte al final')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100000,
+                            help='Cantidad de calificaciones sintéticas a insertar por cada método')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Tamaño de lote (como CARGA_BATCH_SIZE)')
+        parser.add_argument('--corredor', type=int, help='id_corredor dueño de las filas (por defecto el primero)')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def _generar_lotes(self, corredor, filas, lote, semilla):
+        rng = random.Random(semilla)
+        inicio = date(2020, 1, 1)
+        objetos = []
+        for row_num in range(2, filas + 2):
+            fecha = inicio + timedelta(days=rng.randrange(1500))
+            objetos.append((row_num, Calificacion(
+                fecha=fecha,
+                mercado=rng.choice(['acciones', 'cfi', 'fondos_mutuos']),
+                ano=fecha.year,
+                descripcion=f'Benchmark fila {row_num}',
+                factor_actualizado=Decimal(rng.randrange(1, 10_000_000)) / 10000,
+                fk_id_corredor=corredor
+            )))
+        return [objetos[i:i + lote] for i in range(0, len(objetos), lote)]
+
+    def handle(self, *args, **options):
+        if options['corredor']:
+            corredor = Corredor.objects.filter(id_corredor=options['corredor']).first()
+        else:
+            corredor = Corredor.objects.order_by('id_corredor').first()
+        if corredor is None:
+            raise CommandError('Se necesita al menos un corredor para asociar las filas')
+
+        metodos = [('bulk_create', lambda: _insertar_lote)]
+        if connection.vendor == 'postgresql':
+            metodos.append(('COPY + INSERT ... SELECT', IngestaCopy))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'La BD es {connection.vendor}: COPY solo existe en PostgreSQL, se mide solo bulk_create'))
+
+        for nombre, insertador in metodos:
+            lotes = self._generar_lotes(corredor, options['filas'], options['lote'], options['semilla'])
+            with transaction.atomic():
+                antes = Calificacion.objects.count()
+                t0 = time.perf_counter()
+                # Un insertador por carga, como en _preparar_lotes (COPY cierra su staging al final)
+                insertar = insertador()
+                for lote in lotes:
+                    insertar(lote, [])
+                if hasattr(insertar, 'cerrar'):
+                    insertar.cerrar([])
+                segundos = time.perf_counter() - t0
+                insertadas = Calificacion.objects.count() - antes
+                transaction.set_rollback(True)
+            self.stdout.write(f'{nombre:<26} {insertadas / segundos:>12,.0f} filas/s '
+                              f'({insertadas} filas en {segundos:.3f}s)')
@@ -0,0 +1,68 @@
+# NuamApp/management/commands/benchmark_parseo.py
+import random
+import time
+from datetime import date, datetime, timedelta
+from django.core.management.base import BaseCommand
+from NuamApp.parse_utils import parsear_lote, parsear_fechas, parsear_montos, parsear_anos
+
+
+def _parseo_fila_a_fila(filas):
+    """Referencia: normalización fila a fila como la hacían las vistas antes de parse_utils"""
+    resultados = []
+    for row in filas:
+        try:
+            fecha = row['fecha']
+            if '-' in fecha:
+                fecha_dt = datetime.strptime(fecha, '%Y-%m-%d').date()
+            else:
+                fecha_dt = datetime.strptime(fecha, '%d/%m/%Y').date()
+            monto = float(row['monto'].replace('.', '').replace(',', '.'))
+            resultados.append((fecha_dt, int(row['ano']), monto))
+        except (ValueError, KeyError):
+            resultados.append(None)
+    return resultados
+
+
+def _parseo_por_columnas(filas):
+    columnas, _ = parsear_lote(filas, {
+        'fecha': parsear_fechas,
+        'ano': parsear_anos,
+        'monto': parsear_montos,
+    })
+    return columnas
+
+
+class Command(BaseCommand):
+    help = 'Compara filas/segundo del parseo fila a fila contra el parseo por columnas de parse_utils'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100000,
+                            help='Cantidad de filas sintéticas a generar')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Tamaño de lote (como CARGA_BATCH_SIZE)')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['semilla'])
+        inicio = date(2020, 1, 1)
+        filas = []
+        for _ in range(options['filas']):
+            fecha = inicio + timedelta(days=rng.randrange(1500))
+            texto_fecha = fecha.isoformat() if rng.random() < 0.7 else fecha.strftime('%d/%m/%Y')
+            entero = rng.randrange(1, 10_000_000)
+            filas.append({
+                'fecha': texto_fecha,
+                'ano': str(fecha.year),
+                'monto': f"{entero:,}".replace(',', '.') + f",{rng.randrange(100):02d}",
+            })
+
+        lote = options['lote']
+        lotes = [filas[i:i + lote] for i in range(0, len(filas), lote)]
+
+        for nombre, funcion in (('fila a fila (legacy)', _parseo_fila_a_fila),
+                                ('por columnas (parse_utils)', _parseo_por_columnas)):
+            t0 = time.perf_counter()
+            for filas_lote in lotes:
+                funcion(filas_lote)
+            segundos = time.perf_counter() - t0
+            self.stdout.write(f'{nombre:<28} {len(filas) / segundos:>12,.0f} filas/s ({segundos:.3f}s)')
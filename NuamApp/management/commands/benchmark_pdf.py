@@ -0,0 +1,82 @@
+# NuamApp/management/commands/benchmark_pdf.py
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from NuamApp.corpus_pdf_utils import MAX_PAGINAS_CORPUS, clave_registro, generar_pdf_corredor
+from NuamApp.pdf_utils import Presupuesto, extraer_calificaciones_pdf, extraer_registros_pdf, memoria_actual
+
+
+def _extraer_confirmacion(ruta, presupuesto):
+    """Camino de extraer_datos_pdf (sin caché): tuplas CAMPOS_REGISTRO_PDF"""
+    registros, omitidas, _ = extraer_registros_pdf(ruta, None, presupuesto)
+    return [clave_registro(*registro[:4]) for registro in registros], omitidas
+
+
+def _extraer_carga(ruta, presupuesto):
+    """Camino de carga_pdf y de los PDF dentro de un ZIP: tuplas CAMPOS_CALIFICACION_PDF"""
+    datos, omitidas, _ = extraer_calificaciones_pdf(ruta, presupuesto)
+    return [clave_registro(*dato[:4]) for dato in datos], omitidas
+
+
+class Command(BaseCommand):
+    help = ('Genera un PDF sintético de corredor (determinista, con los registros que contiene) y mide '
+            'páginas/segundo, pico de memoria y precisión/exhaustividad de cada extracción de pdf_utils')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paginas', type=int, default=100,
+                            help=f'Páginas del PDF sintético (1 a {MAX_PAGINAS_CORPUS})')
+        parser.add_argument('--lineas', type=int, default=20, help='Líneas de texto por página')
+        parser.add_argument('--filas-tabla', type=int, default=8,
+                            help='Filas de la tabla con bordes (en la mitad de las páginas; 0 = sin tablas)')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--guardar', metavar='RUTA', help='Deja el PDF generado en RUTA')
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+        try:
+            pdf, verdad = generar_pdf_corredor(options['paginas'], options['semilla'], options['lineas'],
+                                               options['filas_tabla'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        esperadas = {clave_registro(*registro[1:]) for registro in verdad}
+        self.stdout.write(f'PDF sintético: {options["paginas"]} páginas, {len(pdf) / 1024:,.0f} KB, '
+                          f'{len(verdad)} registros ({time.perf_counter() - t0:.2f}s)')
+
+        if options['guardar']:
+            ruta = options['guardar']
+        else:
+            descriptor, ruta = tempfile.mkstemp(suffix='.pdf')
+            os.close(descriptor)
+        try:
+            with open(ruta, 'wb') as destino:
+                destino.write(pdf)
+            casos = (
+                ('confirmación (extraer_datos_pdf)', _extraer_confirmacion),
+                ('carga_pdf / ZIP', _extraer_carga),
+            )
+            for nombre, extraer in casos:
+                self._medir(nombre, extraer, ruta, options['paginas'], esperadas)
+        finally:
+            if not options['guardar']:
+                os.remove(ruta)
+
+    def _medir(self, nombre, extraer, ruta, paginas, esperadas):
+        # Sin límite de tiempo práctico: se mide la extracción completa
+        presupuesto = Presupuesto(max_paginas=paginas, segundos_total=24 * 3600)
+        memoria_inicial = memoria_actual() or 0
+        t0 = time.perf_counter()
+        claves, omitidas = extraer(ruta, presupuesto)
+        segundos = time.perf_counter() - t0
+
+        extraidas = {clave for clave in claves if clave is not None}
+        ilegibles = sum(1 for clave in claves if clave is None)
+        aciertos = len(extraidas & esperadas)
+        precision = aciertos / ((len(extraidas) + ilegibles) or 1)
+        exhaustividad = aciertos / (len(esperadas) or 1)
+        self.stdout.write(
+            f'{nombre:<34} {(paginas - len(omitidas)) / segundos:>8,.1f} páginas/s ({segundos:.2f}s)  '
+            f'pico {presupuesto.memoria_pico / 2**20:,.1f} MB (inicio {memoria_inicial / 2**20:,.1f} MB)  '
+            f'precisión {precision:.1%}  exhaustividad {exhaustividad:.1%}  '
+            f'({len(extraidas)} únicos, {ilegibles} ilegibles, {len(omitidas)} páginas omitidas)'
+        )
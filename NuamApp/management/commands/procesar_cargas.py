@@ -0,0 +1,52 @@
+# NuamApp/management/commands/procesar_cargas.py
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from NuamApp.cola_utils import (
+    identificador_worker, tomar_trabajo, ejecutar_trabajo, reclamar_trabajos_abandonados
+)
+from NuamApp.subida_utils import limpiar_subidas_abandonadas
+from NuamApp.confirmacion_utils import limpiar_confirmaciones_abandonadas
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker de la cola de cargas masivas. Usa la base de datos como cola '
+        '(sin broker externo) y debe compartir MEDIA_ROOT con el servidor web.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los trabajos pendientes y termina')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera cuando la cola está vacía')
+
+    def handle(self, *args, **options):
+        worker = identificador_worker()
+        self.stdout.write(f'Worker {worker} esperando cargas...')
+
+        while True:
+            close_old_connections()
+
+            reclamados = reclamar_trabajos_abandonados()
+            if reclamados:
+                self.stdout.write(self.style.WARNING(f'{reclamados} trabajo(s) abandonado(s) devueltos a la cola'))
+
+            canceladas = limpiar_subidas_abandonadas()
+            if canceladas:
+                self.stdout.write(self.style.WARNING(f'{canceladas} subida(s) fragmentada(s) abandonada(s) canceladas'))
+
+            expiradas = limpiar_confirmaciones_abandonadas()
+            if expiradas:
+                self.stdout.write(self.style.WARNING(f'{expiradas} extracción(es) de PDF sin confirmar eliminadas'))
+
+            trabajo = tomar_trabajo(worker)
+            if trabajo is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            carga = ejecutar_trabajo(trabajo)
+            estilo = self.style.SUCCESS if carga.estado == 'completado' else self.style.ERROR
+            self.stdout.write(estilo(f'Carga #{carga.id_archivo} ({carga.tipo_archivo}): {carga.estado} - {carga.resultado}'))
@@ -0,0 +1,30 @@
+# NuamApp/management/commands/reconstruir_estadisticas.py
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from NuamApp.estadisticas_utils import reconstruir_estadisticas
+
+
+def _fecha(texto):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise CommandError(f'Fecha no válida (se espera AAAA-MM-DD): {texto}')
+
+
+class Command(BaseCommand):
+    help = ('Recalcula los resúmenes por día del dashboard de administración (EstadisticaCalificacion y '
+            'EstadisticaAuditoria) desde las tablas de calificaciones y auditoría. Sin fechas reconstruye todo; '
+            'con --desde/--hasta solo esos días (p. ej. tras una importación o un UPDATE masivo).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, metavar='AAAA-MM-DD', help='Primer día a reconstruir')
+        parser.add_argument('--hasta', type=_fecha, metavar='AAAA-MM-DD', help='Último día a reconstruir')
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde and hasta and hasta < desde:
+            raise CommandError('--hasta no puede ser anterior a --desde')
+        calificaciones, auditorias = reconstruir_estadisticas(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f'Resúmenes reconstruidos: {calificaciones} fila(s) de calificaciones y {auditorias} de auditoría'
+        ))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0002_remove_auditoria_detalles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='registros_fallidos',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivocarga',
+            name='registros_procesados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivocarga',
+            name='resultado',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='calificacion',
+            name='fk_id_archivo',
+            field=models.ForeignKey(blank=True, db_column='FK_ID_archivo', null=True, on_delete=django.db.models.deletion.SET_NULL, to='NuamApp.archivocarga'),
+        ),
+        migrations.CreateModel(
+            name='TrabajoCarga',
+            fields=[
+                ('id_trabajo', models.AutoField(primary_key=True, serialize=False)),
+                ('ruta_archivo', models.CharField(max_length=255)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('intentos', models.IntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=500, null=True)),
+                ('fk_id_archivo', models.OneToOneField(db_column='FK_ID_archivo', on_delete=django.db.models.deletion.CASCADE, related_name='trabajo', to='NuamApp.archivocarga')),
+            ],
+            options={
+                'db_table': 'trabajo_carga',
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='trabajo_car_estado_ad03c4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0003_cola_cargas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='bytes_procesados',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivocarga',
+            name='bytes_totales',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
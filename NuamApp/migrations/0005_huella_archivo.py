@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0004_progreso_carga'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='hash_sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='archivocarga',
+            index=models.Index(fields=['fk_id_usuario', 'hash_sha256'], name='archivocarga_usuario_hash_idx'),
+        ),
+    ]
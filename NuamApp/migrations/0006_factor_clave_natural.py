@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:57
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def eliminar_factores_duplicados(apps, schema_editor):
+    """
+    Deja un solo Factor por (nombre_factor, fecha_inicio) antes de crear la
+    restricción única. Se conserva el más reciente (mayor id, que es el que
+    trae el valor de la última recarga) y las calificaciones que apuntaban a
+    los duplicados pasan a apuntar a él.
+    """
+    Factor = apps.get_model('NuamApp', 'Factor')
+    CalificacionFactor = apps.get_model('NuamApp', 'CalificacionFactor')
+
+    repetidos = (
+        Factor.objects.values('nombre_factor', 'fecha_inicio')
+        .annotate(total=Count('id_factor'), conservar=Max('id_factor'))
+        .filter(total__gt=1)
+    )
+    for grupo in repetidos:
+        duplicados = Factor.objects.filter(
+            nombre_factor=grupo['nombre_factor'],
+            fecha_inicio=grupo['fecha_inicio'],
+        ).exclude(id_factor=grupo['conservar'])
+        CalificacionFactor.objects.filter(fk_id_factor__in=duplicados).update(fk_id_factor=grupo['conservar'])
+        duplicados.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0005_huella_archivo'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_factores_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='factor',
+            constraint=models.UniqueConstraint(fields=('nombre_factor', 'fecha_inicio'), name='factor_nombre_fecha_inicio_uniq'),
+        ),
+    ]
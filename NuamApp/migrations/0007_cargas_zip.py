@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0006_factor_clave_natural'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='fk_id_archivo_padre',
+            field=models.ForeignKey(blank=True, db_column='FK_ID_archivo_padre', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='miembros', to='NuamApp.archivocarga'),
+        ),
+    ]
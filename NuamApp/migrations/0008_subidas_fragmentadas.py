@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0007_cargas_zip'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaFragmentada',
+            fields=[
+                ('id_subida', models.AutoField(primary_key=True, serialize=False)),
+                ('nombre_archivo', models.CharField(max_length=150)),
+                ('tipo_archivo', models.CharField(max_length=30)),
+                ('tamano_total', models.BigIntegerField()),
+                ('tamano_fragmento', models.IntegerField()),
+                ('hash_sha256', models.CharField(blank=True, max_length=64, null=True)),
+                ('ruta_temporal', models.CharField(max_length=255)),
+                ('estado', models.CharField(choices=[('recibiendo', 'Recibiendo'), ('completada', 'Completada'), ('cancelada', 'Cancelada')], default='recibiendo', max_length=20)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('fk_id_archivo', models.OneToOneField(blank=True, db_column='FK_ID_archivo', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='subida', to='NuamApp.archivocarga')),
+                ('fk_id_usuario', models.ForeignKey(db_column='FK_ID_usuario', on_delete=django.db.models.deletion.CASCADE, to='NuamApp.usuario')),
+            ],
+            options={
+                'db_table': 'subida_fragmentada',
+            },
+        ),
+        migrations.CreateModel(
+            name='FragmentoSubida',
+            fields=[
+                ('id_fragmento', models.AutoField(primary_key=True, serialize=False)),
+                ('offset', models.BigIntegerField()),
+                ('tamano', models.IntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('fk_id_subida', models.ForeignKey(db_column='FK_ID_subida', on_delete=django.db.models.deletion.CASCADE, related_name='fragmentos', to='NuamApp.subidafragmentada')),
+            ],
+            options={
+                'db_table': 'fragmento_subida',
+                'constraints': [models.UniqueConstraint(fields=('fk_id_subida', 'offset'), name='fragmento_subida_offset_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0008_subidas_fragmentadas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='ruta_errores',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
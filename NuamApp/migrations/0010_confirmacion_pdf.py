@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0009_reporte_errores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroExtraidoPdf',
+            fields=[
+                ('id_registro', models.AutoField(primary_key=True, serialize=False)),
+                ('indice', models.IntegerField()),
+                ('fecha', models.DateField()),
+                ('fecha_texto', models.CharField(max_length=30)),
+                ('mercado', models.CharField(max_length=30)),
+                ('ano', models.IntegerField(blank=True, null=True)),
+                ('monto_original', models.CharField(max_length=50)),
+                ('monto_valor', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True)),
+                ('descripcion', models.CharField(blank=True, max_length=100, null=True)),
+                ('pagina', models.IntegerField()),
+                ('seleccionado', models.BooleanField(default=True)),
+                ('error', models.CharField(blank=True, max_length=300, null=True)),
+                ('fk_id_archivo', models.ForeignKey(db_column='FK_ID_archivo', on_delete=django.db.models.deletion.CASCADE, related_name='registros_extraidos', to='NuamApp.archivocarga')),
+            ],
+            options={
+                'db_table': 'registro_extraido_pdf',
+                'indexes': [models.Index(fields=['fk_id_archivo', 'indice'], name='registro_pdf_archivo_idx')],
+            },
+        ),
+    ]
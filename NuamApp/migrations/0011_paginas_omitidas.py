@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0010_confirmacion_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='paginas_omitidas',
+            field=models.IntegerField(default=0),
+        ),
+    ]
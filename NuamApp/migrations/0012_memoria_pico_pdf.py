@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0011_paginas_omitidas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='memoria_pico',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0012_memoria_pico_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantillaPdf',
+            fields=[
+                ('id_plantilla', models.AutoField(db_column='ID_plantilla', primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=50)),
+                ('encabezado', models.CharField(max_length=200)),
+                ('columnas', models.CharField(default='fecha,mercado,ano,monto', max_length=200)),
+                ('bordes_columnas', models.CharField(blank=True, default='', max_length=200)),
+                ('area', models.CharField(blank=True, default='', max_length=100)),
+                ('formato_fecha', models.CharField(blank=True, default='', max_length=20)),
+                ('pagina_inicio', models.IntegerField(default=1)),
+                ('pagina_fin', models.IntegerField(blank=True, null=True)),
+                ('activa', models.BooleanField(default=True)),
+                ('fk_id_corredor', models.ForeignKey(db_column='FK_ID_corredor', on_delete=django.db.models.deletion.CASCADE, related_name='plantillas_pdf', to='NuamApp.corredor')),
+            ],
+            options={
+                'db_table': 'plantilla_pdf',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0013_plantillas_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='paginas_descartadas',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:51
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def cargar_estadisticas(apps, schema_editor):
+    """Resúmenes de la historia existente (lo mismo que reconstruir_estadisticas)"""
+    resumenes = (
+        ('Calificacion', 'fecha_creacion', 'EstadisticaCalificacion', ('dia', 'mercado', 'origen')),
+        ('Auditoria', 'fecha_hora', 'EstadisticaAuditoria', ('dia',)),
+    )
+    for origen, campo_fecha, destino, campos in resumenes:
+        Destino = apps.get_model('NuamApp', destino)
+        conteos = (apps.get_model('NuamApp', origen).objects.annotate(dia=TruncDate(campo_fecha))
+                   .order_by().values(*campos).annotate(cantidad=Count('pk')))
+        Destino.objects.bulk_create([Destino(**conteo) for conteo in conteos], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0014_triaje_paginas_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaAuditoria',
+            fields=[
+                ('id_estadistica', models.AutoField(primary_key=True, serialize=False)),
+                ('dia', models.DateField(unique=True)),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'estadistica_auditoria',
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaCalificacion',
+            fields=[
+                ('id_estadistica', models.AutoField(primary_key=True, serialize=False)),
+                ('dia', models.DateField()),
+                ('mercado', models.CharField(max_length=30)),
+                ('origen', models.CharField(max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'estadistica_calificacion',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'mercado', 'origen'), name='estadistica_calificacion_clave_uniq')],
+            },
+        ),
+        migrations.RunPython(cargar_estadisticas, migrations.RunPython.noop),
+    ]
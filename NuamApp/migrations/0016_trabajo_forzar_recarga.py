@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0015_estadisticas_dashboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajocarga',
+            name='forzar_recarga',
+            field=models.BooleanField(default=False),
+        ),
+    ]
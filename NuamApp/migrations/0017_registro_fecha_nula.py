@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('NuamApp', '0016_trabajo_forzar_recarga'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroextraidopdf',
+            name='fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
 class Archivocarga(models.Model):
@@ -8,9 +9,32 @@ class Archivocarga(models.Model):
     archivo_url = models.CharField(max_length=150, blank=True, null=True)
     # CAMBIADO: Usar cadena 'Usuario'
     fk_id_usuario = models.ForeignKey('Usuario', on_delete=models.CASCADE, db_column='FK_ID_usuario')
+    # Resultado del procesamiento (lo completa la cola de cargas)
+    registros_procesados = models.IntegerField(default=0)
+    registros_fallidos = models.IntegerField(default=0)
+    resultado = models.CharField(max_length=500, blank=True, null=True)
+    # Avance en vivo (se actualiza por lote, no por fila)
+    bytes_totales = models.BigIntegerField(default=0)
+    bytes_procesados = models.BigIntegerField(default=0)
+    # Reporte de filas con error (CSV fila,error en el storage)
+    ruta_errores = models.CharField(max_length=255, blank=True, null=True)
+    # Huella SHA-256 del archivo subido (detecta cargas repetidas)
+    hash_sha256 = models.CharField(max_length=64, blank=True, null=True)
+    # Páginas de un PDF que no se extrajeron por los límites de tiempo o de páginas
+    paginas_omitidas = models.IntegerField(default=0)
+    # Páginas de un PDF descartadas por el triaje (sin mercados o casi sin dígitos)
+    paginas_descartadas = models.IntegerField(default=0)
+    # Pico de memoria (RSS, en bytes) del proceso que extrajo el PDF
+    memoria_pico = models.BigIntegerField(null=True, blank=True)
+    # Los archivos que llegan dentro de un ZIP apuntan a la carga del ZIP
+    fk_id_archivo_padre = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                            related_name='miembros', db_column='FK_ID_archivo_padre')
 
     class Meta:
         db_table = 'archivocarga'
+        indexes = [
+            models.Index(fields=['fk_id_usuario', 'hash_sha256'], name='archivocarga_usuario_hash_idx'),
+        ]
 
 
 class Auditoria(models.Model):
@@ -52,6 +76,8 @@ class Calificacion(models.Model):
                              choices=[('manual', 'Manual'), ('csv', 'CSV'), ('sistema', 'Sistema')])
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
+    # Carga masiva que originó el registro (permite reintentar sin duplicar)
+    fk_id_archivo = models.ForeignKey(Archivocarga, on_delete=models.SET_NULL, null=True, blank=True, db_column='FK_ID_archivo')
 
     class Meta:
         db_table = 'calificacion'
@@ -83,6 +109,50 @@ class Corredor(models.Model):
         db_table = 'corredor'
 
 
+class PlantillaPdf(models.Model):
+    """
+    Tabla de movimientos de los PDF de un corredor. extraer_datos_pdf la
+    usa para leer esa tabla directo en las páginas donde aparece, en vez
+    de las heurísticas (ver pdf_utils.PlantillaTabla).
+    """
+    id_plantilla = models.AutoField(db_column='ID_plantilla', primary_key=True)
+    fk_id_corredor = models.ForeignKey(Corredor, on_delete=models.CASCADE, db_column='FK_ID_corredor',
+                                       related_name='plantillas_pdf')
+    nombre = models.CharField(max_length=50)
+    # Texto de la fila de encabezado (las celdas separadas por espacios); identifica la tabla
+    encabezado = models.CharField(max_length=200)
+    # Qué es cada columna, en orden: fecha, mercado, ano, monto ('-' = columna que no se usa)
+    columnas = models.CharField(max_length=200, default='fecha,mercado,ano,monto')
+    # x de los bordes de las columnas en puntos ("50,140,230,290,410"); vacío = líneas dibujadas del PDF
+    bordes_columnas = models.CharField(max_length=200, blank=True, default='')
+    # Zona de la página con la tabla: "x0,top,x1,bottom" en puntos; vacío = página completa
+    area = models.CharField(max_length=100, blank=True, default='')
+    # Formato strptime ("%d/%m/%Y"); vacío = los formatos que entiende parse_utils
+    formato_fecha = models.CharField(max_length=20, blank=True, default='')
+    pagina_inicio = models.IntegerField(default=1)
+    pagina_fin = models.IntegerField(blank=True, null=True)
+    activa = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = 'plantilla_pdf'
+
+    def __str__(self):
+        return self.nombre
+
+    def como_plantilla(self):
+        """PlantillaTabla (sin BD) para la extracción; lanza ValueError si algún campo no es válido"""
+        from .pdf_utils import PlantillaTabla
+        return PlantillaTabla.desde_textos(self.id_plantilla, self.nombre, self.encabezado, self.columnas,
+                                           self.bordes_columnas, self.area, self.formato_fecha,
+                                           self.pagina_inicio, self.pagina_fin)
+
+    def clean(self):
+        try:
+            self.como_plantilla()
+        except ValueError as e:
+            raise ValidationError(str(e))
+
+
 class Factor(models.Model):
     id_factor = models.AutoField(db_column='ID_factor', primary_key=True)
     nombre_factor = models.CharField(max_length=50)
@@ -92,6 +162,10 @@ class Factor(models.Model):
 
     class Meta:
         db_table = 'factor'
+        constraints = [
+            # Clave natural: las cargas de factores hacen upsert sobre ella
+            models.UniqueConstraint(fields=['nombre_factor', 'fecha_inicio'], name='factor_nombre_fecha_inicio_uniq'),
+        ]
 
 
 class Permiso(models.Model):
@@ -137,4 +211,145 @@ class UsuarioPermiso(models.Model):
     fk_id_permiso = models.ForeignKey(Permiso, on_delete=models.PROTECT, db_column='FK_ID_permiso')
 
     class Meta:
-        db_table = 'usuario_permiso'
\ No newline at end of file
+        db_table = 'usuario_permiso'
+
+
+class TrabajoCarga(models.Model):
+    """Trabajo en cola para procesar una carga masiva fuera del request"""
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    id_trabajo = models.AutoField(primary_key=True)
+    fk_id_archivo = models.OneToOneField(Archivocarga, on_delete=models.CASCADE, db_column='FK_ID_archivo', related_name='trabajo')
+    ruta_archivo = models.CharField(max_length=255)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_heartbeat = models.DateTimeField(blank=True, null=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    error = models.CharField(max_length=500, blank=True, null=True)
+    # En un ZIP: no omitir los archivos que el usuario ya había cargado
+    forzar_recarga = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'trabajo_carga'
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id_trabajo} - {self.estado}"
+
+
+class SubidaFragmentada(models.Model):
+    """Subida reanudable de un archivo grande, enviado por fragmentos"""
+    ESTADOS = [
+        ('recibiendo', 'Recibiendo'),
+        ('completada', 'Completada'),
+        ('cancelada', 'Cancelada'),
+    ]
+
+    id_subida = models.AutoField(primary_key=True)
+    fk_id_usuario = models.ForeignKey('Usuario', on_delete=models.CASCADE, db_column='FK_ID_usuario')
+    nombre_archivo = models.CharField(max_length=150)
+    tipo_archivo = models.CharField(max_length=30)
+    tamano_total = models.BigIntegerField()
+    tamano_fragmento = models.IntegerField()
+    # SHA-256 del archivo completo informado por el cliente (opcional)
+    hash_sha256 = models.CharField(max_length=64, blank=True, null=True)
+    ruta_temporal = models.CharField(max_length=255)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='recibiendo')
+    fk_id_archivo = models.OneToOneField(Archivocarga, on_delete=models.SET_NULL, null=True, blank=True,
+                                         db_column='FK_ID_archivo', related_name='subida')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'subida_fragmentada'
+
+    def __str__(self):
+        return f"Subida {self.id_subida} - {self.nombre_archivo} ({self.estado})"
+
+
+class FragmentoSubida(models.Model):
+    """Fragmento recibido y verificado de una SubidaFragmentada"""
+    id_fragmento = models.AutoField(primary_key=True)
+    fk_id_subida = models.ForeignKey(SubidaFragmentada, on_delete=models.CASCADE, db_column='FK_ID_subida',
+                                     related_name='fragmentos')
+    offset = models.BigIntegerField()
+    tamano = models.IntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        db_table = 'fragmento_subida'
+        constraints = [
+            models.UniqueConstraint(fields=['fk_id_subida', 'offset'], name='fragmento_subida_offset_uniq'),
+        ]
+
+
+class RegistroExtraidoPdf(models.Model):
+    """
+    Registro extraído de un PDF a la espera de que el usuario lo confirme.
+
+    Cuelga de una Archivocarga en estado 'por_confirmar'; al confirmar, los
+    seleccionados pasan a `calificacion` con un INSERT ... SELECT y la
+    tabla se vacía para esa carga.
+    """
+    id_registro = models.AutoField(primary_key=True)
+    fk_id_archivo = models.ForeignKey(Archivocarga, on_delete=models.CASCADE, db_column='FK_ID_archivo',
+                                      related_name='registros_extraidos')
+    # Posición en la extracción (es la "fila" del reporte de errores)
+    indice = models.IntegerField()
+    # None si fecha_texto no se pudo leer (el registro queda con error)
+    fecha = models.DateField(blank=True, null=True)
+    fecha_texto = models.CharField(max_length=30)
+    mercado = models.CharField(max_length=30)
+    ano = models.IntegerField(blank=True, null=True)
+    monto_original = models.CharField(max_length=50)
+    monto_valor = models.DecimalField(max_digits=10, decimal_places=4, blank=True, null=True)
+    descripcion = models.CharField(max_length=100, blank=True, null=True)
+    pagina = models.IntegerField()
+    seleccionado = models.BooleanField(default=True)
+    # Motivo por el que el registro no se puede guardar (None si es válido)
+    error = models.CharField(max_length=300, blank=True, null=True)
+
+    class Meta:
+        db_table = 'registro_extraido_pdf'
+        indexes = [
+            models.Index(fields=['fk_id_archivo', 'indice'], name='registro_pdf_archivo_idx'),
+        ]
+
+
+class EstadisticaCalificacion(models.Model):
+    """
+    Cantidad de calificaciones por día de creación, mercado y origen. La
+    mantiene estadisticas_utils a medida que se escriben o borran
+    calificaciones; el dashboard de administración lee de aquí.
+    """
+    id_estadistica = models.AutoField(primary_key=True)
+    dia = models.DateField()
+    mercado = models.CharField(max_length=30)
+    origen = models.CharField(max_length=20)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'estadistica_calificacion'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'mercado', 'origen'], name='estadistica_calificacion_clave_uniq'),
+        ]
+
+
+class EstadisticaAuditoria(models.Model):
+    """Cantidad de eventos de auditoría por día (ver EstadisticaCalificacion)"""
+    id_estadistica = models.AutoField(primary_key=True)
+    dia = models.DateField(unique=True)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'estadistica_auditoria'
@@ -0,0 +1,131 @@
+# NuamApp/parse_utils.py
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+# ========== PATRONES PRECOMPILADOS ==========
+
+_FECHA_DMY = re.compile(r'^(\d{1,2})[/-](\d{1,2})[/-](\d{4}|\d{2})$')
+_FECHA_YMD = re.compile(r'^(\d{4})[/-](\d{1,2})[/-](\d{1,2})$')
+_NO_NUMERICO = re.compile(r'[^\d,.\-]')
+_MILES_CON_PUNTO = re.compile(r'^-?[1-9]\d{0,2}(?:\.\d{3})+$')
+
+# ========== VALORES INDIVIDUALES ==========
+
+@lru_cache(maxsize=4096)
+def parsear_fecha(texto):
+    """
+    Convierte 'YYYY-MM-DD', 'YYYY/MM/DD', 'DD/MM/YYYY' o 'DD-MM-YY' a date.
+
+    El camino ISO usa date.fromisoformat; el resultado queda memorizado
+    porque los archivos repiten mucho las mismas fechas.
+    """
+    texto = texto.strip()
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        pass
+
+    match = _FECHA_YMD.match(texto)
+    if match:
+        ano, mes, dia = match.groups()
+        return date(int(ano), int(mes), int(dia))
+
+    match = _FECHA_DMY.match(texto)
+    if not match:
+        raise ValueError(f'Fecha no válida: {texto}')
+    dia, mes, ano = match.groups()
+    if len(ano) == 2:
+        ano = '20' + ano
+    return date(int(ano), int(mes), int(dia))
+
+def parsear_monto(texto):
+    """
+    Convierte un monto a Decimal sin pasar por float.
+
+    Acepta formato chileno (1.234.567,89), anglosajón (1,234,567.89) y
+    símbolos de moneda. Un único punto seguido de exactamente tres dígitos
+    se interpreta como separador de miles (1.234 -> 1234), salvo que la
+    parte entera sea 0 (0.125 es un decimal).
+    """
+    if isinstance(texto, Decimal):
+        return texto
+    texto = str(texto).strip()
+    if texto.isdigit():
+        return Decimal(texto)
+
+    limpio = _NO_NUMERICO.sub('', texto)
+    if ',' in limpio and '.' in limpio:
+        if limpio.rfind(',') > limpio.rfind('.'):
+            limpio = limpio.replace('.', '').replace(',', '.')
+        else:
+            limpio = limpio.replace(',', '')
+    elif ',' in limpio:
+        limpio = limpio.replace(',', '.') if limpio.count(',') == 1 else limpio.replace(',', '')
+    elif limpio.count('.') > 1 or _MILES_CON_PUNTO.match(limpio):
+        limpio = limpio.replace('.', '')
+
+    try:
+        return Decimal(limpio)
+    except InvalidOperation:
+        raise ValueError(f'Monto no válido: {texto}')
+
+def parsear_entero(texto):
+    """Convierte a int tolerando espacios"""
+    return int(str(texto).strip())
+
+parsear_ano = parsear_entero
+
+# ========== COLUMNAS COMPLETAS ==========
+
+def _parsear_columna(valores, parser, vacio=None):
+    resultados = []
+    errores = {}
+    for i, valor in enumerate(valores):
+        if valor is None or valor == '':
+            if vacio is not None:
+                resultados.append(vacio)
+                continue
+            resultados.append(None)
+            errores[i] = 'Valor vacío'
+            continue
+        try:
+            resultados.append(parser(valor))
+        except (ValueError, TypeError) as e:
+            resultados.append(None)
+            errores[i] = str(e)
+    return resultados, errores
+
+def parsear_fechas(valores, vacio=None):
+    """Parsea una columna de fechas; retorna (fechas, errores {indice: mensaje})"""
+    return _parsear_columna(valores, parsear_fecha, vacio)
+
+def parsear_montos(valores, vacio=None):
+    """Parsea una columna de montos a Decimal; retorna (montos, errores)"""
+    return _parsear_columna(valores, parsear_monto, vacio)
+
+def parsear_enteros(valores, vacio=None):
+    """Parsea una columna de enteros; retorna (enteros, errores)"""
+    return _parsear_columna(valores, parsear_entero, vacio)
+
+parsear_anos = parsear_enteros
+
+def parsear_lote(filas, parsers):
+    """
+    Aplica un parser por columna sobre un lote de filas (dicts).
+
+    `parsers` mapea columna -> función de columna (parsear_fechas, ...) o
+    una tupla (función, vacio). Retorna (columnas, errores) donde columnas
+    mapea cada nombre a su lista de valores y errores guarda el primer
+    error de cada fila {indice: mensaje}.
+    """
+    columnas = {}
+    errores = {}
+    for columna, parser in parsers.items():
+        parser, vacio = parser if isinstance(parser, tuple) else (parser, None)
+        valores, errores_columna = parser([fila.get(columna) for fila in filas], vacio)
+        columnas[columna] = valores
+        for i, mensaje in errores_columna.items():
+            errores.setdefault(i, f'{columna}: {mensaje}')
+    return columnas, errores
@@ -0,0 +1,860 @@
+# NuamApp/pdf_utils.py
+import hashlib
+import json
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, datetime
+import pdfplumber
+from pdfminer.pdftypes import resolve1
+from pdfminer.psparser import LIT
+from django.conf import settings
+from django.db import connections
+from . import escaner_utils
+from .parse_utils import parsear_fecha, parsear_monto
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Este módulo no toca la base de datos (solo cierra las conexiones antes de
+# abrir un pool): sus funciones reciben una ruta o un archivo y retornan
+# datos planos, así pueden correr en un pool de procesos.
+
+# ========== PRESUPUESTO DE TIEMPO Y PÁGINAS ==========
+
+# Un PDF malformado o escaneado puede dejar a pdfplumber minutos en una
+# sola página y al worker web muerto por timeout a mitad de una escritura.
+# Cada extracción tiene un máximo de páginas (CARGA_PDF_MAX_PAGINAS), un
+# tiempo por página (CARGA_PDF_SEGUNDOS_POR_PAGINA) y uno total
+# (CARGA_PDF_SEGUNDOS_TOTAL). Las páginas que no caben se omiten y se
+# informan como (página, motivo); la extracción termina con lo que alcanzó
+# a leer.
+
+MOTIVO_LIMITE_PAGINAS = 'límite de páginas'
+MOTIVO_TIEMPO_PAGINA = 'tiempo por página'
+MOTIVO_TIEMPO_TOTAL = 'tiempo total'
+
+class PaginaExcedida(BaseException):
+    """
+    La página superó su presupuesto de tiempo. Hereda de BaseException
+    para que un `except Exception` dentro de pdfplumber no la absorba.
+    """
+
+def _interrumpir(signum, frame):
+    raise PaginaExcedida()
+
+def _puede_interrumpir():
+    """
+    SIGALRM solo se puede usar en el hilo principal (worker sync de
+    gunicorn, procesos del pool) y si nadie más está usando el timer. En
+    otro caso el límite por página se revisa entre pasos, sin cortar una
+    llamada a pdfplumber a la mitad.
+    """
+    return (hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+            and signal.getitimer(signal.ITIMER_REAL)[0] == 0)
+
+class Presupuesto:
+    """
+    Límites de una extracción. El plazo total es una hora de reloj
+    (time.time), así se puede pasar a los procesos del pool y todos
+    cortan al mismo tiempo. También guarda el pico de memoria medido
+    durante la extracción (`memoria_pico`, en bytes).
+    """
+
+    def __init__(self, max_paginas=None, segundos_pagina=None, segundos_total=None):
+        self.max_paginas = max_paginas or getattr(settings, 'CARGA_PDF_MAX_PAGINAS', 500)
+        self.segundos_pagina = segundos_pagina or getattr(settings, 'CARGA_PDF_SEGUNDOS_POR_PAGINA', 10)
+        self.limite = time.time() + (segundos_total or getattr(settings, 'CARGA_PDF_SEGUNDOS_TOTAL', 120))
+        self._fin_pagina = None
+        self.memoria_pico = 0
+
+    def medir_memoria(self, memoria=None):
+        """Actualiza el pico con la memoria actual del proceso (o con `memoria`, medida en otro)"""
+        memoria = memoria_actual() if memoria is None else memoria
+        self.memoria_pico = max(self.memoria_pico, memoria or 0)
+
+    def agotado(self):
+        return time.time() >= self.limite
+
+    def motivo_exceso(self):
+        return MOTIVO_TIEMPO_TOTAL if self.agotado() else MOTIVO_TIEMPO_PAGINA
+
+    def verificar(self):
+        """Punto de control dentro de una página (para cuando no se puede usar SIGALRM)"""
+        if self._fin_pagina is not None and time.time() >= self._fin_pagina:
+            raise PaginaExcedida()
+
+    @contextmanager
+    def pagina(self):
+        """Corre el bloque con el presupuesto de una página; lanza PaginaExcedida si se pasa"""
+        segundos = min(self.segundos_pagina, self.limite - time.time())
+        if segundos <= 0:
+            raise PaginaExcedida()
+        self._fin_pagina = time.time() + segundos
+        alarma = _puede_interrumpir()
+        if alarma:
+            anterior = signal.signal(signal.SIGALRM, _interrumpir)
+            signal.setitimer(signal.ITIMER_REAL, segundos)
+        try:
+            yield
+        finally:
+            if alarma:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, anterior)
+        self.verificar()
+        self._fin_pagina = None
+
+    def separar_paginas(self, total_paginas):
+        """Páginas que entran en el máximo y las omitidas por él, como (página, motivo)"""
+        permitidas = min(total_paginas, self.max_paginas)
+        omitidas = [(page_num, MOTIVO_LIMITE_PAGINAS) for page_num in range(permitidas + 1, total_paginas + 1)]
+        return range(1, permitidas + 1), omitidas
+
+def con_presupuesto(presupuesto, funcion, *args):
+    """Corre funcion(*args) dentro del presupuesto de una página; retorna (resultado, motivo)"""
+    try:
+        with presupuesto.pagina():
+            return funcion(*args), None
+    except PaginaExcedida:
+        return None, presupuesto.motivo_exceso()
+
+def resumir_omitidas(omitidas):
+    """[(5, m1), (6, m1), (9, m2)] -> '3 página(s) omitida(s): 5-6 (m1), 9 (m2)'"""
+    tramos = []
+    for page_num, motivo in sorted(omitidas):
+        if tramos and tramos[-1][2] == motivo and tramos[-1][1] == page_num - 1:
+            tramos[-1][1] = page_num
+        else:
+            tramos.append([page_num, page_num, motivo])
+    detalle = ', '.join(f'{i}-{f} ({m})' if i != f else f'{i} ({m})' for i, f, m in tramos)
+    return f'{len(omitidas)} página(s) omitida(s): {detalle}'
+
+# ========== MEMORIA ==========
+
+# pdfplumber guarda en cada página los objetos de layout ya analizados
+# (caracteres, palabras, mapa de texto) mientras el PDF siga abierto, así
+# que la memoria del proceso crecía con el largo del documento y no se
+# devolvía. Cada página se libera apenas se procesa; la memoria se mide
+# antes de liberarla, que es cuando está en su punto más alto.
+
+def liberar_pagina(page):
+    """Suelta los objetos de layout que pdfplumber dejó guardados en la página"""
+    page.flush_cache()
+    # En pdfplumber 0.9.0 Page.__init__ envuelve get_textmap en un
+    # lru_cache propio de la página; flush_cache no lo limpia y es lo que
+    # más ocupa (sin esto un PDF de 400 páginas pasa de ~70MB a ~1GB)
+    page.get_textmap.cache_clear()
+
+def memoria_actual():
+    """
+    Memoria residente (RSS) del proceso en bytes, o None si no se puede
+    medir. Fuera de Linux se usa el máximo histórico de getrusage, que
+    también sirve para calcular un pico.
+    """
+    try:
+        with open('/proc/self/statm') as origen:
+            return int(origen.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # En macOS ru_maxrss viene en bytes; en el resto, en KB
+    return maximo if sys.platform == 'darwin' else maximo * 1024
+
+# ========== EXTRACCIÓN ==========
+
+MERCADOS_VALIDOS = ['Acciones', 'Bonos', 'Derivados', 'Monedas', 'Acción', 'Bono', 'Derivado', 'Moneda']
+_LETRAS = re.compile(r'[A-Za-zñÑáéíóúÁÉÍÓÚ]')
+
+# Cada calificación extraída es una tupla con estos campos; la carga arma
+# el dict de cada una recién al insertarla
+CAMPOS_CALIFICACION_PDF = ('fecha', 'mercado', 'ano', 'factor', 'descripcion')
+
+def extraer_calificaciones_pagina(text, page_num):
+    """
+    Registros fecha → mercado → año → monto de una página, como tuplas
+    CAMPOS_CALIFICACION_PDF.
+
+    Usa las secuencias del escáner: entre la fecha y el año debe haber
+    texto (el mercado, que se normaliza a MERCADOS_VALIDOS u 'Otro').
+    """
+    datos = []
+    descripcion = f'PDF Página {page_num} - Extracción automática'
+    for fecha, entre, ano, monto, mercados in escaner_utils.secuencias_texto(text):
+        if not _LETRAS.search(entre):
+            continue
+        try:
+            monto_val = parsear_monto(monto)
+        except ValueError:
+            continue
+        datos.append((fecha, next((m for m in MERCADOS_VALIDOS if m in mercados), 'Otro'),
+                      ano, monto_val, descripcion))
+    return datos
+
+def extraer_calificaciones_pdf(archivo, presupuesto=None):
+    """
+    Extrae las calificaciones de un PDF de corredor.
+
+    `archivo` puede ser una ruta o un archivo abierto. Retorna (datos,
+    omitidas, memoria_pico): las tuplas CAMPOS_CALIFICACION_PDF (sin
+    validar contra la BD; eso lo hace la carga al insertar), las páginas
+    que no entraron en el Presupuesto, como (página, motivo), y el pico de
+    memoria del proceso durante la extracción.
+    """
+    presupuesto = presupuesto or Presupuesto()
+    datos = []
+    memoria_pico = 0
+    with pdfplumber.open(archivo) as pdf:
+        paginas, omitidas = presupuesto.separar_paginas(len(pdf.pages))
+        for page_num in paginas:
+            page = pdf.pages[page_num - 1]
+            try:
+                text, motivo = con_presupuesto(presupuesto, page.extract_text)
+                memoria_pico = max(memoria_pico, memoria_actual() or 0)
+            finally:
+                liberar_pagina(page)
+            if motivo:
+                omitidas.append((page_num, motivo))
+            elif text:
+                datos.extend(extraer_calificaciones_pagina(text, page_num))
+    presupuesto.medir_memoria(memoria_pico)
+    return datos, sorted(omitidas), memoria_pico
+
+# ========== EXTRACCIÓN PARA CONFIRMACIÓN (extraer_datos_pdf) ==========
+
+# Cada registro es una tupla compacta con estos campos (así viajan entre
+# procesos sin el costo de serializar dicts)
+CAMPOS_REGISTRO_PDF = ('fecha', 'mercado', 'ano', 'monto_original', 'descripcion', 'pagina')
+
+MERCADOS_CONFIRMACION = ['Acciones', 'Bonos', 'Derivados', 'Monedas']
+
+def _registro_de_aciertos(aciertos, monto, descripcion, page_num, ano_actual):
+    """Registro si el tramo tiene fecha y mercado; si no hay año se usa el actual"""
+    fecha = escaner_utils.primero(aciertos, 'fecha')
+    mercado = escaner_utils.primer_mercado(aciertos, MERCADOS_CONFIRMACION)
+    if not (fecha and mercado and monto):
+        return None
+    return (fecha.texto, mercado, escaner_utils.primer_ano(aciertos) or ano_actual, monto, descripcion, page_num)
+
+def registros_de_contenido(text, tablas, page_num):
+    """
+    Registros candidatos a partir del texto y las tablas de una página:
+    patrón directo, líneas con montos y filas de tablas, en ese orden.
+    Retorna tuplas CAMPOS_REGISTRO_PDF. No usa pdfplumber, así se puede
+    recalcular desde el caché; el texto se escanea una sola vez.
+    """
+    if not text or len(text.strip()) < 10:
+        return []
+
+    registros = []
+    ano_actual = str(date.today().year)
+    aciertos = escaner_utils.escanear(text)
+
+    # 1. Fecha - Mercado - Año - Monto (el mercado es el último antes del año)
+    descripcion = f'PDF Página {page_num} - Patrón directo'
+    for fecha, ano, monto, mercados, _ in escaner_utils.secuencias(aciertos, text):
+        if mercados:
+            registros.append((fecha.texto, mercados[-1].texto, ano.texto, monto.texto, descripcion, page_num))
+
+    # 2. Líneas con montos grandes; se toma el mayor de la línea. Los montos
+    #    solo se parsean en las líneas que ya tienen fecha y mercado
+    lineas = text.split('\n')
+    for linea_num, aciertos_linea in escaner_utils.por_linea(aciertos).items():
+        if len(lineas[linea_num].strip()) < 20:
+            continue
+        fecha = escaner_utils.primero(aciertos_linea, 'fecha')
+        mercado = fecha and escaner_utils.primer_mercado(aciertos_linea, MERCADOS_CONFIRMACION)
+        if not mercado:
+            continue
+        montos_validos = []
+        for acierto in aciertos_linea:
+            # Los enteros largos sin separadores son folios o referencias, no montos
+            if acierto.tipo != 'monto' or (len(acierto.texto) > 3 and acierto.texto.isdigit()):
+                continue
+            try:
+                valor = parsear_monto(acierto.texto)
+            except ValueError:
+                continue
+            if valor > 100:  # Solo montos significativos
+                montos_validos.append((valor, acierto.texto))
+        if montos_validos:
+            # max conserva el primero ante empate
+            registros.append((fecha.texto, mercado, escaner_utils.primer_ano(aciertos_linea) or ano_actual,
+                              max(montos_validos, key=lambda m: m[0])[1],
+                              f'PDF Página {page_num} - Línea {linea_num+1}', page_num))
+
+    # 3. Tablas estructuradas
+    for table_num, table in enumerate(tablas):
+        for row_num, row in enumerate(table):
+            aciertos_fila = escaner_utils.escanear(' '.join([str(cell) for cell in row if cell]))
+            monto = escaner_utils.primero(aciertos_fila, 'monto')
+            registro = _registro_de_aciertos(aciertos_fila, monto and monto.texto,
+                                             f'PDF Página {page_num} - Tabla {table_num+1}, Fila {row_num+1}',
+                                             page_num, ano_actual)
+            if registro:
+                registros.append(registro)
+    return registros
+
+def analizar_pagina(page, presupuesto=None):
+    """
+    Texto y tablas de una página. Es el paso caro (análisis de layout de
+    pdfplumber) y corre una sola vez por página; las páginas sin texto o
+    sin líneas dibujadas no se analizan en busca de tablas (la estrategia
+    por defecto de pdfplumber arma las tablas con esas líneas). Con
+    `presupuesto`, entre el texto y las tablas se revisa que la página no
+    se haya pasado de tiempo.
+    """
+    text = page.extract_text() or ''
+    if len(text.strip()) < 10 or not tiene_lineas(page):
+        return text, []
+    if presupuesto:
+        presupuesto.verificar()
+    return text, page.extract_tables()
+
+# ========== TRIAJE DE PÁGINAS ==========
+
+# Antes del análisis completo, cada página se clasifica leyendo solo su
+# stream de contenido (los operadores de dibujo, descomprimidos), sin que
+# pdfminer interprete la página ni arme caracteres. Una página sin
+# operadores de texto, con casi ningún dígito o sin el nombre de ningún
+# mercado no puede dar registros (las tres reglas de registros_de_contenido
+# exigen fecha, mercado y monto), así que se descarta.
+#
+# Los dígitos y mercados solo se buscan en los strings del stream cuando
+# todas las fuentes de la página son simples (Type1/TrueType sin tabla de
+# Differences ni ToUnicode): ahí cada byte es el carácter. Con fuentes
+# compuestas, Type3, formularios (XObject /Form) o un stream que no se
+# puede leer la página siempre es candidata. Se desactiva con
+# CARGA_PDF_TRIAJE = False.
+
+DESCARTE_SIN_TEXTO = 'sin texto'
+DESCARTE_POCOS_DIGITOS = 'pocos dígitos'
+DESCARTE_SIN_MERCADOS = 'sin mercados'
+MOTIVOS_DESCARTE = (DESCARTE_SIN_TEXTO, DESCARTE_POCOS_DIGITOS, DESCARTE_SIN_MERCADOS)
+
+# Más amplio que el escáner (acci cubre acción y acciones), para no
+# descartar una página que sí tiene registros
+_CLAVE_MERCADO = re.compile(r'acci|bono|derivado|moneda', re.IGNORECASE)
+
+_OPERADOR_TEXTO = re.compile(rb'(?<![A-Za-z])(?:Tj|TJ|\'|")(?![A-Za-z])')
+_STRING_LITERAL = re.compile(rb'\((?:\\.|[^\\()])*\)', re.DOTALL)
+_STRING_HEX = re.compile(rb'(?<!<)<([0-9A-Fa-f\s]*)>(?!>)')
+_ESCAPE = re.compile(rb'\\([0-7]{1,3}|.)', re.DOTALL)
+_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+def tiene_lineas(page):
+    return bool(page.lines or page.rects or page.curves)
+
+def _desescapar(literal):
+    """Bytes de un string literal '(...)' del stream, con sus escapes resueltos"""
+    def reemplazo(escape):
+        codigo = escape.group(1)
+        if codigo.isdigit():
+            return bytes([int(codigo, 8) & 0xFF])
+        if codigo in (b'\r', b'\n'):
+            return b''  # continuación de línea
+        return _ESCAPES.get(codigo, codigo)
+    return _ESCAPE.sub(reemplazo, literal[1:-1])
+
+def _fuentes_simples(recursos):
+    """True si los strings del stream se pueden leer byte a byte como caracteres"""
+    for fuente in (resolve1(recursos.get('Font')) or {}).values():
+        fuente = resolve1(fuente) or {}
+        if (fuente.get('Subtype') not in (LIT('Type1'), LIT('TrueType'), LIT('MMType1'))
+                or 'ToUnicode' in fuente or isinstance(resolve1(fuente.get('Encoding')), dict)):
+            return False
+    for objeto in (resolve1(recursos.get('XObject')) or {}).values():
+        if resolve1(objeto).get('Subtype') == LIT('Form'):
+            return False
+    return True
+
+def contenido_pagina(page):
+    """Bytes (descomprimidos) del stream de contenido de la página, o None si no se pueden leer"""
+    try:
+        return b'\n'.join(resolve1(stream).get_data() for stream in page.page_obj.contents)
+    except Exception:
+        return None
+
+def clasificar_pagina(page):
+    """Motivo para descartar la página (uno de MOTIVOS_DESCARTE) o None si es candidata"""
+    contenido = contenido_pagina(page)
+    if contenido is None:
+        return None
+    recursos = resolve1(page.page_obj.resources) or {}
+    if not _OPERADOR_TEXTO.search(contenido):
+        # Sin texto propio; un formulario podría traerlo
+        return DESCARTE_SIN_TEXTO if _fuentes_simples(recursos) else None
+    if not _fuentes_simples(recursos):
+        return None
+
+    partes = [_desescapar(literal) for literal in _STRING_LITERAL.findall(contenido)]
+    for hexa in _STRING_HEX.findall(contenido):
+        hexa = b''.join(hexa.split())
+        partes.append(bytes.fromhex((hexa + b'0' * (len(hexa) % 2)).decode('ascii')))
+    texto = b''.join(partes).decode('cp1252', errors='replace')
+    caracteres = len(texto) - texto.count(' ')
+    if caracteres < 10:
+        return DESCARTE_SIN_TEXTO
+    digitos = sum(caracter.isdigit() for caracter in texto)
+    if (digitos < getattr(settings, 'CARGA_PDF_TRIAJE_MIN_DIGITOS', 6)
+            or digitos / caracteres < getattr(settings, 'CARGA_PDF_TRIAJE_DENSIDAD_DIGITOS', 0.01)):
+        return DESCARTE_POCOS_DIGITOS
+    if not _CLAVE_MERCADO.search(texto):
+        return DESCARTE_SIN_MERCADOS
+    return None
+
+def firma_triaje():
+    """Configuración del triaje con que se descartó una página (las entradas del caché la guardan)"""
+    if not getattr(settings, 'CARGA_PDF_TRIAJE', True):
+        return ''
+    return (f"{getattr(settings, 'CARGA_PDF_TRIAJE_MIN_DIGITOS', 6)}:"
+            f"{getattr(settings, 'CARGA_PDF_TRIAJE_DENSIDAD_DIGITOS', 0.01)}")
+
+def resumir_descartadas(descartadas):
+    """[(1, m1), (2, m1), (7, m2)] -> '3 página(s) descartada(s) sin analizar (m1: 2, m2: 1)'"""
+    conteo = {}
+    for _, motivo in descartadas:
+        conteo[motivo] = conteo.get(motivo, 0) + 1
+    detalle = ', '.join(f'{motivo}: {total}' for motivo, total in conteo.items())
+    return f'{len(descartadas)} página(s) descartada(s) sin analizar ({detalle})'
+
+# ========== PLANTILLAS POR CORREDOR ==========
+
+# Cuando se conoce el formato de los PDF de un corredor, una plantilla
+# (modelo PlantillaPdf) describe su tabla de movimientos: zona de la
+# página, bordes de las columnas, texto del encabezado, qué es cada
+# columna, formato de fecha y rango de páginas. En las páginas donde la
+# tabla de una plantilla aparece, pdfplumber lee solo esa zona y cada
+# fila pasa directo a un registro, sin escanear el texto ni las demás
+# tablas; las páginas donde no aparece siguen con registros_de_contenido.
+
+COLUMNAS_PLANTILLA = ('fecha', 'mercado', 'ano', 'monto')
+COLUMNA_IGNORADA = '-'
+
+def _normalizar_celdas(celdas):
+    """'Fecha', None, 'Año\nproceso' -> 'fecha año proceso'"""
+    return ' '.join(' '.join(str(celda) for celda in celdas if celda).lower().split())
+
+def _numeros(texto, cantidad=None):
+    """'50, 140,230' -> (50.0, 140.0, 230.0); lanza ValueError si no son números"""
+    valores = tuple(float(parte) for parte in texto.split(',') if parte.strip())
+    if cantidad is not None and len(valores) != cantidad:
+        raise ValueError(f'Se esperaban {cantidad} números y hay {len(valores)}')
+    return valores
+
+class PlantillaTabla(namedtuple('PlantillaTabla', 'id nombre encabezado columnas bordes area formato_fecha '
+                                                  'pagina_inicio pagina_fin')):
+    """
+    Versión sin BD de una PlantillaPdf, para pasarla a los procesos del
+    pool. `columnas` son nombres de COLUMNAS_PLANTILLA (o '-' para una
+    columna que no se usa), `bordes` las x de los bordes de las columnas
+    (vacío: se usan las líneas dibujadas), `area` (x0, top, x1, bottom) o
+    None para la página completa y `formato_fecha` un formato de strptime
+    (vacío: los formatos de parse_utils).
+    """
+    __slots__ = ()
+
+    @classmethod
+    def desde_textos(cls, id, nombre, encabezado, columnas, bordes='', area='', formato_fecha='',
+                     pagina_inicio=1, pagina_fin=None):
+        """Arma la plantilla desde los campos de texto del modelo; lanza ValueError si no son válidos"""
+        columnas = tuple(columna.strip().lower() for columna in columnas.split(','))
+        desconocidas = set(columnas) - set(COLUMNAS_PLANTILLA) - {COLUMNA_IGNORADA}
+        if desconocidas:
+            raise ValueError(f'Columnas desconocidas: {", ".join(sorted(desconocidas))}')
+        faltantes = {'fecha', 'mercado', 'monto'} - set(columnas)
+        if faltantes:
+            raise ValueError(f'Faltan las columnas: {", ".join(sorted(faltantes))}')
+        bordes = _numeros(bordes or '')
+        if bordes and (len(bordes) != len(columnas) + 1 or list(bordes) != sorted(bordes)):
+            raise ValueError('Los bordes deben ser crecientes y uno más que las columnas')
+        area = _numeros(area, 4) if area else None
+        if area and not (area[0] < area[2] and area[1] < area[3]):
+            raise ValueError('El área debe ser x0, top, x1, bottom')
+        if not _normalizar_celdas([encabezado]):
+            raise ValueError('Falta el texto del encabezado')
+        if formato_fecha and '%' not in formato_fecha:
+            raise ValueError(f'Formato de fecha no válido: {formato_fecha}')
+        return cls(id, nombre, _normalizar_celdas([encabezado]), columnas, bordes, area, formato_fecha or '',
+                   pagina_inicio or 1, pagina_fin)
+
+    def aplica(self, page_num):
+        return self.pagina_inicio <= page_num and (self.pagina_fin is None or page_num <= self.pagina_fin)
+
+    def ajustes_tabla(self):
+        """table_settings de pdfplumber: bordes explícitos si los hay, si no las líneas del PDF"""
+        if self.bordes:
+            # Las filas salen del texto y sus bordes solo llegan hasta la última
+            # palabra; la tolerancia deja que alcancen los bordes de columna
+            return {'vertical_strategy': 'explicit', 'explicit_vertical_lines': list(self.bordes),
+                    'horizontal_strategy': 'text',
+                    'intersection_x_tolerance': self.bordes[-1] - self.bordes[0]}
+        return {'vertical_strategy': 'lines', 'horizontal_strategy': 'lines'}
+
+    def convertir_fila(self, fila, descripcion, page_num):
+        """Fila de la tabla a tupla CAMPOS_REGISTRO_PDF, o None si no es un registro válido"""
+        valores = {columna: ' '.join(str(celda or '').split()) for columna, celda in zip(self.columnas, fila)}
+        if not (valores.get('mercado') and valores.get('monto')):
+            return None
+        try:
+            if self.formato_fecha:
+                fecha = datetime.strptime(valores.get('fecha', ''), self.formato_fecha).date()
+            else:
+                fecha = parsear_fecha(valores.get('fecha', ''))
+            parsear_monto(valores['monto'])
+            ano = str(int(valores['ano'])) if valores.get('ano') else str(fecha.year)
+        except ValueError:
+            return None
+        mercado = escaner_utils.MERCADOS.get(valores['mercado'].lower(), valores['mercado'].capitalize())
+        return (fecha.isoformat(), mercado, ano, valores['monto'], descripcion, page_num)
+
+def firma_plantillas(plantillas):
+    """Huella de un conjunto de plantillas ('' si no hay); el caché de páginas depende de ella"""
+    if not plantillas:
+        return ''
+    return hashlib.sha256(repr(tuple(plantillas)).encode()).hexdigest()[:16]
+
+def registros_con_plantilla(page, page_num, plantilla):
+    """
+    Registros de las tablas de `plantilla` en la página, o None si ninguna
+    tabla de la zona tiene su encabezado. Las filas que no se pueden
+    convertir (subtotales, encabezados repetidos) se saltan.
+    """
+    zona = page
+    if plantilla.area:
+        x0, top, x1, bottom = page.bbox
+        area = plantilla.area
+        recorte = (max(area[0], x0), max(area[1], top), min(area[2], x1), min(area[3], bottom))
+        if recorte[0] >= recorte[2] or recorte[1] >= recorte[3]:
+            return None
+        zona = page.crop(recorte)
+
+    registros = None
+    descripcion = f'PDF Página {page_num} - Plantilla {plantilla.nombre}'[:100]
+    for tabla in zona.extract_tables(plantilla.ajustes_tabla()):
+        # Con bordes explícitos la tabla también trae las líneas de texto de la zona que van antes
+        inicio = next((i for i, fila in enumerate(tabla) if _normalizar_celdas(fila) == plantilla.encabezado), None)
+        if inicio is None:
+            continue
+        registros = registros or []
+        for fila in tabla[inicio + 1:]:
+            registro = plantilla.convertir_fila(fila, descripcion, page_num)
+            if registro:
+                registros.append(registro)
+    return registros
+
+# ========== CACHÉ DE PÁGINAS ==========
+
+# Resultado por página (texto, tablas y registros) en disco, bajo
+# CARGA_PDF_CACHE_DIR/<sha256>/<página>.json, con un manifiesto con el
+# total de páginas. Cada entrada guarda la firma de las plantillas con que
+# se extrajo; con otras plantillas no sirve. Las páginas leídas con
+# plantilla no guardan texto ni tablas, y las descartadas por el triaje
+# guardan solo el motivo (y la configuración del triaje). Así un PDF que
+# se vuelve a subir (por ejemplo tras una confirmación fallida) no pasa por
+# pdfplumber. El tamaño total se limita
+# a CARGA_PDF_CACHE_MAX_BYTES borrando las páginas usadas hace más tiempo
+# (la fecha de modificación se actualiza en cada lectura).
+
+# Subir cuando cambien los patrones: los registros se recalculan desde el
+# texto y las tablas guardadas
+VERSION_PATRONES = 2
+
+def _dir_cache():
+    return str(getattr(settings, 'CARGA_PDF_CACHE_DIR', settings.BASE_DIR / 'cache' / 'pdf_paginas'))
+
+def _ruta_cache(hash_sha256, nombre):
+    return os.path.join(_dir_cache(), hash_sha256[:2], hash_sha256, nombre)
+
+def _escribir_json(ruta, datos):
+    """Escritura atómica (temporal + rename) para que un lector nunca vea un archivo a medias"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as destino:
+        json.dump(datos, destino, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as origen:
+            datos = json.load(origen)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+    return datos
+
+def leer_pagina_cache(hash_sha256, page_num, firma=''):
+    """
+    (registros, descarte) de una página desde el caché, o None si no está
+    (o se extrajo con otras plantillas, o se descartó con otra
+    configuración del triaje)
+    """
+    entrada = _leer_json(_ruta_cache(hash_sha256, f'{page_num}.json'))
+    if entrada is None or entrada.get('plantillas', '') != firma:
+        return None
+    descarte = entrada.get('descarte')
+    if descarte:
+        triaje = firma_triaje()
+        return ([], descarte) if triaje and entrada.get('triaje') == triaje else None
+    if entrada['texto'] is not None and entrada.get('version') != VERSION_PATRONES:
+        return registros_de_contenido(entrada['texto'], entrada['tablas'], page_num), None
+    return [tuple(registro) for registro in entrada['registros']], None
+
+def guardar_pagina_cache(hash_sha256, page_num, text, tablas, registros, firma='', descarte=None):
+    entrada = {
+        'version': VERSION_PATRONES,
+        'plantillas': firma,
+        'texto': text,
+        'tablas': tablas,
+        'registros': registros,
+    }
+    if descarte:
+        entrada.update(descarte=descarte, triaje=firma_triaje())
+    _escribir_json(_ruta_cache(hash_sha256, f'{page_num}.json'), entrada)
+
+def podar_cache():
+    """
+    Borra las páginas menos usadas hasta que el caché (manifiestos
+    incluidos) quede bajo CARGA_PDF_CACHE_MAX_BYTES. Con la última página
+    de un PDF se van también su manifiesto y su carpeta; un manifiesto sin
+    páginas se poda como una página más.
+    """
+    maximo = getattr(settings, 'CARGA_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+    entradas = []
+    manifiestos = {}
+    paginas = Counter()
+    total = 0
+    for carpeta, _, archivos in os.walk(_dir_cache()):
+        for nombre in archivos:
+            ruta = os.path.join(carpeta, nombre)
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            total += estado.st_size
+            if nombre == 'manifiesto.json':
+                manifiestos[carpeta] = (estado.st_mtime, estado.st_size, ruta)
+            else:
+                entradas.append((estado.st_mtime, estado.st_size, ruta))
+                paginas[carpeta] += 1
+    entradas.extend(manifiesto for carpeta, manifiesto in manifiestos.items() if not paginas[carpeta])
+
+    borrados = 0
+    for _, tamano, ruta in sorted(entradas):
+        if total <= maximo:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            continue
+        total -= tamano
+        borrados += 1
+        carpeta = os.path.dirname(ruta)
+        paginas[carpeta] -= 1
+        if paginas[carpeta] > 0:
+            continue
+        # Sin páginas el manifiesto solo ocupa espacio
+        if carpeta in manifiestos and ruta != manifiestos[carpeta][2]:
+            try:
+                os.remove(manifiestos[carpeta][2])
+                total -= manifiestos[carpeta][1]
+            except OSError:
+                pass
+        # La carpeta del PDF y, si quedó vacía, la de su prefijo
+        for vacia in (carpeta, os.path.dirname(carpeta)):
+            try:
+                os.rmdir(vacia)
+            except OSError:
+                break
+    return borrados
+
+# ========== EXTRACCIÓN EN PARALELO ==========
+
+def _procesar_pagina(page, page_num, presupuesto, plantillas=()):
+    """
+    (texto, tablas, registros, descarte). Con una plantilla que calce,
+    texto y tablas quedan en None; una página descartada por el triaje
+    sale sin registros y con el motivo en `descarte`.
+    """
+    for plantilla in plantillas:
+        if plantilla.aplica(page_num):
+            registros = registros_con_plantilla(page, page_num, plantilla)
+            if registros is not None:
+                return None, None, registros, None
+    if getattr(settings, 'CARGA_PDF_TRIAJE', True):
+        descarte = clasificar_pagina(page)
+        if descarte:
+            return None, None, [], descarte
+    text, tablas = analizar_pagina(page, presupuesto)
+    return text, tablas, registros_de_contenido(text, tablas, page_num), None
+
+def _iterar_paginas(ruta, paginas, hash_sha256=None, presupuesto=None, plantillas=()):
+    """
+    Abre el PDF una vez y entrega (página, registros, motivo) a medida que
+    termina cada página. Una página que se pasa del presupuesto sale con
+    registros None y el motivo; una descartada por el triaje, sin
+    registros y con uno de MOTIVOS_DESCARTE. Las descartadas quedan en el
+    caché como tales; las que se pasan del presupuesto, no. Cada página se
+    libera al terminarla y su memoria queda en presupuesto.memoria_pico.
+    """
+    presupuesto = presupuesto or Presupuesto()
+    firma = firma_plantillas(plantillas)
+    with pdfplumber.open(ruta) as pdf:
+        for page_num in paginas:
+            page = pdf.pages[page_num - 1]
+            try:
+                resultado, motivo = con_presupuesto(presupuesto, _procesar_pagina, page, page_num, presupuesto,
+                                                    plantillas)
+                presupuesto.medir_memoria()
+            finally:
+                liberar_pagina(page)
+            if motivo:
+                yield page_num, None, motivo
+                continue
+            text, tablas, registros, descarte = resultado
+            if hash_sha256:
+                guardar_pagina_cache(hash_sha256, page_num, text, tablas, registros, firma, descarte)
+            yield page_num, registros, descarte
+
+def extraer_registros_paginas(ruta, paginas, hash_sha256=None, presupuesto=None, plantillas=()):
+    """
+    Abre el PDF por su ruta y extrae las páginas indicadas (base 1).
+    Con `hash_sha256` cada página queda en el caché. Retorna la lista de
+    (página, registros, motivo) como _iterar_paginas y el pico de memoria
+    de este proceso.
+    """
+    presupuesto = presupuesto or Presupuesto()
+    return list(_iterar_paginas(ruta, paginas, hash_sha256, presupuesto, plantillas)), presupuesto.memoria_pico
+
+def contar_paginas(ruta, hash_sha256=None):
+    """Total de páginas; con `hash_sha256` se toma del manifiesto del caché si existe"""
+    if hash_sha256:
+        manifiesto = _leer_json(_ruta_cache(hash_sha256, 'manifiesto.json'))
+        if manifiesto:
+            return manifiesto['total_paginas']
+    with pdfplumber.open(ruta) as pdf:
+        total = len(pdf.pages)
+    if hash_sha256:
+        _escribir_json(_ruta_cache(hash_sha256, 'manifiesto.json'), {'total_paginas': total})
+    return total
+
+def iterar_registros_pdf(ruta, hash_sha256=None, total_paginas=None, presupuesto=None, plantillas=()):
+    """
+    Entrega (página, registros, motivo) a medida que cada página queda
+    lista, no necesariamente en orden de página. `motivo` es None salvo en
+    las páginas omitidas por el Presupuesto (que salen con registros None;
+    las que pasan del máximo de páginas, al final) y en las descartadas
+    por el triaje (sin registros y con uno de MOTIVOS_DESCARTE).
+
+    Con `hash_sha256` primero salen las páginas que ya están en el caché.
+    Las demás se reparten en rangos de CARGA_PDF_PAGINAS_POR_TAREA páginas
+    en un pool de CARGA_PROCESOS procesos (cada proceso abre el archivo por
+    su ruta y comparte el plazo total); el primer rango es de una sola
+    página para que el primer resultado no espere un rango completo. En
+    serie se entrega página a página. Si el consumidor deja de iterar, las
+    tareas pendientes se cancelan.
+
+    Con `plantillas` (PlantillaTabla del corredor), las páginas donde
+    calza una se leen con ella (ver registros_con_plantilla).
+
+    Al terminar, presupuesto.memoria_pico tiene el mayor pico entre este
+    proceso y los del pool.
+    """
+    presupuesto = presupuesto or Presupuesto()
+    if total_paginas is None:
+        total_paginas = contar_paginas(ruta, hash_sha256)
+    paginas, omitidas = presupuesto.separar_paginas(total_paginas)
+    firma = firma_plantillas(plantillas)
+    faltantes = []
+    for page_num in paginas:
+        en_cache = leer_pagina_cache(hash_sha256, page_num, firma) if hash_sha256 else None
+        if en_cache is None:
+            faltantes.append(page_num)
+        else:
+            yield (page_num,) + en_cache
+    presupuesto.medir_memoria()
+
+    por_tarea = max(1, getattr(settings, 'CARGA_PDF_PAGINAS_POR_TAREA', 10))
+    rangos = [faltantes[:1]] + [faltantes[i:i + por_tarea] for i in range(1, len(faltantes), por_tarea)]
+    rangos = [paginas for paginas in rangos if paginas]
+    procesos = min(getattr(settings, 'CARGA_PROCESOS', os.cpu_count() or 1), len(rangos))
+
+    if not rangos:
+        pass  # todo salió del caché: el PDF no se abre
+    elif procesos <= 1:
+        yield from _iterar_paginas(ruta, faltantes, hash_sha256, presupuesto, plantillas)
+    else:
+        # Las conexiones abiertas no deben heredarse a los procesos hijos
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = [pool.submit(extraer_registros_paginas, ruta, paginas, hash_sha256, presupuesto, plantillas)
+                       for paginas in rangos]
+            try:
+                for futuro in as_completed(futuros):
+                    resultados, memoria_pico = futuro.result()
+                    presupuesto.medir_memoria(memoria_pico)
+                    yield from resultados
+            finally:
+                for futuro in futuros:
+                    futuro.cancel()
+
+    for page_num, motivo in omitidas:
+        yield page_num, None, motivo
+
+    if hash_sha256 and faltantes:
+        podar_cache()
+
+def extraer_registros_pdf(ruta, hash_sha256=None, presupuesto=None, plantillas=()):
+    """
+    Extrae los registros candidatos de todo el PDF (ver iterar_registros_pdf).
+    Retorna (registros, omitidas, descartadas); los registros se unen en
+    orden de página, así el resultado es el mismo que en serie. Las
+    omitidas y descartadas son listas de (página, motivo). El pico de
+    memoria queda en presupuesto.memoria_pico.
+    """
+    por_pagina = {}
+    omitidas = []
+    descartadas = []
+    for page_num, registros, motivo in iterar_registros_pdf(ruta, hash_sha256, presupuesto=presupuesto,
+                                                            plantillas=plantillas):
+        if motivo in MOTIVOS_DESCARTE:
+            descartadas.append((page_num, motivo))
+        elif motivo:
+            omitidas.append((page_num, motivo))
+        else:
+            por_pagina[page_num] = registros
+    registros = [registro for page_num in sorted(por_pagina) for registro in por_pagina[page_num]]
+    return registros, sorted(omitidas), sorted(descartadas)
+
+@contextmanager
+def ruta_local(archivo):
+    """
+    Ruta en disco de un archivo subido, para que otros procesos lo abran.
+
+    Los archivos grandes ya quedan en un temporal de Django; los pequeños
+    (en memoria) se copian a un temporal que se borra al salir.
+    """
+    if hasattr(archivo, 'temporary_file_path'):
+        yield archivo.temporary_file_path()
+        return
+    archivo.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temporal:
+        shutil.copyfileobj(archivo, temporal)
+    try:
+        yield temporal.name
+    finally:
+        os.remove(temporal.name)
@@ -0,0 +1,200 @@
+# NuamApp/subida_utils.py
+import hashlib
+import os
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from .models import Corredor, FragmentoSubida, SubidaFragmentada
+from .carga_utils import COLUMNAS_REQUERIDAS, EXTENSIONES_CARGA, leer_encabezados
+from .cola_utils import buscar_carga_previa, encolar_archivo_guardado
+from .security_utils import sanitize_filename
+
+# Protocolo de subida fragmentada (reanudable):
+#   1. iniciar_subida: se declara nombre, tipo y tamaño; el archivo se
+#      preasigna en MEDIA_ROOT/subidas.
+#   2. recibir_fragmento: cada fragmento llega con su offset y su SHA-256 y
+#      se escribe directo en su posición. Si se corta la conexión, solo se
+#      reenvían los fragmentos que estado_subida informa como faltantes.
+#   3. completar_subida: se verifica que estén todos, se mueve el archivo a
+#      MEDIA_ROOT/cargas y entra a la cola de cargas como cualquier CSV.
+
+BLOQUE_LECTURA = 64 * 1024
+
+# ========== CREACIÓN Y ESTADO ==========
+
+def _total_fragmentos(subida):
+    return -(-subida.tamano_total // subida.tamano_fragmento)
+
+def iniciar_subida(usuario, nombre_archivo, tipo_archivo, tamano_total, tamano_fragmento=None, hash_sha256=None):
+    """Valida la subida declarada y preasigna el archivo donde se irán escribiendo los fragmentos"""
+    if tipo_archivo not in COLUMNAS_REQUERIDAS:
+        raise ValueError(f'Tipo de carga no válido: {tipo_archivo}')
+    if not nombre_archivo or not nombre_archivo.lower().endswith(EXTENSIONES_CARGA):
+        raise ValueError('El archivo debe ser CSV o XLSX')
+    if tipo_archivo != 'factores' and not Corredor.objects.filter(fk_usuario=usuario).exists():
+        raise ValueError('El usuario no tiene un corredor asociado')
+
+    tamano_total = int(tamano_total)
+    tamano_fragmento = int(tamano_fragmento or getattr(settings, 'CARGA_FRAGMENTO_BYTES', 5 * 1024 * 1024))
+    max_total = getattr(settings, 'CARGA_SUBIDA_MAX_BYTES', 2 * 1024 * 1024 * 1024)
+    max_fragmento = getattr(settings, 'CARGA_FRAGMENTO_MAX_BYTES', 16 * 1024 * 1024)
+    if not 0 < tamano_total <= max_total:
+        raise ValueError(f'El tamaño debe estar entre 1 byte y {max_total // (1024 * 1024)}MB')
+    if not BLOQUE_LECTURA <= tamano_fragmento <= max_fragmento:
+        raise ValueError(f'El fragmento debe medir entre {BLOQUE_LECTURA} y {max_fragmento} bytes')
+
+    ruta_temporal = f"subidas/{uuid.uuid4().hex}.part"
+    ruta_local = default_storage.path(ruta_temporal)
+    os.makedirs(os.path.dirname(ruta_local), exist_ok=True)
+    with open(ruta_local, 'wb') as destino:
+        destino.truncate(tamano_total)
+
+    return SubidaFragmentada.objects.create(
+        fk_id_usuario=usuario,
+        nombre_archivo=nombre_archivo[:150],
+        tipo_archivo=tipo_archivo,
+        tamano_total=tamano_total,
+        tamano_fragmento=tamano_fragmento,
+        hash_sha256=(hash_sha256 or '').lower() or None,
+        ruta_temporal=ruta_temporal
+    )
+
+def estado_subida(subida):
+    """Resumen para que el cliente sepa qué fragmentos reenviar"""
+    recibidos = set(subida.fragmentos.values_list('offset', flat=True))
+    offsets = range(0, subida.tamano_total, subida.tamano_fragmento)
+    return {
+        'id_subida': subida.id_subida,
+        'estado': subida.estado,
+        'nombre_archivo': subida.nombre_archivo,
+        'tipo_archivo': subida.tipo_archivo,
+        'tamano_total': subida.tamano_total,
+        'tamano_fragmento': subida.tamano_fragmento,
+        'total_fragmentos': _total_fragmentos(subida),
+        'fragmentos_recibidos': len(recibidos),
+        'offsets_faltantes': [offset for offset in offsets if offset not in recibidos],
+        'carga_id': subida.fk_id_archivo_id,
+    }
+
+# ========== FRAGMENTOS ==========
+
+def recibir_fragmento(subida, offset, stream, longitud, sha256_esperado):
+    """
+    Escribe un fragmento en su posición leyendo el request por bloques.
+
+    El fragmento solo queda registrado si su SHA-256 coincide; si no, se
+    descarta (también un registro anterior del mismo offset) y el cliente
+    debe reenviarlo.
+    """
+    if subida.estado != 'recibiendo':
+        raise ValueError(f'La subida está {subida.estado}')
+    if not sha256_esperado:
+        raise ValueError('Falta el SHA-256 del fragmento')
+    if offset < 0 or offset >= subida.tamano_total or offset % subida.tamano_fragmento:
+        raise ValueError(f'Offset no válido: {offset}')
+    esperado = min(subida.tamano_fragmento, subida.tamano_total - offset)
+    if longitud != esperado:
+        raise ValueError(f'El fragmento en {offset} debe medir {esperado} bytes')
+
+    huella = hashlib.sha256()
+    recibido = 0
+    with open(default_storage.path(subida.ruta_temporal), 'r+b') as destino:
+        destino.seek(offset)
+        while recibido < esperado:
+            bloque = stream.read(min(BLOQUE_LECTURA, esperado - recibido))
+            if not bloque:
+                break
+            destino.write(bloque)
+            huella.update(bloque)
+            recibido += len(bloque)
+
+    sha256 = huella.hexdigest()
+    if recibido != esperado or sha256 != sha256_esperado.lower():
+        FragmentoSubida.objects.filter(fk_id_subida=subida, offset=offset).delete()
+        raise ValueError(f'Fragmento en {offset} corrupto o incompleto; reenvíalo')
+
+    FragmentoSubida.objects.update_or_create(
+        fk_id_subida=subida, offset=offset,
+        defaults={'tamano': recibido, 'sha256': sha256}
+    )
+    subida.save(update_fields=['fecha_actualizacion'])
+    return recibido
+
+# ========== CIERRE ==========
+
+def _sha256_archivo(ruta_local):
+    huella = hashlib.sha256()
+    with open(ruta_local, 'rb') as origen:
+        for bloque in iter(lambda: origen.read(BLOQUE_LECTURA), b''):
+            huella.update(bloque)
+    return huella.hexdigest()
+
+def _descartar_archivo(subida):
+    ruta_local = default_storage.path(subida.ruta_temporal)
+    if os.path.exists(ruta_local):
+        os.remove(ruta_local)
+
+def completar_subida(subida, forzar=False):
+    """
+    Cierra la subida y la envía a la cola de cargas.
+
+    Retorna (carga, repetida): si el usuario ya había cargado ese mismo
+    contenido (y no se pide `forzar`) se retorna la carga anterior.
+    """
+    if subida.estado != 'recibiendo':
+        raise ValueError(f'La subida está {subida.estado}')
+    faltantes = _total_fragmentos(subida) - subida.fragmentos.count()
+    if faltantes:
+        raise ValueError(f'Faltan {faltantes} fragmento(s)')
+
+    ruta_local = default_storage.path(subida.ruta_temporal)
+    hash_sha256 = _sha256_archivo(ruta_local)
+    if subida.hash_sha256 and subida.hash_sha256 != hash_sha256:
+        raise ValueError('El SHA-256 del archivo armado no coincide con el declarado')
+
+    with open(ruta_local, 'rb') as archivo:
+        columnas = leer_encabezados(archivo)
+    required_columns = COLUMNAS_REQUERIDAS[subida.tipo_archivo]
+    if not all(col in columnas for col in required_columns):
+        raise ValueError(f'El CSV debe contener: {", ".join(required_columns)}')
+
+    previa = None if forzar else buscar_carga_previa(subida.fk_id_usuario, subida.tipo_archivo, hash_sha256)
+    if previa:
+        _descartar_archivo(subida)
+        subida.estado = 'completada'
+        subida.save()
+        subida.fragmentos.all().delete()
+        return previa, True
+
+    # Mismo disco: se mueve el archivo en vez de copiarlo
+    ruta = f"cargas/{uuid.uuid4().hex}_{sanitize_filename(subida.nombre_archivo)}"
+    os.makedirs(os.path.dirname(default_storage.path(ruta)), exist_ok=True)
+    os.replace(ruta_local, default_storage.path(ruta))
+
+    subida.estado = 'completada'
+    subida.save()
+    subida.fragmentos.all().delete()
+
+    carga = encolar_archivo_guardado(subida.tipo_archivo, ruta, subida.nombre_archivo, subida.tamano_total,
+                                     subida.fk_id_usuario, hash_sha256=hash_sha256)
+    subida.fk_id_archivo = carga
+    subida.save(update_fields=['fk_id_archivo'])
+    return carga, False
+
+def cancelar_subida(subida):
+    _descartar_archivo(subida)
+    subida.estado = 'cancelada'
+    subida.save()
+    subida.fragmentos.all().delete()
+
+def limpiar_subidas_abandonadas():
+    """Cancela las subidas sin actividad durante CARGA_SUBIDA_EXPIRACION y borra su archivo"""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'CARGA_SUBIDA_EXPIRACION', 24 * 3600))
+    abandonadas = SubidaFragmentada.objects.filter(estado='recibiendo', fecha_actualizacion__lt=limite)
+    total = 0
+    for subida in abandonadas:
+        cancelar_subida(subida)
+        total += 1
+    return total
@@ -1,3 +1,1107 @@
-from django.test import TestCase
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+import pdfplumber
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .carga_utils import (IngestaCopy, RegistroErrores, _detectar_delimitador, _detectar_encoding, _insertar_lote,
+                          abrir_csv, cerrar_carga_pdf, leer_encabezados, procesar_archivo, validar_archivo)
+from .cola_utils import (buscar_carga_previa, crear_trabajo, ejecutar_trabajo, encolar_carga,
+                         reclamar_trabajos_abandonados, tomar_trabajo)
+from .confirmacion_utils import confirmar_registros, parsear_seleccion, preparar_confirmacion
+from .corpus_pdf_utils import _escribir_pdf, _tabla, _texto
+from .estadisticas_utils import agrupar_estadisticas, reconstruir_estadisticas
+from .models import (Archivocarga, Auditoria, Calificacion, Corredor, EstadisticaAuditoria, EstadisticaCalificacion,
+                     Factor, RegistroExtraidoPdf, TrabajoCarga, Usuario)
+from .parse_utils import parsear_fecha, parsear_monto
+from .pdf_utils import (DESCARTE_POCOS_DIGITOS, MOTIVO_LIMITE_PAGINAS, MOTIVO_TIEMPO_PAGINA, MOTIVO_TIEMPO_TOTAL,
+                        PlantillaTabla, Presupuesto, con_presupuesto, contar_paginas, extraer_calificaciones_pdf,
+                        extraer_registros_pdf, guardar_pagina_cache, leer_pagina_cache, podar_cache,
+                        registros_con_plantilla)
+from .subida_utils import (BLOQUE_LECTURA as SUBIDA_BLOQUE, completar_subida, estado_subida, iniciar_subida,
+                           recibir_fragmento)
+from .xlsx_utils import FIRMA_XLSX, LectorXlsx, _numero_a_texto, es_xlsx
+from .zip_utils import encolar_zip
 
-# Create your tests here.
+
+class DashboardAdminUsuariosTests(TestCase):
+    """La pestaña de usuarios de dashboard_admin no hace consultas por usuario"""
+
+    def setUp(self):
+        self.admin = Usuario.objects.create(nombre='Admin', correo='admin@nuam.cl', contrasena='x',
+                                            rol='admin', estado='activo')
+        session = self.client.session
+        session['usuario_id'] = self.admin.id_usuario
+        session['rol'] = 'admin'
+        session.save()
+
+    def _crear_usuarios(self, cantidad, calificaciones=2, auditorias=1):
+        for i in range(cantidad):
+            usuario = Usuario.objects.create(nombre=f'Corredor {i}', correo=f'c{i}@nuam.cl', contrasena='x',
+                                             rol='corredor', estado='activo')
+            corredor = Corredor.objects.create(nombre=f'Corredor {i}', rut='1-9', telefono='1', correo=usuario.correo,
+                                               fecha_registro=date.today(), fk_usuario=usuario)
+            Calificacion.objects.bulk_create(
+                Calificacion(fecha=date.today(), mercado='acciones', ano=2024, fk_id_corredor=corredor)
+                for _ in range(calificaciones)
+            )
+            Auditoria.objects.bulk_create(
+                Auditoria(accion=f'ACCION_{j}', resultado='ok', fk_usuario=usuario) for j in range(auditorias)
+            )
+        return usuario
+
+    def _get(self):
+        return self.client.get(reverse('dashboard_admin'), {'tab': 'usuarios'})
+
+    def test_cantidad_de_consultas_no_depende_de_los_usuarios(self):
+        self._crear_usuarios(2)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._get().status_code, 200)
+
+        self._crear_usuarios(30)
+        with self.assertNumQueries(len(consultas)):
+            self.assertEqual(self._get().status_code, 200)
+
+    def test_orden_y_totales_por_actividad(self):
+        self._crear_usuarios(1, calificaciones=1, auditorias=1)
+        activo = self._crear_usuarios(1, calificaciones=5, auditorias=2)
+        Usuario.objects.create(nombre='Sin actividad', correo='s@nuam.cl', contrasena='x',
+                               rol='corredor', estado='activo')
+        Auditoria.objects.filter(fk_usuario=activo, accion='ACCION_1').update(
+            fecha_hora=timezone.now() + timedelta(days=1))
+
+        usuarios = list(self._get().context['usuarios_con_actividad'])
+
+        self.assertEqual(usuarios[0], activo)
+        self.assertEqual((usuarios[0].total_calificaciones, usuarios[0].total_auditorias), (5, 2))
+        self.assertEqual(usuarios[0].ultima_accion, 'ACCION_1')
+        self.assertNotIn('Sin actividad', [usuario.nombre for usuario in usuarios])
+
+
+class EstadisticasDashboardTests(TestCase):
+    """Los resúmenes por día se mantienen al escribir y coinciden con reconstruir_estadisticas"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(nombre='Corredor', correo='c@nuam.cl', contrasena='x',
+                                              rol='corredor', estado='activo')
+        self.corredor = Corredor.objects.create(nombre='Corredor', rut='1-9', telefono='1', correo='c@nuam.cl',
+                                                fecha_registro=date.today(), fk_usuario=self.usuario)
+
+    def _calificacion(self, mercado='acciones', origen='csv'):
+        return Calificacion(fecha=date.today(), mercado=mercado, ano=2024, origen=origen,
+                            fk_id_corredor=self.corredor)
+
+    def _resumenes(self):
+        return (
+            sorted(EstadisticaCalificacion.objects.filter(cantidad__gt=0)
+                   .values_list('dia', 'mercado', 'origen', 'cantidad')),
+            sorted(EstadisticaAuditoria.objects.filter(cantidad__gt=0).values_list('dia', 'cantidad')),
+        )
+
+    def assertCoincideConReconstruccion(self):
+        incremental = self._resumenes()
+        reconstruir_estadisticas()
+        self.assertEqual(incremental, self._resumenes())
+
+    def test_escrituras_por_fila_y_por_lote(self):
+        _insertar_lote([(i, self._calificacion()) for i in range(5)], [])
+        editada = self._calificacion('bonos', 'manual')
+        editada.save()
+        editada.mercado = 'derivados'
+        editada.save()
+        Calificacion.objects.filter(mercado='acciones').first().delete()
+        Auditoria.objects.create(accion='LOGIN', resultado='ok', fk_usuario=self.usuario)
+
+        hoy = timezone.localdate()
+        self.assertEqual(self._resumenes(), (
+            [(hoy, 'acciones', 'csv', 4), (hoy, 'derivados', 'manual', 1)],
+            [(hoy, 1)],
+        ))
+        self.assertCoincideConReconstruccion()
+
+    def test_borrado_en_cascada_agrupado(self):
+        Calificacion.objects.bulk_create([self._calificacion() for _ in range(3)])
+        reconstruir_estadisticas()
+        Auditoria.objects.create(accion='LOGIN', resultado='ok', fk_usuario=self.usuario)
+
+        with transaction.atomic(), agrupar_estadisticas():
+            self.usuario.delete()
+
+        self.assertEqual(self._resumenes(), ([], []))
+        self.assertCoincideConReconstruccion()
+
+
+# ========== CARGAS MASIVAS ==========
+
+class _ArchivosTemporales:
+    """MEDIA_ROOT y caché de PDF en carpetas temporales; las cargas se procesan en el mismo proceso"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        cache = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(cache.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name, CARGA_PDF_CACHE_DIR=cache.name,
+                                    CARGAS_ASINCRONAS=False, CARGA_PROCESOS=1)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.usuario = Usuario.objects.create(nombre='Corredor', correo='c@nuam.cl', contrasena='x',
+                                              rol='corredor', estado='activo')
+        self.corredor = Corredor.objects.create(nombre='Corredor', rut='1-9', telefono='1', correo='c@nuam.cl',
+                                                fecha_registro=date.today(), fk_usuario=self.usuario)
+
+    def _csv(self, texto, nombre='carga.csv', encoding='utf-8'):
+        return SimpleUploadedFile(nombre, texto.encode(encoding))
+
+    def _pdf(self, *paginas):
+        """PDF con una página por lista de líneas de texto (o de operaciones ya armadas); retorna su ruta"""
+        contenidos = []
+        for lineas in paginas:
+            contenidos.append(b'\n'.join(
+                linea if isinstance(linea, bytes) else _texto(50, 700 - 20 * i, linea)
+                for i, linea in enumerate(lineas)
+            ))
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as destino:
+            destino.write(_escribir_pdf(contenidos))
+        self.addCleanup(os.remove, destino.name)
+        return destino.name
+
+
+MONTOS_CSV = 'fecha,mercado,ano,monto,descripcion\n'
+
+NS_XLSX = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+
+
+def _xlsx(filas):
+    """XLSX mínimo de una hoja; `filas` son los <row> ya armados"""
+    binario = io.BytesIO()
+    with zipfile.ZipFile(binario, 'w') as zf:
+        zf.writestr('xl/workbook.xml', (
+            f'<workbook {NS_XLSX} xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Hoja" sheetId="1" r:id="rId1"/></sheets></workbook>'))
+        zf.writestr('xl/_rels/workbook.xml.rels', (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/hoja.xml"/></Relationships>'))
+        zf.writestr('xl/sharedStrings.xml', (
+            f'<sst {NS_XLSX}><si><t>fecha</t></si><si><t>mercado</t></si><si><t>monto</t></si>'
+            '<si><r><t>acc</t></r><r><t>iones</t></r><rPh><t>x</t></rPh></si></sst>'))
+        zf.writestr('xl/styles.xml', (
+            f'<styleSheet {NS_XLSX}><cellXfs count="2"><xf numFmtId="0"/><xf numFmtId="14"/></cellXfs>'
+            '</styleSheet>'))
+        zf.writestr('xl/worksheets/hoja.xml', (
+            f'<worksheet {NS_XLSX}><sheetData>{"".join(filas)}</sheetData></worksheet>'))
+    return binario
+
+
+
+class InsercionPorLotesTests(_ArchivosTemporales, TestCase):
+    """Si la BD rechaza el lote, se reintenta fila a fila y solo se pierden las filas malas"""
+
+    def test_fila_rechazada_no_pierde_el_lote(self):
+        lote = [(i, Calificacion(fecha=date(2024, 1, 2), mercado='acciones', ano=2024, fk_id_corredor=self.corredor))
+                for i in range(2, 6)]
+        lote[1][1].ano = None
+        errores = []
+
+        self.assertEqual(_insertar_lote(lote, errores), 3)
+        self.assertEqual(Calificacion.objects.count(), 3)
+        self.assertEqual([fila for fila, _ in errores], [3])
+
+    def test_carga_por_lotes_cuenta_procesados_y_fallidos(self):
+        texto = MONTOS_CSV + ''.join(f'2024-01-{dia:02d},acciones,2024,{dia},Fila {dia}\n' for dia in range(1, 8))
+        texto += '2024-13-01,acciones,2024,1,Mes malo\n'
+        with override_settings(CARGA_BATCH_SIZE=3):
+            carga = encolar_carga('montos', self._csv(texto), self.usuario)
+
+        self.assertEqual((carga.estado, carga.registros_procesados, carga.registros_fallidos), ('completado', 7, 1))
+        self.assertEqual(Calificacion.objects.filter(fk_id_archivo=carga).count(), 7)
+
+
+class LecturaCsvTests(TestCase):
+    """Encoding y delimitador se detectan sobre el primer bloque del archivo"""
+
+    def test_encoding(self):
+        self.assertEqual(_detectar_encoding(codecs.BOM_UTF8 + b'fecha'), 'utf-8-sig')
+        self.assertEqual(_detectar_encoding(codecs.BOM_UTF16_LE + 'fecha'.encode('utf-16-le')), 'utf-16')
+        self.assertEqual(_detectar_encoding('descripción'.encode('utf-8')), 'utf-8')
+        self.assertEqual(_detectar_encoding('descripción'.encode('cp1252')), 'cp1252')
+        # Un carácter multibyte cortado al final del bloque sigue siendo UTF-8
+        self.assertEqual(_detectar_encoding('año'.encode('utf-8')[:2]), 'utf-8')
+
+    def test_delimitador(self):
+        self.assertEqual(_detectar_delimitador('fecha;mercado;ano\n1,5;2;3'), ';')
+        self.assertEqual(_detectar_delimitador('fecha\tmercado\n'), '\t')
+        self.assertEqual(_detectar_delimitador('fecha\n'), ',')
+
+    def test_csv_de_excel(self):
+        binario = io.BytesIO(codecs.BOM_UTF8 + ' Fecha ;Descripción\r\n02/01/2024;Cuota año\r\n'.encode('utf-8'))
+        self.assertEqual(leer_encabezados(binario), ['Fecha', 'Descripción'])
+        self.assertEqual(list(abrir_csv(binario)), [{'Fecha': '02/01/2024', 'Descripción': 'Cuota año'}])
+
+        binario = io.BytesIO('fecha;descripcion\n02/01/2024;Cuota año\n'.encode('cp1252'))
+        self.assertEqual(next(abrir_csv(binario))['descripcion'], 'Cuota año')
+
+
+class ColaDeCargasTests(TestCase):
+    """Un trabajo lo toma un solo worker; los abandonados vuelven a la cola o quedan en error"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(nombre='Corredor', correo='c@nuam.cl', contrasena='x',
+                                              rol='corredor', estado='activo')
+        self.carga, self.trabajo = crear_trabajo('montos', 'cargas/x.csv', 'x.csv', 10, self.usuario)
+
+    def _abandonar(self):
+        TrabajoCarga.objects.filter(pk=self.trabajo.pk).update(
+            fecha_heartbeat=timezone.now() - timedelta(seconds=301))
+
+    def test_un_trabajo_se_toma_una_vez(self):
+        trabajo = tomar_trabajo('worker-1')
+
+        self.assertEqual((trabajo.pk, trabajo.estado, trabajo.worker, trabajo.intentos),
+                         (self.trabajo.pk, 'procesando', 'worker-1', 1))
+        self.assertEqual(Archivocarga.objects.get(pk=self.carga.pk).estado, 'procesando')
+        self.assertIsNone(tomar_trabajo('worker-2'))
+
+    def test_abandonado_vuelve_a_la_cola(self):
+        tomar_trabajo('worker-1')
+        Calificacion.objects.create(fecha=date(2024, 1, 2), mercado='acciones', ano=2024, fk_id_archivo=self.carga,
+                                    fk_id_corredor=Corredor.objects.create(
+                                        nombre='C', rut='1-9', telefono='1', correo='c@nuam.cl',
+                                        fecha_registro=date.today(), fk_usuario=self.usuario))
+        self.assertEqual(reclamar_trabajos_abandonados(), 0)
+
+        self._abandonar()
+        self.assertEqual(reclamar_trabajos_abandonados(), 1)
+
+        self.assertEqual(TrabajoCarga.objects.get(pk=self.trabajo.pk).estado, 'pendiente')
+        self.assertEqual(Archivocarga.objects.get(pk=self.carga.pk).estado, 'pendiente')
+        # Lo que alcanzó a insertar el intento anterior se borra
+        self.assertFalse(Calificacion.objects.exists())
+        self.assertEqual(tomar_trabajo('worker-2').intentos, 2)
+
+    @override_settings(CARGA_TRABAJO_MAX_INTENTOS=1)
+    def test_sin_intentos_queda_en_error(self):
+        tomar_trabajo('worker-1')
+        self._abandonar()
+        reclamar_trabajos_abandonados()
+
+        self.assertEqual(TrabajoCarga.objects.get(pk=self.trabajo.pk).estado, 'error')
+        self.assertEqual(Archivocarga.objects.get(pk=self.carga.pk).estado, 'error')
+        self.assertIsNone(tomar_trabajo('worker-2'))
+
+
+class CargaInterrumpidaTests(_ArchivosTemporales, TestCase):
+    """Una carga que falla a medias no deja filas y conserva el avance que alcanzó a informar"""
+
+    def test_error_a_mitad_del_archivo(self):
+        texto = MONTOS_CSV + ''.join(f'2024-01-{dia:02d},acciones,2024,{dia},Fila {dia}\n' for dia in range(1, 8))
+
+        def falla_tras_el_primer_lote(carga, archivo, al_completar_lote):
+            def avance(*args):
+                al_completar_lote(*args)
+                raise RuntimeError('disco lleno')
+            return procesar_archivo(carga, archivo, al_completar_lote=avance)
+
+        with override_settings(CARGA_BATCH_SIZE=3), \
+                mock.patch('NuamApp.cola_utils.procesar_archivo', side_effect=falla_tras_el_primer_lote):
+            carga = encolar_carga('montos', self._csv(texto), self.usuario)
+
+        self.assertEqual(carga.estado, 'error')
+        self.assertIn('disco lleno', carga.resultado)
+        self.assertEqual(carga.registros_procesados, 3)
+        self.assertGreater(carga.bytes_procesados, 0)
+        self.assertFalse(Calificacion.objects.exists())
+        self.assertFalse(EstadisticaCalificacion.objects.filter(cantidad__gt=0).exists())
+
+        # Subir de nuevo el mismo archivo no duplica filas
+        carga = encolar_carga('montos', self._csv(texto), self.usuario)
+        self.assertEqual(Calificacion.objects.count(), 7)
+
+
+class ProgresoCargaTests(TestCase):
+    """El avance de una carga solo lo ven su dueño y los administradores"""
+
+    def setUp(self):
+        self.dueno = Usuario.objects.create(nombre='Dueño', correo='d@nuam.cl', contrasena='x',
+                                            rol='corredor', estado='activo')
+        self.carga, trabajo = crear_trabajo('montos', 'cargas/x.csv', 'x.csv', 1000, self.dueno)
+        Archivocarga.objects.filter(pk=self.carga.pk).update(estado='procesando', registros_procesados=90,
+                                                             registros_fallidos=10, bytes_procesados=250)
+        TrabajoCarga.objects.filter(pk=trabajo.pk).update(fecha_inicio=timezone.now() - timedelta(seconds=10))
+
+    def _get(self, usuario):
+        session = self.client.session
+        session['usuario_id'] = usuario.id_usuario
+        session['rol'] = usuario.rol
+        session.save()
+        return self.client.get(reverse('progreso_carga', args=[self.carga.id_archivo]))
+
+    def test_avance(self):
+        datos = self._get(self.dueno).json()
+
+        self.assertEqual((datos['estado'], datos['registros_procesados'], datos['porcentaje']),
+                         ('procesando', 90, 25.0))
+        self.assertAlmostEqual(datos['filas_por_segundo'], 10, delta=1)
+        self.assertAlmostEqual(datos['eta_segundos'], 30, delta=3)
+
+    def test_otro_usuario_no_la_ve(self):
+        otro = Usuario.objects.create(nombre='Otro', correo='o@nuam.cl', contrasena='x',
+                                      rol='corredor', estado='activo')
+        self.assertEqual(self._get(otro).status_code, 404)
+
+        admin = Usuario.objects.create(nombre='Admin', correo='a@nuam.cl', contrasena='x',
+                                       rol='admin', estado='activo')
+        self.assertEqual(self._get(admin).status_code, 200)
+
+
+class ParseoTests(TestCase):
+    """Formatos de fecha y monto que aceptan las cargas"""
+
+    def test_fechas(self):
+        for texto in ('2024-03-05', '2024/3/5', '05/03/2024', '5-3-2024', '05-03-24', ' 2024-03-05 '):
+            with self.subTest(texto=texto):
+                self.assertEqual(parsear_fecha(texto), date(2024, 3, 5))
+        for texto in ('2024-13-01', '31/02/2024', 'marzo 2024', ''):
+            with self.subTest(texto=texto), self.assertRaises(ValueError):
+                parsear_fecha(texto)
+
+    def test_montos(self):
+        casos = {
+            '1234': Decimal('1234'),
+            '1.234.567,89': Decimal('1234567.89'),
+            '1,234,567.89': Decimal('1234567.89'),
+            '$ 1.234': Decimal('1234'),
+            '1.5': Decimal('1.5'),
+            '12,5': Decimal('12.5'),
+            '-3,25': Decimal('-3.25'),
+            # Un 0 delante del punto no es un grupo de miles
+            '0.125': Decimal('0.125'),
+            '-0.250': Decimal('-0.250'),
+            '0.5': Decimal('0.5'),
+            '10.500': Decimal('10500'),
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(parsear_monto(texto), esperado)
+        with self.assertRaises(ValueError):
+            parsear_monto('sin monto')
+
+
+class DeduplicacionTests(_ArchivosTemporales, TestCase):
+    """Un archivo ya cargado por el usuario no se vuelve a procesar, salvo 'Forzar recarga'"""
+
+    TEXTO = MONTOS_CSV + '2024-01-02,acciones,2024,10,Fila\n'
+
+    def setUp(self):
+        super().setUp()
+        session = self.client.session
+        session['usuario_id'] = self.usuario.id_usuario
+        session['rol'] = 'corredor'
+        session.save()
+
+    def _subir(self, **extra):
+        return self.client.post(reverse('carga_montos'), {'archivo_csv': self._csv(self.TEXTO), **extra})
+
+    def test_repetido_se_responde_con_la_carga_anterior(self):
+        self._subir()
+        primera = Archivocarga.objects.get()
+        self.assertEqual(primera.hash_sha256, hashlib.sha256(self.TEXTO.encode()).hexdigest())
+
+        respuesta = self._subir()
+
+        self.assertRedirects(respuesta, reverse('detalles_carga', args=[primera.id_archivo]),
+                             fetch_redirect_response=False)
+        self.assertEqual(Archivocarga.objects.count(), 1)
+        self.assertEqual(Calificacion.objects.count(), 1)
+
+    def test_forzar_recarga(self):
+        self._subir()
+        self._subir(forzar_recarga='on')
+
+        self.assertEqual(Archivocarga.objects.count(), 2)
+        self.assertEqual(Calificacion.objects.count(), 2)
+
+    def test_una_carga_con_error_no_cuenta(self):
+        self._subir()
+        carga = Archivocarga.objects.get()
+        self.assertEqual(buscar_carga_previa(self.usuario, 'montos', carga.hash_sha256), carga)
+
+        Archivocarga.objects.update(estado='error')
+        self.assertIsNone(buscar_carga_previa(self.usuario, 'montos', carga.hash_sha256))
+        # Tampoco cuenta el mismo archivo como otro tipo de carga
+        self.assertIsNone(buscar_carga_previa(self.usuario, 'calificaciones', carga.hash_sha256))
+
+
+class CargaFactoresTests(_ArchivosTemporales, TestCase):
+    """Los factores se cargan con upsert por (nombre_factor, fecha_inicio)"""
+
+    def test_upsert(self):
+        Factor.objects.create(nombre_factor='UF', valor_factor=1, fecha_inicio=date(2024, 1, 1),
+                              fecha_fin=date(2024, 1, 1))
+        Factor.objects.create(nombre_factor='IPC', valor_factor=2, fecha_inicio=date(2024, 1, 1),
+                              fecha_fin=date(2024, 1, 31))
+        texto = ('nombre_factor,valor_factor,fecha_inicio,fecha_fin\n'
+                 'UF,1,2024-01-01,2024-01-01\n'
+                 'IPC,3,2024-01-01,2024-01-31\n'
+                 'USD,4,2024-01-01,2024-01-31\n'
+                 'EUR,x,2024-01-01,2024-01-01\n')
+
+        carga = encolar_carga('factores', self._csv(texto), self.usuario)
+
+        self.assertEqual(carga.resultado, '1 insertados, 1 actualizados, 1 sin cambios, 1 fallidos')
+        self.assertEqual(sorted(Factor.objects.values_list('nombre_factor', 'valor_factor')),
+                         [('IPC', 3), ('UF', 1), ('USD', 4)])
+
+    def test_clave_repetida_gana_la_ultima_fila(self):
+        texto = ('nombre_factor,valor_factor,fecha_inicio\n'
+                 'UF,1,2024-01-01\n'
+                 'UF,2,2024-01-01\n')
+
+        encolar_carga('factores', self._csv(texto), self.usuario)
+
+        # Sin columna fecha_fin el factor vence el mismo día que inicia
+        self.assertEqual(list(Factor.objects.values_list('valor_factor', 'fecha_fin')), [(2, date(2024, 1, 1))])
+
+
+class CargaZipTests(_ArchivosTemporales, TestCase):
+    """El ZIP se encola entero y el worker lo reparte en un trabajo de la cola por archivo"""
+
+    MONTOS = MONTOS_CSV + '2024-01-02,acciones,2024,10,Uno\n2024-01-03,acciones,2024,20,Dos\n'
+
+    def _zip(self, miembros, nombre='mes.zip'):
+        binario = io.BytesIO()
+        with zipfile.ZipFile(binario, 'w') as zf:
+            for nombre_miembro, contenido in miembros.items():
+                zf.writestr(nombre_miembro, contenido)
+        return SimpleUploadedFile(nombre, binario.getvalue())
+
+    def _miembros(self):
+        celdas = lambda fila: ''.join(f'<c t="inlineStr"><is><t>{valor}</t></is></c>' for valor in fila)
+        calificaciones = _xlsx([
+            f'<row>{celdas(["fecha", "mercado", "ano", "descripcion", "factor_actualizado"])}</row>',
+            f'<row>{celdas(["2024-02-01", "bonos", "2024", "Desde XLSX", "0,5"])}</row>',
+        ])
+        lineas = ['2024-03-05 Acciones 2024 1.234,50', '05/04/2024 Bonos 2024 99,25']
+        pdf = _escribir_pdf([b'\n'.join(_texto(50, 700 - 20 * i, linea) for i, linea in enumerate(lineas))])
+        return {
+            'montos.csv': self.MONTOS,
+            'calificaciones.xlsx': calificaciones.getvalue(),
+            'cartola.pdf': pdf,
+            'otro.csv': 'columna,rara\n1,2\n',
+            'notas.txt': 'no se carga',
+        }
+
+    def _estados(self, padre):
+        return dict(padre.miembros.values_list('archivo_url', 'estado'))
+
+    def test_sin_worker_se_procesa_cada_archivo(self):
+        encolar_carga('montos', self._csv(self.MONTOS), self.usuario)
+
+        padre = encolar_zip(self._zip(self._miembros()), self.usuario)
+
+        self.assertEqual(padre.estado, 'completado')
+        self.assertEqual(self._estados(padre), {
+            'montos.csv': 'repetido',
+            'calificaciones.xlsx': 'completado',
+            'cartola.pdf': 'completado',
+            'otro.csv': 'error',
+        })
+        self.assertEqual(padre.registros_procesados, 3)
+        self.assertIn('4 archivos: 2 completados, 0 parciales, 0 en cola, 1 repetidos, 1 con error', padre.resultado)
+        self.assertEqual(Calificacion.objects.count(), 5)
+        self.assertFalse(TrabajoCarga.objects.exclude(estado='completado').exists())
+
+    def test_forzar_procesa_los_repetidos(self):
+        encolar_carga('montos', self._csv(self.MONTOS), self.usuario)
+
+        padre = encolar_zip(self._zip({'montos.csv': self.MONTOS}), self.usuario, forzar=True)
+
+        self.assertEqual(self._estados(padre), {'montos.csv': 'completado'})
+        self.assertEqual(Calificacion.objects.count(), 4)
+
+    @override_settings(CARGAS_ASINCRONAS=True)
+    def test_el_worker_reparte_y_procesa(self):
+        padre = encolar_zip(self._zip(self._miembros()), self.usuario)
+        self.assertEqual(padre.estado, 'pendiente')
+        self.assertFalse(padre.miembros.exists())
+
+        # El trabajo del ZIP solo lo reparte: cada archivo queda como un trabajo propio
+        ejecutar_trabajo(tomar_trabajo('worker-1'))
+        padre.refresh_from_db()
+        self.assertEqual(padre.estado, 'procesando')
+        self.assertIn('3 en cola', padre.resultado)
+        self.assertEqual(TrabajoCarga.objects.filter(estado='pendiente').count(), 3)
+
+        # Como el loop de procesar_cargas (que cierra la conexión del test entre trabajos)
+        while (trabajo := tomar_trabajo('worker-2')) is not None:
+            ejecutar_trabajo(trabajo)
+        padre.refresh_from_db()
+        self.assertEqual(padre.estado, 'completado')
+        self.assertEqual(padre.registros_procesados, 5)
+
+    @override_settings(CARGAS_ASINCRONAS=True, CARGA_TRABAJO_MAX_INTENTOS=1)
+    def test_archivo_abandonado_cierra_el_zip(self):
+        padre = encolar_zip(self._zip({'montos.csv': self.MONTOS}), self.usuario)
+        ejecutar_trabajo(tomar_trabajo('worker-1'))
+        miembro = tomar_trabajo('worker-caido')
+        TrabajoCarga.objects.filter(pk=miembro.pk).update(fecha_heartbeat=timezone.now() - timedelta(hours=1))
+
+        reclamar_trabajos_abandonados()
+
+        padre.refresh_from_db()
+        self.assertEqual(padre.estado, 'completado')
+        self.assertEqual(self._estados(padre), {'montos.csv': 'error'})
+
+    def test_reparto_fallido_no_deja_archivos(self):
+        guardar = default_storage.save
+        guardados = []
+
+        def guardar_y_fallar(nombre, contenido, *args, **kwargs):
+            # Se guardan el ZIP y su primer archivo; el segundo falla
+            if len(guardados) == 2:
+                raise OSError('disco lleno')
+            guardados.append(guardar(nombre, contenido, *args, **kwargs))
+            return guardados[-1]
+
+        with mock.patch.object(default_storage, 'save', side_effect=guardar_y_fallar):
+            padre = encolar_zip(self._zip(self._miembros()), self.usuario)
+
+        self.assertEqual(padre.estado, 'error')
+        self.assertIn('disco lleno', padre.resultado)
+        self.assertFalse(padre.miembros.exists())
+        self.assertEqual(TrabajoCarga.objects.get().estado, 'error')
+        self.assertFalse(default_storage.exists(guardados[1]))
+
+    def test_vista_redirige_al_detalle_del_zip(self):
+        session = self.client.session
+        session['usuario_id'] = self.usuario.id_usuario
+        session['rol'] = 'corredor'
+        session.save()
+
+        respuesta = self.client.post(reverse('carga_zip'), {'archivo_zip': self._zip({'montos.csv': self.MONTOS})})
+
+        padre = Archivocarga.objects.get(tipo_archivo='zip')
+        self.assertRedirects(respuesta, reverse('detalles_carga', args=[padre.id_archivo]),
+                             fetch_redirect_response=False)
+        self.assertEqual(padre.estado, 'completado')
+        self.assertTrue(Auditoria.objects.filter(accion='CARGA_ZIP').exists())
+
+    def test_zip_sin_archivos_validos_no_se_encola(self):
+        with self.assertRaisesMessage(ValueError, 'no contiene archivos'):
+            encolar_zip(self._zip({'notas.txt': 'nada'}), self.usuario)
+        self.assertFalse(Archivocarga.objects.exists())
+
+
+class SubidaFragmentadaTests(_ArchivosTemporales, TestCase):
+    """Los fragmentos se verifican con su SHA-256 y la subida completa entra a la cola"""
+
+    def setUp(self):
+        super().setUp()
+        filas = ''.join(f'2024-01-02,acciones,2024,{i},Fila {i}\n' for i in range(3000))
+        self.contenido = (MONTOS_CSV + filas).encode()
+        self.subida = iniciar_subida(self.usuario, 'montos.csv', 'montos', len(self.contenido),
+                                     tamano_fragmento=SUBIDA_BLOQUE)
+
+    def _enviar(self, offset, sha256=None):
+        fragmento = self.contenido[offset:offset + SUBIDA_BLOQUE]
+        return recibir_fragmento(self.subida, offset, io.BytesIO(fragmento), len(fragmento),
+                                 sha256 or hashlib.sha256(fragmento).hexdigest())
+
+    def test_fragmento_corrupto_se_descarta(self):
+        self._enviar(0)
+        with self.assertRaises(ValueError):
+            self._enviar(SUBIDA_BLOQUE, sha256='0' * 64)
+
+        self.assertEqual(estado_subida(self.subida)['offsets_faltantes'], [SUBIDA_BLOQUE])
+        with self.assertRaises(ValueError):
+            completar_subida(self.subida)
+
+    def test_subida_completa_se_procesa(self):
+        for offset in reversed(range(0, len(self.contenido), SUBIDA_BLOQUE)):
+            self._enviar(offset)
+
+        carga, repetida = completar_subida(self.subida)
+
+        self.assertFalse(repetida)
+        self.assertEqual((carga.estado, carga.registros_procesados), ('completado', 3000))
+        self.assertEqual(carga.hash_sha256, hashlib.sha256(self.contenido).hexdigest())
+        self.assertEqual(estado_subida(self.subida)['estado'], 'completada')
+
+
+class ReporteErroresTests(_ArchivosTemporales, TestCase):
+    """Las filas con error quedan en errores/carga_<id>.csv con su número de fila"""
+
+    def test_reporte(self):
+        texto = (MONTOS_CSV
+                 + '2024-01-02,acciones,2024,10,Buena\n'
+                 + '2024-01-02,acciones,2023,10,Año distinto\n'
+                 + '2024-01-02,,2024,10,Sin mercado\n')
+
+        carga = encolar_carga('montos', self._csv(texto), self.usuario)
+
+        self.assertEqual(carga.ruta_errores, f'errores/carga_{carga.id_archivo}.csv')
+        with default_storage.open(carga.ruta_errores) as reporte:
+            filas = list(csv.reader(io.StringIO(reporte.read().decode('utf-8'))))
+        self.assertEqual(filas, [
+            ['fila', 'error'],
+            ['3', 'ano: El año debe coincidir con la fecha (2024)'],
+            ['4', 'mercado: Valor vacío'],
+        ])
+
+    def test_muestras_acotadas(self):
+        registro = RegistroErrores(max_muestras=2)
+        registro.extend((fila, 'x') for fila in range(5))
+
+        self.assertEqual((registro.total, registro.pendientes), (5, [(0, 'x'), (1, 'x')]))
+
+
+class ValidacionSinGuardarTests(_ArchivosTemporales, TestCase):
+    """validar_archivo informa los errores sin escribir en la BD"""
+
+    def test_no_toca_la_bd(self):
+        texto = (MONTOS_CSV
+                 + '2024-01-02,acciones,2024,10,Buena\n'
+                 + 'ayer,acciones,2024,10,Fecha mala\n')
+
+        resultado = validar_archivo('montos', self._csv(texto), self.usuario)
+
+        self.assertEqual((resultado['filas'], resultado['validas'], resultado['con_error']), (2, 1, 1))
+        self.assertEqual(resultado['errores'], [(3, 'fecha: Fecha no válida: ayer')])
+        self.assertFalse(Calificacion.objects.exists())
+        self.assertFalse(Archivocarga.objects.exists())
+        self.assertFalse(EstadisticaCalificacion.objects.exists())
+
+    def test_columnas_faltantes(self):
+        with self.assertRaises(ValueError):
+            validar_archivo('montos', self._csv('fecha,mercado\n'), self.usuario)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'COPY solo existe en PostgreSQL')
+@override_settings(CARGA_INGESTA_COPY=True)
+class IngestaCopyTests(_ArchivosTemporales, TestCase):
+    """Con COPY los lotes van a una tabla de staging y pasan a calificacion con un solo INSERT ... SELECT"""
+
+    TEXTO = MONTOS_CSV + ''.join(f'2024-01-{dia:02d},acciones,2024,{dia},Fila {dia}\n' for dia in range(1, 6))
+
+    def _staging_existe(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('calificacion_staging')")
+            return cursor.fetchone()[0] is not None
+
+    def test_staging_y_traspaso(self):
+        with override_settings(CARGA_BATCH_SIZE=2), CaptureQueriesContext(connection) as consultas:
+            carga = encolar_carga('montos', self._csv(self.TEXTO), self.usuario)
+
+        self.assertEqual((carga.registros_procesados, carga.registros_fallidos), (5, 0))
+        self.assertEqual(list(Calificacion.objects.order_by('id_calificacion').values_list('descripcion', flat=True)),
+                         [f'Fila {dia}' for dia in range(1, 6)])
+        traspasos = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "calificacion"')]
+        self.assertEqual(len(traspasos), 1)
+        self.assertFalse(self._staging_existe())
+        self.assertEqual(sum(EstadisticaCalificacion.objects.values_list('cantidad', flat=True)), 5)
+
+    def test_traspaso_rechazado_se_repite_fila_a_fila(self):
+        # Un índice único hace que la BD rechace el INSERT ... SELECT por la descripción repetida
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE UNIQUE INDEX calificacion_descripcion_unica ON calificacion (descripcion)')
+        errores = []
+        ingesta = IngestaCopy()
+        lote = [(fila, Calificacion(fecha=date(2024, 1, 2), mercado='acciones', ano=2024, descripcion=descripcion,
+                                    fk_id_corredor=self.corredor))
+                for fila, descripcion in [(2, 'Uno'), (3, 'Dos'), (4, 'Uno')]]
+
+        self.assertEqual(ingesta(lote, errores), 3)
+        self.assertEqual(ingesta.cerrar(errores), 1)
+
+        self.assertEqual([fila for fila, _ in errores], [4])
+        self.assertEqual(sorted(Calificacion.objects.values_list('descripcion', flat=True)), ['Dos', 'Uno'])
+        self.assertFalse(self._staging_existe())
+
+
+class LectorXlsxTests(TestCase):
+    """La primera hoja de un XLSX se lee como un CSV: textos compartidos, fechas y números a texto"""
+
+    def test_filas(self):
+        binario = _xlsx([
+            '<row><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c></row>',
+            '<row><c r="A2" s="1"><v>45293</v></c><c r="B2" t="s"><v>3</v></c><c r="C2"><v>1234.5</v></c></row>',
+            '<row><c r="A3" t="inlineStr"><is><t>05/03/2024</t></is></c><c r="C3"><v>7</v></c></row>',
+            '<row><c r="A4" t="str"><v> </v></c></row>',
+        ])
+
+        self.assertTrue(es_xlsx(binario))
+        lector = LectorXlsx(binario)
+        self.assertEqual(lector.fieldnames, ['fecha', 'mercado', 'monto'])
+        self.assertEqual(list(lector), [
+            {'fecha': '2024-01-02', 'mercado': 'acciones', 'monto': '1234,5'},
+            {'fecha': '05/03/2024', 'mercado': '', 'monto': '7'},
+        ])
+        self.assertEqual(parsear_monto('1234,5'), Decimal('1234.5'))
+
+    def test_numero_a_texto(self):
+        # Con punto, parsear_monto leería 1.234 como mil doscientos treinta y cuatro
+        self.assertEqual(_numero_a_texto('1.234'), '1,234')
+        self.assertEqual(parsear_monto(_numero_a_texto('1.234')), Decimal('1.234'))
+        self.assertEqual(_numero_a_texto('3.0'), '3')
+        self.assertEqual(_numero_a_texto('1E-2'), '0,01')
+        self.assertEqual(_numero_a_texto('abc'), 'abc')
+
+    def test_no_es_xlsx(self):
+        self.assertFalse(es_xlsx(io.BytesIO(b'fecha,mercado\n')))
+        with self.assertRaises(ValueError):
+            LectorXlsx(io.BytesIO(FIRMA_XLSX + b'no es un zip'))
+
+
+# ========== EXTRACCIÓN DE PDF ==========
+
+LINEAS_REGISTROS = ['2024-03-05 Acciones 2024 1.234,50', '05/04/2024 Bonos 2024 99,25']
+LINEAS_SIN_REGISTROS = ['Notas generales del documento sin cifras relevantes']
+
+
+# TransactionTestCase: el pool cierra las conexiones antes de crear sus procesos
+class ExtraccionParalelaTests(_ArchivosTemporales, TransactionTestCase):
+    """Con el pool las páginas llegan en cualquier orden, pero se unen en orden de página"""
+
+    def test_mismo_resultado_que_en_serie(self):
+        ruta = self._pdf(*[[f'2024-01-{pagina:02d} Acciones 2024 {pagina},00'] for pagina in range(1, 8)],
+                         LINEAS_SIN_REGISTROS)
+
+        en_serie = extraer_registros_pdf(ruta)
+        with override_settings(CARGA_PROCESOS=2, CARGA_PDF_PAGINAS_POR_TAREA=2):
+            en_paralelo = extraer_registros_pdf(ruta)
+
+        self.assertEqual(en_paralelo, en_serie)
+        self.assertEqual([registro[0] for registro in en_paralelo[0]],
+                         [f'2024-01-{pagina:02d}' for pagina in range(1, 8)])
+        self.assertEqual([pagina for pagina, _ in en_paralelo[2]], [8])
+
+
+class CachePdfTests(_ArchivosTemporales, TestCase):
+    """Las páginas ya extraídas salen del caché sin abrir el PDF"""
+
+    HASH = 'ab' * 32
+
+    def test_acierto_no_abre_el_pdf(self):
+        ruta = self._pdf(LINEAS_REGISTROS, LINEAS_REGISTROS[::-1])
+        primera = extraer_registros_pdf(ruta, self.HASH)
+        self.assertTrue(primera[0])
+
+        with mock.patch('NuamApp.pdf_utils.pdfplumber.open', side_effect=AssertionError('PDF abierto')):
+            self.assertEqual(extraer_registros_pdf(ruta, self.HASH), primera)
+
+    def test_fallos(self):
+        ruta = self._pdf(LINEAS_REGISTROS)
+        extraer_registros_pdf(ruta, self.HASH)
+
+        self.assertIsNotNone(leer_pagina_cache(self.HASH, 1))
+        self.assertIsNone(leer_pagina_cache('cd' * 32, 1))
+        self.assertIsNone(leer_pagina_cache(self.HASH, 2))
+
+    def test_pagina_guardada_con_patrones_anteriores(self):
+        guardar_pagina_cache(self.HASH, 1, LINEAS_REGISTROS[0], [], [['registro', 'viejo']])
+        entrada = os.path.join(settings.CARGA_PDF_CACHE_DIR, self.HASH[:2], self.HASH, '1.json')
+        with open(entrada, encoding='utf-8') as origen:
+            datos = json.load(origen)
+        datos['version'] -= 1
+        with open(entrada, 'w', encoding='utf-8') as destino:
+            json.dump(datos, destino)
+
+        registros, descarte = leer_pagina_cache(self.HASH, 1)
+
+        self.assertIsNone(descarte)
+        self.assertIn(('2024-03-05', 'Acciones', '2024', '1.234,50'), [registro[:4] for registro in registros])
+
+    def test_poda_borra_el_pdf_completo_menos_usado(self):
+        viejo, nuevo = 'cd' * 32, 'ef' * 32
+        ruta = self._pdf(LINEAS_REGISTROS, LINEAS_REGISTROS[::-1])
+        for hash_sha256 in (viejo, nuevo):
+            contar_paginas(ruta, hash_sha256)
+            extraer_registros_pdf(ruta, hash_sha256)
+        carpeta_vieja = os.path.join(settings.CARGA_PDF_CACHE_DIR, viejo[:2], viejo)
+        for nombre in os.listdir(carpeta_vieja):
+            os.utime(os.path.join(carpeta_vieja, nombre), (0, 0))
+        tamano_pdf = sum(os.path.getsize(os.path.join(carpeta_vieja, nombre)) for nombre in os.listdir(carpeta_vieja))
+
+        # Cabe un PDF, con su manifiesto, pero no dos
+        with override_settings(CARGA_PDF_CACHE_MAX_BYTES=tamano_pdf):
+            self.assertEqual(podar_cache(), 2)
+
+        self.assertFalse(os.path.exists(os.path.dirname(carpeta_vieja)))
+        self.assertEqual(sorted(os.listdir(os.path.join(settings.CARGA_PDF_CACHE_DIR, nuevo[:2], nuevo))),
+                         ['1.json', '2.json', 'manifiesto.json'])
+
+    def test_poda_manifiesto_sin_paginas(self):
+        contar_paginas(self._pdf(LINEAS_REGISTROS), self.HASH)
+
+        with override_settings(CARGA_PDF_CACHE_MAX_BYTES=0):
+            self.assertEqual(podar_cache(), 1)
+
+        self.assertEqual(os.listdir(settings.CARGA_PDF_CACHE_DIR), [])
+
+
+class ConfirmacionPdfTests(_ArchivosTemporales, TestCase):
+    """Solo los registros seleccionados y válidos pasan a calificaciones"""
+
+    REGISTROS = [
+        ('2024-03-05', 'Acciones', '2024', '1.234,50', 'Pág 1', 1),
+        ('05/03/2024', 'acciones', '2024', '1234,5', 'Repetido', 1),
+        ('2024-03-06', 'Bonos', '2024', '99,25', 'Pág 1', 1),
+        ('2024-03-07', 'Bonos', '2024', 'ilegible', 'Pág 2', 2),
+        ('2024-03-08', 'Monedas', '2024', '5', 'Pág 2', 2),
+    ]
+
+    def test_parsear_seleccion(self):
+        self.assertEqual(parsear_seleccion('3-40, 42,'), [(3, 40), (42, 42)])
+        self.assertEqual(parsear_seleccion(''), [])
+        for texto in ('5-3', 'a-b', '1;2'):
+            with self.subTest(texto=texto), self.assertRaises(ValueError):
+                parsear_seleccion(texto)
+
+    def test_confirmar(self):
+        carga, unicos = preparar_confirmacion(self.usuario, 'a.pdf', None, self.REGISTROS)
+        self.assertEqual(unicos, 4)
+        ids = {registro.indice: registro.pk for registro in carga.registros_extraidos.all()}
+
+        procesados, fallidos = confirmar_registros(
+            carga, self.corredor, [(ids[1], ids[1]), (ids[3], ids[3])],
+            descripciones={ids[1]: ' Editada '}
+        )
+
+        self.assertEqual((procesados, fallidos), (1, 1))
+        self.assertEqual(list(Calificacion.objects.values_list('mercado', 'factor_actualizado', 'descripcion',
+                                                               'origen')),
+                         [('Acciones', Decimal('1234.5'), 'Editada', 'pdf')])
+        carga.refresh_from_db()
+        self.assertEqual((carga.estado, carga.registros_procesados, carga.registros_fallidos),
+                         ('completado', 1, 1))
+        self.assertFalse(RegistroExtraidoPdf.objects.exists())
+        self.assertTrue(default_storage.exists(carga.ruta_errores))
+
+    def test_sin_registros_validos_queda_en_error_con_su_reporte(self):
+        carga, _ = preparar_confirmacion(self.usuario, 'a.pdf', None, self.REGISTROS)
+        ilegible = carga.registros_extraidos.get(indice=3).pk
+
+        self.assertEqual(confirmar_registros(carga, self.corredor, [(ilegible, ilegible)]), (0, 1))
+
+        carga.refresh_from_db()
+        self.assertEqual((carga.estado, carga.registros_fallidos), ('error', 1))
+        self.assertFalse(RegistroExtraidoPdf.objects.exists())
+        with default_storage.open(carga.ruta_errores) as reporte:
+            self.assertIn('factor:', reporte.read().decode('utf-8'))
+
+    def test_vista_muestra_el_reporte_si_nada_se_guardo(self):
+        session = self.client.session
+        session['usuario_id'] = self.usuario.id_usuario
+        session['rol'] = 'corredor'
+        session.save()
+        carga, _ = preparar_confirmacion(self.usuario, 'a.pdf', None, self.REGISTROS)
+        ilegible = carga.registros_extraidos.get(indice=3).pk
+
+        respuesta = self.client.post(reverse('guardar_datos_extraidos'),
+                                     {'carga_id': carga.id_archivo, 'seleccionados': str(ilegible)})
+
+        self.assertRedirects(respuesta, reverse('detalles_carga', args=[carga.id_archivo]),
+                             fetch_redirect_response=False)
+
+    def test_sin_seleccion_elimina_la_carga(self):
+        carga, _ = preparar_confirmacion(self.usuario, 'a.pdf', None, self.REGISTROS)
+
+        self.assertEqual(confirmar_registros(carga, self.corredor, []), (0, 0))
+        self.assertFalse(Archivocarga.objects.exists())
+
+    def test_reglas_de_calificacion_en_el_staging(self):
+        manana = date.today() + timedelta(days=1)
+        carga, _ = preparar_confirmacion(self.usuario, 'a.pdf', None, [
+            ('32/13/2024', 'Acciones', '2024', '1', '', 1),
+            (manana.isoformat(), 'Acciones', str(manana.year), '2', '', 1),
+            ('2024-03-05', 'Acciones', '2023', '3', '', 1),
+            ('2024-03-05', 'Acciones', '2024', '-4', '', 1),
+            ('2024-03-05', 'Acciones', '2024', '5', '', 1),
+        ])
+
+        errores = dict(carga.registros_extraidos.values_list('indice', 'error'))
+        self.assertEqual(errores, {
+            1: 'fecha: Formato no válido',
+            2: 'fecha: No se pueden crear calificaciones con fecha futura',
+            3: 'ano: El año debe coincidir con la fecha (2024)',
+            4: 'factor: El factor no puede ser negativo',
+            5: None,
+        })
+        self.assertIsNone(carga.registros_extraidos.get(indice=1).fecha)
+
+
+class StreamPdfTests(_ArchivosTemporales, TestCase):
+    """La extracción en streaming envía un evento por página y termina con la URL de la confirmación"""
+
+    def setUp(self):
+        super().setUp()
+        session = self.client.session
+        session['usuario_id'] = self.usuario.id_usuario
+        session['rol'] = 'corredor'
+        session.save()
+
+    def _eventos(self, ruta):
+        with open(ruta, 'rb') as origen:
+            archivo = SimpleUploadedFile('cartola.pdf', origen.read(), content_type='application/pdf')
+        respuesta = self.client.post(reverse('extraer_datos_pdf_stream'), {'archivo_pdf': archivo})
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        eventos = []
+        for bloque in b''.join(respuesta.streaming_content).decode('utf-8').split('\n\n'):
+            if bloque:
+                evento, datos = bloque.split('\n')
+                eventos.append((evento[len('event: '):], json.loads(datos[len('data: '):])))
+        return eventos
+
+    def test_eventos_por_pagina(self):
+        eventos = self._eventos(self._pdf(LINEAS_REGISTROS, LINEAS_REGISTROS[::-1]))
+
+        self.assertEqual([evento for evento, _ in eventos], ['inicio', 'pagina', 'pagina', 'fin'])
+        self.assertEqual(eventos[0][1]['total_paginas'], 2)
+        paginas = [datos for evento, datos in eventos if evento == 'pagina']
+        self.assertEqual(sorted(datos['pagina'] for datos in paginas), [1, 2])
+        self.assertEqual([datos['procesadas'] for datos in paginas], [1, 2])
+        registros = [registro for datos in paginas for registro in datos['registros']]
+        self.assertIn(('2024-03-05', 1), [(registro['fecha'], registro['pagina']) for registro in registros])
+
+        carga = Archivocarga.objects.get(estado='por_confirmar')
+        self.assertEqual(eventos[-1][1]['url'], reverse('confirmar_datos_pdf', args=[carga.id_archivo]))
+        self.assertEqual(eventos[-1][1]['total_registros'], carga.registros_extraidos.count())
+
+    def test_pdf_repetido_solo_informa_la_carga_anterior(self):
+        ruta = self._pdf(LINEAS_REGISTROS)
+        with open(ruta, 'rb') as origen:
+            hash_sha256 = hashlib.sha256(origen.read()).hexdigest()
+        previa = Archivocarga.objects.create(tipo_archivo='pdf_calificaciones', fecha_carga=timezone.now(),
+                                             estado='completado', archivo_url='cartola.pdf',
+                                             fk_id_usuario=self.usuario, hash_sha256=hash_sha256)
+
+        self.assertEqual(self._eventos(ruta), [('fin', {'url': reverse('detalles_carga', args=[previa.id_archivo])})])
+
+
+class PresupuestoPdfTests(_ArchivosTemporales, TestCase):
+    """Las páginas fuera del presupuesto se omiten y la carga queda parcial"""
+
+    def test_limite_de_paginas(self):
+        ruta = self._pdf(LINEAS_REGISTROS, LINEAS_REGISTROS, LINEAS_REGISTROS)
+
+        registros, omitidas, _ = extraer_registros_pdf(ruta, presupuesto=Presupuesto(max_paginas=2))
+
+        self.assertEqual(omitidas, [(3, MOTIVO_LIMITE_PAGINAS)])
+        self.assertEqual({registro[5] for registro in registros}, {1, 2})
+
+        carga = Archivocarga(tipo_archivo='pdf_calificaciones', estado='procesando')
+        cerrar_carga_pdf(carga, len(registros), 0, omitidas)
+        self.assertEqual((carga.estado, carga.paginas_omitidas), ('parcial', 1))
+        self.assertIn('límite de páginas', carga.resultado)
+
+    def test_tiempo_por_pagina(self):
+        presupuesto = Presupuesto(segundos_pagina=0.01)
+
+        resultado, motivo = con_presupuesto(presupuesto, time.sleep, 0.2)
+
+        self.assertEqual((resultado, motivo), (None, MOTIVO_TIEMPO_PAGINA))
+
+    def test_confirmacion_parcial(self):
+        registros = [('2024-03-05', 'Acciones', '2024', '10,5', 'Pág 1', 1)]
+        carga, _ = preparar_confirmacion(self.usuario, 'a.pdf', None, registros,
+                                         omitidas=[(2, MOTIVO_TIEMPO_TOTAL)])
+
+        confirmar_registros(carga, self.corredor, parsear_seleccion(f'1-{10 ** 6}'))
+
+        carga.refresh_from_db()
+        self.assertEqual((carga.estado, carga.registros_procesados), ('parcial', 1))
+
+
+class MemoriaPdfTests(_ArchivosTemporales, TestCase):
+    """Cada página se libera al procesarla: el pico de memoria no crece con el largo del PDF"""
+
+    LINEAS = [f'2024-01-{dia % 28 + 1:02d} Acciones 2024 {dia},50 texto de relleno de la página' for dia in range(35)]
+
+    def test_pico_acotado(self):
+        # El PDF corto va primero: el pico del largo incluye todo lo que el proceso ya tenía
+        _, _, pico_corto = extraer_calificaciones_pdf(self._pdf(*[self.LINEAS] * 10))
+        _, _, pico_largo = extraer_calificaciones_pdf(self._pdf(*[self.LINEAS] * 120))
+
+        # Sin liberar el mapa de texto de cada página el PDF largo suma ~250MB
+        self.assertLess(pico_largo - pico_corto, 50 * 1024 * 1024)
+
+
+class PlantillaPdfTests(_ArchivosTemporales, TestCase):
+    """Con una plantilla, las filas de su tabla pasan directo a registros"""
+
+    def _ruta(self):
+        tabla, _ = _tabla(700, [['Fecha', 'Mercado', 'Año', 'Monto'],
+                                ['02/01/2024', 'acciones', '2024', '10,5'],
+                                ['Total', '', '', '10,5']])
+        return self._pdf(tabla)
+
+    def test_extraccion(self):
+        plantilla = PlantillaTabla.desde_textos(1, 'Cartola', 'Fecha Mercado Año Monto', 'fecha, mercado, ano, monto',
+                                                formato_fecha='%d/%m/%Y')
+
+        registros, _, _ = extraer_registros_pdf(self._ruta(), plantillas=[plantilla])
+
+        self.assertEqual(registros, [
+            ('2024-01-02', 'Acciones', '2024', '10,5', 'PDF Página 1 - Plantilla Cartola', 1),
+        ])
+
+    def test_encabezado_que_no_calza(self):
+        plantilla = PlantillaTabla.desde_textos(1, 'Otra', 'Fecha Instrumento Monto', 'fecha,mercado,monto')
+        with pdfplumber.open(self._ruta()) as pdf:
+            self.assertIsNone(registros_con_plantilla(pdf.pages[0], 1, plantilla))
+
+    def test_plantilla_no_valida(self):
+        for columnas, bordes in (('fecha,mercado', ''), ('fecha,mercado,monto,tasa', ''),
+                                 ('fecha,mercado,monto', '10,5,20,30')):
+            with self.subTest(columnas=columnas, bordes=bordes), self.assertRaises(ValueError):
+                PlantillaTabla.desde_textos(1, 'P', 'Fecha', columnas, bordes=bordes)
+
+    def test_cache_por_plantillas(self):
+        ruta = self._ruta()
+        extraer_registros_pdf(ruta, 'ab' * 32)
+
+        # Con plantillas la página se extrae distinto: no vale lo guardado sin ellas
+        self.assertIsNotNone(leer_pagina_cache('ab' * 32, 1))
+        self.assertIsNone(leer_pagina_cache('ab' * 32, 1, firma='otra'))
+
+
+class TriajeCachePdfTests(_ArchivosTemporales, TestCase):
+    """Las páginas descartadas por el triaje también quedan en el caché, atadas a su configuración"""
+
+    HASH = 'ab' * 32
+
+    def test_descartada_sale_del_cache(self):
+        ruta = self._pdf(LINEAS_REGISTROS, LINEAS_SIN_REGISTROS)
+        primera = extraer_registros_pdf(ruta, self.HASH)
+        self.assertEqual(primera[2], [(2, DESCARTE_POCOS_DIGITOS)])
+
+        with mock.patch('NuamApp.pdf_utils.pdfplumber.open', side_effect=AssertionError('PDF abierto')):
+            self.assertEqual(extraer_registros_pdf(ruta, self.HASH), primera)
+
+    def test_otra_configuracion_del_triaje(self):
+        extraer_registros_pdf(self._pdf(LINEAS_REGISTROS, LINEAS_SIN_REGISTROS), self.HASH)
+
+        self.assertEqual(leer_pagina_cache(self.HASH, 2), ([], DESCARTE_POCOS_DIGITOS))
+        with override_settings(CARGA_PDF_TRIAJE_MIN_DIGITOS=1):
+            self.assertIsNone(leer_pagina_cache(self.HASH, 2))
+        with override_settings(CARGA_PDF_TRIAJE=False):
+            self.assertIsNone(leer_pagina_cache(self.HASH, 2))
+        # Las páginas con registros no dependen del triaje
+        with override_settings(CARGA_PDF_TRIAJE_MIN_DIGITOS=1):
+            self.assertIsNotNone(leer_pagina_cache(self.HASH, 1))
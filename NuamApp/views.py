@@ -1,24 +1,46 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.urls import reverse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.core.files.storage import default_storage
 from django.contrib import messages
 from .forms import CalificacionForm
 from datetime import date
 import csv
-from django.db.models import Q, Count
-from .models import Calificacion, Corredor, Usuario, Archivocarga, Auditoria, Factor
+from django.db import transaction
+from django.db.models import Q, Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from .models import (Calificacion, Corredor, Usuario, Archivocarga, Auditoria, Factor, SubidaFragmentada,
+                     EstadisticaCalificacion, EstadisticaAuditoria)
 from django.contrib.auth.hashers import check_password, make_password
 from django.shortcuts import render
 import io
 from datetime import datetime
 import pdfplumber
 import re
+import json
+import zipfile
 from django.http import JsonResponse
-from django.views.decorators.http import require_GET
+from django.views.decorators.http import require_GET, require_POST
 from .decorators import login_required_custom, audit_action
+from .carga_utils import (COLUMNAS_REQUERIDAS, EXTENSIONES_CARGA, leer_encabezados, guardar_calificaciones_pdf,
+                          cerrar_carga_pdf, validar_archivo)
+from .cola_utils import encolar_carga, calcular_sha256, buscar_carga_previa
+from . import escaner_utils
+from .pdf_utils import (extraer_calificaciones_pdf, extraer_registros_pdf, iterar_registros_pdf, contar_paginas,
+                        ruta_local, resumir_omitidas, resumir_descartadas, Presupuesto, CAMPOS_REGISTRO_PDF,
+                        MOTIVOS_DESCARTE)
+from .zip_utils import encolar_zip
+from .confirmacion_utils import preparar_confirmacion, parsear_seleccion, confirmar_registros, plantillas_pdf
+from .estadisticas_utils import agrupar_estadisticas
+from .subida_utils import iniciar_subida, estado_subida, recibir_fragmento, completar_subida, cancelar_subida
 from django.utils import timezone
+from django.utils.html import escape
 import time
+import logging
 from django.views.decorators.csrf import csrf_protect  
 
+logger = logging.getLogger(__name__)
+
 
 def no_autorizado(request):
     return render(request, "no_autorizado.html")
@@ -202,55 +224,45 @@ def dashboard_admin(request):
     
     # ========== ESTADÍSTICAS GLOBALES ==========
     
-    # Por usuario
-    usuarios_con_actividad = []
-    for usuario in todos_usuarios:
-        calificaciones_usuario = Calificacion.objects.filter(
-            fk_id_corredor__fk_usuario=usuario
-        ).count()
-        
-        auditorias_usuario = Auditoria.objects.filter(
-            fk_usuario=usuario
-        ).count()
-        
-        if calificaciones_usuario > 0 or auditorias_usuario > 0:
-            usuarios_con_actividad.append({
-                'usuario': usuario,
-                'total_calificaciones': calificaciones_usuario,
-                'total_auditorias': auditorias_usuario,
-                'ultima_actividad': Auditoria.objects.filter(
-                    fk_usuario=usuario
-                ).order_by('-fecha_hora').first()
-            })
+    # Por usuario: una sola consulta. Las calificaciones se cuentan en una
+    # subconsulta para no cruzar el JOIN de calificaciones con el de
+    # auditorías (cada usuario multiplicaría sus filas por ambos).
+    calificaciones_por_usuario = Calificacion.objects.filter(
+        fk_id_corredor__fk_usuario=OuterRef('pk')
+    ).order_by().values('fk_id_corredor__fk_usuario').annotate(total=Count('id_calificacion')).values('total')
+    ultima_auditoria = Auditoria.objects.filter(fk_usuario=OuterRef('pk')).order_by('-fecha_hora')
+    usuarios_con_actividad = Usuario.objects.annotate(
+        total_calificaciones=Coalesce(Subquery(calificaciones_por_usuario), 0),
+        total_auditorias=Count('auditoria', distinct=True),
+        ultima_actividad=Subquery(ultima_auditoria.values('fecha_hora')[:1]),
+        ultima_accion=Subquery(ultima_auditoria.values('accion')[:1]),
+    ).annotate(
+        total_actividad=F('total_calificaciones') + F('total_auditorias')
+    ).filter(total_actividad__gt=0).order_by('id_usuario')
     
-    # Totales generales
-    total_calificaciones = Calificacion.objects.count()
+    # Totales generales (calificaciones y auditorías desde los resúmenes por día, ver estadisticas_utils)
+    total_calificaciones = EstadisticaCalificacion.objects.aggregate(total=Sum('cantidad'))['total'] or 0
     total_usuarios_activos = Usuario.objects.filter(estado='activo').count()
     total_corredores = Corredor.objects.count()
-    total_auditorias = Auditoria.objects.count()
+    total_auditorias = EstadisticaAuditoria.objects.aggregate(total=Sum('cantidad'))['total'] or 0
     
     # Distribución por mercado
-    distribucion_mercado = Calificacion.objects.values('mercado').annotate(
-        total=Count('id_calificacion')
-    ).order_by('-total')
+    distribucion_mercado = EstadisticaCalificacion.objects.values('mercado').annotate(
+        total=Sum('cantidad')
+    ).filter(total__gt=0).order_by('-total')
     
     # Distribución por origen
-    distribucion_origen = Calificacion.objects.values('origen').annotate(
-        total=Count('id_calificacion')
-    ).order_by('-total')
+    distribucion_origen = EstadisticaCalificacion.objects.values('origen').annotate(
+        total=Sum('cantidad')
+    ).filter(total__gt=0).order_by('-total')
     
     # Actividad por día (últimos 7 días)
-    from django.db.models.functions import TruncDate
     from datetime import timedelta
     
-    fecha_limite = datetime.now().date() - timedelta(days=7)
-    actividad_diaria = Auditoria.objects.filter(
-        fecha_hora__date__gte=fecha_limite
-    ).annotate(
-        dia=TruncDate('fecha_hora')
-    ).values('dia').annotate(
-        total=Count('id_auditoria')
-    ).order_by('dia')
+    fecha_limite = timezone.localdate() - timedelta(days=7)
+    actividad_diaria = EstadisticaAuditoria.objects.filter(
+        dia__gte=fecha_limite, cantidad__gt=0
+    ).values('dia', total=F('cantidad')).order_by('dia')
     
     # ========== PESTAÑA ESPECÍFICA: CALIFICACIONES DETALLADAS ==========
     if tab_activa == 'calificaciones':
@@ -260,7 +272,7 @@ def dashboard_admin(request):
     # ========== PESTAÑA ESPECÍFICA: ACTIVIDAD DE USUARIOS ==========
     elif tab_activa == 'usuarios':
         # Ordenar usuarios por actividad
-        usuarios_con_actividad.sort(key=lambda x: x['total_calificaciones'] + x['total_auditorias'], reverse=True)
+        usuarios_con_actividad = usuarios_con_actividad.order_by('-total_actividad', 'id_usuario')
     
     # ========== PESTAÑA ESPECÍFICA: AUDITORÍA COMPLETA ==========
     elif tab_activa == 'auditoria':
@@ -510,6 +522,51 @@ def fix_passwords(request):
 
     return HttpResponse("Contraseñas convertidas correctamente")
 
+def _informar_carga(request, carga, mensaje_completado):
+    """Muestra el resultado de una carga procesada o avisa que quedó en cola"""
+    if carga.estado == 'completado':
+        messages.success(request, mensaje_completado.format(
+            procesados=carga.registros_procesados,
+            fallidos=carga.registros_fallidos,
+            resultado=carga.resultado
+        ))
+        return True
+    if carga.estado == 'error':
+        messages.error(request, carga.resultado)
+        return True
+    messages.info(request, f'Carga #{carga.id_archivo} en cola. Puedes seguir su estado en el listado de cargas.')
+    return False
+
+def _carga_repetida(request, usuario, tipo_archivo, hash_sha256):
+    """
+    Si el usuario ya subió este mismo archivo, informa el resultado anterior
+    y retorna esa carga. El checkbox 'forzar_recarga' omite la verificación.
+    """
+    if request.POST.get('forzar_recarga') == 'on':
+        return None
+    previa = buscar_carga_previa(usuario, tipo_archivo, hash_sha256)
+    if previa:
+        messages.info(request,
+            f'Este archivo ya fue cargado el {timezone.localtime(previa.fecha_carga):%d/%m/%Y %H:%M} '
+            f'(carga #{previa.id_archivo}, {previa.resultado or previa.estado}). '
+            'Marca "Forzar recarga" para procesarlo de nuevo.'
+        )
+    return previa
+
+def _solo_validar(request, tipo_archivo, archivo, usuario, template):
+    """Con el checkbox 'solo_validar' valida el CSV sin guardar nada y muestra el resumen"""
+    if request.POST.get('solo_validar') != 'on':
+        return None
+    return render(request, template, {'validacion': validar_archivo(tipo_archivo, archivo, usuario)})
+
+def _encolar_sin_repetir(request, tipo_archivo, archivo, usuario):
+    """Encola la carga salvo que sea un archivo repetido; retorna (carga, repetida)"""
+    hash_sha256 = calcular_sha256(archivo)
+    previa = _carga_repetida(request, usuario, tipo_archivo, hash_sha256)
+    if previa:
+        return previa, True
+    return encolar_carga(tipo_archivo, archivo, usuario, hash_sha256=hash_sha256), False
+
 @login_required_custom
 def carga_factores(request):
     if request.method == 'POST':
@@ -517,46 +574,26 @@ def carga_factores(request):
         if not archivo_csv:
             messages.error(request, 'Debes seleccionar un archivo CSV')
             return redirect('carga_factores')
-        if not archivo_csv.name.endswith('.csv'):
-            messages.error(request, 'El archivo debe ser CSV')
+        if not archivo_csv.name.lower().endswith(EXTENSIONES_CARGA):
+            messages.error(request, 'El archivo debe ser CSV o XLSX')
             return redirect('carga_factores')
         try:
-            data_set = archivo_csv.read().decode('utf-8-sig')
-            io_string = io.StringIO(data_set)
-            reader = csv.DictReader(io_string)
-            required_columns = ['nombre_factor', 'valor_factor', 'fecha_inicio']
-            if not all(col in reader.fieldnames for col in required_columns):
+            required_columns = COLUMNAS_REQUERIDAS['factores']
+            if not all(col in leer_encabezados(archivo_csv) for col in required_columns):
                 messages.error(request, f'El CSV debe contener: {", ".join(required_columns)}')
                 return redirect('carga_factores')
             
             usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
-            carga = Archivocarga.objects.create(
-                tipo_archivo='factores',
-                fecha_carga=datetime.now(),
-                estado='procesando',
-                archivo_url=archivo_csv.name,
-                fk_id_usuario=usuario
-            )
-            
-            registros_procesados, registros_fallidos = 0, 0
-            for row_num, row in enumerate(reader, start=2):
-                try:
-                    fecha_inicio = datetime.strptime(row['fecha_inicio'], '%Y-%m-%d').date()
-                    fecha_fin = datetime.strptime(row.get('fecha_fin', row['fecha_inicio']), '%Y-%m-%d').date()
-                    Factor.objects.create(
-                        nombre_factor=row['nombre_factor'],
-                        valor_factor=int(row['valor_factor']),
-                        fecha_inicio=fecha_inicio,
-                        fecha_fin=fecha_fin
-                    )
-                    registros_procesados += 1
-                except Exception as e:
-                    registros_fallidos += 1
-                    print(f"Fila {row_num} error: {e}")
-            
-            carga.estado = 'completado'
-            carga.save()
-            messages.success(request, f'{registros_procesados} factores procesados, {registros_fallidos} fallidos')
+            validacion = _solo_validar(request, 'factores', archivo_csv, usuario, 'template_cargas/carga_factor.html')
+            if validacion:
+                return validacion
+            # El procesamiento corre en la cola de cargas (o aquí mismo sin worker)
+            carga, repetida = _encolar_sin_repetir(request, 'factores', archivo_csv, usuario)
+            if repetida:
+                return redirect('detalles_carga', carga_id=carga.id_archivo)
+
+            if not _informar_carga(request, carga, 'Factores cargados: {resultado}'):
+                return redirect('listado_cargas')
             return redirect('dashboard_admin' if request.session.get('rol')=='admin' else 'dashboard_corredor')
         
         except Exception as e:
@@ -574,54 +611,22 @@ def carga_montos(request):
             messages.error(request, 'Debes seleccionar un archivo CSV')
             return redirect('carga_montos')
         try:
-            data_set = archivo_csv.read().decode('utf-8-sig')
-            io_string = io.StringIO(data_set)
-            delimiter = ';' if ';' in data_set.splitlines()[0] else ','
-            reader = csv.DictReader(io_string, delimiter=delimiter)
-            
-            required_columns = ['fecha','mercado','ano','monto','descripcion']
-            if not all(col in reader.fieldnames for col in required_columns):
+            required_columns = COLUMNAS_REQUERIDAS['montos']
+            if not all(col in leer_encabezados(archivo_csv) for col in required_columns):
                 messages.error(request, f'El CSV debe contener: {", ".join(required_columns)}')
                 return redirect('carga_montos')
             
             usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
-            corredor = Corredor.objects.get(fk_usuario=usuario)
-            carga = Archivocarga.objects.create(
-                tipo_archivo='montos',
-                fecha_carga=datetime.now(),
-                estado='procesando',
-                archivo_url=archivo_csv.name,
-                fk_id_usuario=usuario
-            )
-
-            registros_procesados, registros_fallidos = 0, 0
-            for row_num, row in enumerate(reader, start=2):
-                try:
-                    # Manejar diferentes formatos de número
-                    monto_str = row['monto']
-                    # Remover puntos de miles y reemplazar coma decimal por punto
-                    monto_str = monto_str.replace('.', '').replace(',', '.')
-                    # Remover símbolos de moneda
-                    monto_str = monto_str.replace('$', '').replace('€', '').strip()
-                    monto = float(monto_str)
-                    
-                    Calificacion.objects.create(
-                        fecha=datetime.strptime(row['fecha'], '%Y-%m-%d').date(),
-                        mercado=row['mercado'],
-                        ano=int(row['ano']),
-                        descripcion=row['descripcion'],
-                        factor_actualizado=monto,
-                        fk_id_corredor=corredor
-                    )
-                    registros_procesados += 1
-                except Exception as e:
-                    registros_fallidos += 1
-                    print(f"Fila {row_num} error: {e}")
-                    print(f"Datos de la fila: {row}")
-
-            carga.estado = 'completado'
-            carga.save()
-            messages.success(request, f'{registros_procesados} montos procesados, {registros_fallidos} fallidos')
+            Corredor.objects.get(fk_usuario=usuario)
+            validacion = _solo_validar(request, 'montos', archivo_csv, usuario, 'template_cargas/carga_monto.html')
+            if validacion:
+                return validacion
+            carga, repetida = _encolar_sin_repetir(request, 'montos', archivo_csv, usuario)
+            if repetida:
+                return redirect('detalles_carga', carga_id=carga.id_archivo)
+
+            if not _informar_carga(request, carga, '{procesados} montos procesados, {fallidos} fallidos'):
+                return redirect('listado_cargas')
             return redirect('dashboard_admin' if request.session.get('rol') == 'admin' else 'dashboard_corredor')
         
         except Exception as e:
@@ -669,91 +674,30 @@ def carga_masiva_montos(request):
             messages.error(request, 'Debes seleccionar un archivo CSV')
             return redirect('carga_montos')
         
-        if not archivo_csv.name.endswith('.csv'):
-            messages.error(request, 'El archivo debe ser CSV')
+        if not archivo_csv.name.lower().endswith(EXTENSIONES_CARGA):
+            messages.error(request, 'El archivo debe ser CSV o XLSX')
             return redirect('carga_montos')
 
         try:
-            # Leer contenido con soporte BOM
-            data_set = archivo_csv.read().decode('utf-8-sig')
-            io_string = io.StringIO(data_set)
-
-            # Detectar si Excel usó ; en lugar de ,
-            first_line = data_set.splitlines()[0]
-            delimiter = ';' if ';' in first_line else ','
-
-            reader = csv.DictReader(io_string, delimiter=delimiter)
-
-            # Normalizar nombres de columnas (quita BOM / espacios)
-            fieldnames = [fn.strip().replace('\ufeff', '') for fn in reader.fieldnames]
-
-            required_columns = ['fecha', 'mercado', 'ano', 'monto', 'descripcion']
-            if not all(col in fieldnames for col in required_columns):
+            # Solo se lee el encabezado; detecta BOM, encoding y delimitador (Excel usa ;)
+            required_columns = COLUMNAS_REQUERIDAS['montos']
+            if not all(col in leer_encabezados(archivo_csv) for col in required_columns):
                 messages.error(request, f'El CSV debe contener las columnas: {", ".join(required_columns)}')
                 return redirect('carga_montos')
 
-            # Mapa limpio
-            reader.fieldnames = fieldnames
-
             usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
-            corredor = Corredor.objects.get(fk_usuario=usuario)
-
-            carga = Archivocarga.objects.create(
-                tipo_archivo='montos',
-                fecha_carga=datetime.now(),
-                estado='procesando',
-                archivo_url=archivo_csv.name,
-                fk_id_usuario=usuario
-            )
-
-            registros_procesados = 0
-            registros_fallidos = 0
-            
-            for row_num, row in enumerate(reader, start=2):
-                try:
-                    # Normalizar monto (quita comas o puntos)
-                    monto_str = row['monto']
-                    # Limpiar el string
-                    monto_str = monto_str.replace('$', '').replace('€', '').strip()
-                    # Reemplazar comas decimales por punto
-                    monto_str = monto_str.replace(',', '.')
-                    # Eliminar puntos de miles
-                    if '.' in monto_str and monto_str.count('.') > 1:
-                        # Si hay múltiples puntos, son separadores de miles
-                        parts = monto_str.split('.')
-                        if len(parts[-1]) == 2:  # Posiblemente decimales
-                            monto_str = ''.join(parts[:-1]) + '.' + parts[-1]
-                        else:
-                            monto_str = ''.join(parts)
-                    
-                    monto_float = float(monto_str)
-
-                    Calificacion.objects.create(
-                        fecha=datetime.strptime(row['fecha'], '%Y-%m-%d').date(),
-                        mercado=row['mercado'],
-                        ano=int(row['ano']),
-                        descripcion=row['descripcion'],
-                        factor_actualizado=monto_float,
-                        fk_id_corredor=corredor
-                    )
-
-                    registros_procesados += 1
-
-                except Exception as e:
-                    registros_fallidos += 1
-                    print(f"Error en fila {row_num}: {e}")
-
-            carga.estado = 'completado'
-            carga.save()
-
-            Auditoria.objects.create(
-                accion='CARGA_MONTOS',
-                fecha_hora=datetime.now(),
-                resultado=f'{registros_procesados} procesados, {registros_fallidos} fallidos',
-                fk_usuario=usuario
-            )
-
-            messages.success(request, f'Carga completada: {registros_procesados} OK, {registros_fallidos} fallidos')
+            Corredor.objects.get(fk_usuario=usuario)
+
+            # Inserción por lotes en la cola de cargas
+            validacion = _solo_validar(request, 'montos', archivo_csv, usuario, 'template_cargas/carga_monto.html')
+            if validacion:
+                return validacion
+            carga, repetida = _encolar_sin_repetir(request, 'montos', archivo_csv, usuario)
+            if repetida:
+                return redirect('detalles_carga', carga_id=carga.id_archivo)
+
+            if not _informar_carga(request, carga, 'Carga completada: {procesados} OK, {fallidos} fallidos'):
+                return redirect('listado_cargas')
             return redirect('dashboard_admin' if request.session.get('rol') == 'admin' else 'dashboard_corredor')
 
         except Exception as e:
@@ -772,48 +716,48 @@ def carga_masiva_calificaciones(request):
             messages.error(request, 'Debes seleccionar un CSV')
             return redirect('carga_calificaciones')
         try:
-            data_set = archivo_csv.read().decode('utf-8-sig')
-            io_string = io.StringIO(data_set)
-            reader = csv.DictReader(io_string)
-            required_columns = ['fecha','mercado','ano','descripcion','factor_actualizado']
-            if not all(col in reader.fieldnames for col in required_columns):
+            required_columns = COLUMNAS_REQUERIDAS['calificaciones']
+            if not all(col in leer_encabezados(archivo_csv) for col in required_columns):
                 messages.error(request, f'CSV debe tener: {", ".join(required_columns)}')
                 return redirect('carga_calificaciones')
 
             usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
-            corredor = Corredor.objects.get(fk_usuario=usuario)
-            carga = Archivocarga.objects.create(
-                tipo_archivo='calificaciones',
-                fecha_carga=datetime.now(),
-                estado='procesando',
-                archivo_url=archivo_csv.name,
-                fk_id_usuario=usuario
-            )
-
-            registros = 0
-            for row in reader:
-                # Manejar factor_actualizado
-                factor_str = row.get('factor_actualizado', '0')
-                factor_str = factor_str.replace('.', '').replace(',', '.').replace('$', '').strip()
-                factor_val = float(factor_str) if factor_str else 0.0
-                
-                Calificacion.objects.create(
-                    fecha=datetime.strptime(row['fecha'], '%Y-%m-%d').date(),
-                    mercado=row['mercado'],
-                    ano=int(row['ano']),
-                    descripcion=row['descripcion'],
-                    factor_actualizado=factor_val,
-                    fk_id_corredor=corredor
-                )
-                registros += 1
-            carga.estado = 'completado'
-            carga.save()
-            messages.success(request, f'{registros} calificaciones cargadas')
+            Corredor.objects.get(fk_usuario=usuario)
+            validacion = _solo_validar(request, 'calificaciones', archivo_csv, usuario, 'template_cargas/carga_masiva_calificaciones.html')
+            if validacion:
+                return validacion
+            carga, repetida = _encolar_sin_repetir(request, 'calificaciones', archivo_csv, usuario)
+            if repetida:
+                return redirect('detalles_carga', carga_id=carga.id_archivo)
+
+            if not _informar_carga(request, carga, '{procesados} calificaciones cargadas'):
+                return redirect('listado_cargas')
             return redirect('dashboard_corredor')
         except Exception as e:
             messages.error(request, f'Error: {str(e)}')
             return redirect('carga_calificaciones')
-    return render(request, 'template_cargas/template_carga_masiva.html')
+    return render(request, 'template_cargas/carga_masiva_calificaciones.html')
+
+@login_required_custom
+def carga_zip(request):
+    if request.method == 'POST':
+        archivo_zip = request.FILES.get('archivo_zip')
+        if not archivo_zip:
+            messages.error(request, 'Debes seleccionar un archivo ZIP')
+            return redirect('carga_zip')
+        if not archivo_zip.name.lower().endswith('.zip') or not zipfile.is_zipfile(archivo_zip):
+            messages.error(request, 'El archivo debe ser un ZIP válido')
+            return redirect('carga_zip')
+        try:
+            usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
+            # Cada CSV/XLSX/PDF del ZIP queda como una carga propia (y un trabajo de la cola) bajo la carga del ZIP
+            padre = encolar_zip(archivo_zip, usuario, forzar=request.POST.get('forzar_recarga') == 'on')
+            _informar_carga(request, padre, 'ZIP procesado: {resultado}')
+            return redirect('detalles_carga', carga_id=padre.id_archivo)
+        except Exception as e:
+            messages.error(request, f'Error procesando ZIP: {str(e)}')
+            return redirect('carga_zip')
+    return render(request, 'template_cargas/carga_zip.html')
 
 @login_required_custom
 def ver_detalles_carga(request, carga_id):
@@ -833,6 +777,7 @@ def ver_detalles_carga(request, carga_id):
         context = {
             'carga': carga,
             'total_registros': registros,
+            'miembros': carga.miembros.order_by('id_archivo'),
         }
         return render(request, 'template_cargas/template_detalles_carga.html', context)
         
@@ -840,6 +785,139 @@ def ver_detalles_carga(request, carga_id):
         messages.error(request, 'La carga no existe')
         return redirect('listado_cargas')
 
+@login_required_custom
+def descargar_errores_carga(request, carga_id):
+    """Descarga el reporte CSV (fila, error) de las filas rechazadas de una carga"""
+    carga = get_object_or_404(Archivocarga, id_archivo=carga_id)
+    if not carga.ruta_errores or not default_storage.exists(carga.ruta_errores):
+        messages.info(request, 'Esta carga no tiene filas con error')
+        return redirect('detalles_carga', carga_id=carga_id)
+    return FileResponse(default_storage.open(carga.ruta_errores, 'rb'), as_attachment=True,
+                        filename=f'errores_carga_{carga_id}.csv', content_type='text/csv')
+
+def _cargas_visibles(request):
+    """Cargas que puede consultar el usuario de la sesión: las suyas, o todas si es admin"""
+    cargas = Archivocarga.objects.all()
+    if request.session.get('rol') != 'admin':
+        cargas = cargas.filter(fk_id_usuario_id=request.session['usuario_id'])
+    return cargas
+
+@login_required_custom
+def progreso_carga(request, carga_id):
+    """JSON liviano con el avance de una carga (lo consulta listar_cargas.html)"""
+    datos = _cargas_visibles(request).filter(id_archivo=carga_id).values(
+        'estado', 'registros_procesados', 'registros_fallidos',
+        'bytes_procesados', 'bytes_totales', 'trabajo__fecha_inicio'
+    ).first()
+    if datos is None:
+        return JsonResponse({'error': 'La carga no existe'}, status=404)
+
+    filas = datos['registros_procesados'] + datos['registros_fallidos']
+    bytes_procesados = datos['bytes_procesados']
+    bytes_totales = datos['bytes_totales']
+    filas_por_segundo = None
+    eta_segundos = None
+
+    inicio = datos['trabajo__fecha_inicio']
+    if inicio and datos['estado'] == 'procesando':
+        transcurrido = (timezone.now() - inicio).total_seconds()
+        if transcurrido > 0 and filas:
+            filas_por_segundo = round(filas / transcurrido, 1)
+        if transcurrido > 0 and bytes_procesados:
+            # El ETA se estima por bytes porque no se conoce el total de filas
+            eta_segundos = round((bytes_totales - bytes_procesados) / (bytes_procesados / transcurrido))
+
+    return JsonResponse({
+        'estado': datos['estado'],
+        'registros_procesados': datos['registros_procesados'],
+        'registros_fallidos': datos['registros_fallidos'],
+        'bytes_procesados': bytes_procesados,
+        'bytes_totales': bytes_totales,
+        'porcentaje': round(100 * bytes_procesados / bytes_totales, 1) if bytes_totales else None,
+        'filas_por_segundo': filas_por_segundo,
+        'eta_segundos': max(eta_segundos, 0) if eta_segundos is not None else None,
+    })
+
+# ========== SUBIDA FRAGMENTADA (API JSON) ==========
+
+def _datos_request(request):
+    """Parámetros de la API: cuerpo JSON o formulario"""
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or '{}')
+        except ValueError:
+            raise ValueError('JSON no válido')
+    return request.POST
+
+def _subida_del_usuario(request, subida_id):
+    return get_object_or_404(SubidaFragmentada, id_subida=subida_id, fk_id_usuario_id=request.session['usuario_id'])
+
+@login_required_custom
+@require_POST
+def subida_iniciar(request):
+    """Abre una subida fragmentada: {nombre_archivo, tipo_archivo, tamano_total, tamano_fragmento?, sha256?}"""
+    try:
+        datos = _datos_request(request)
+        usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
+        subida = iniciar_subida(
+            usuario,
+            datos.get('nombre_archivo', ''),
+            datos.get('tipo_archivo', ''),
+            datos.get('tamano_total', 0),
+            tamano_fragmento=datos.get('tamano_fragmento'),
+            hash_sha256=datos.get('sha256')
+        )
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(estado_subida(subida), status=201)
+
+@login_required_custom
+def subida_detalle(request, subida_id):
+    """GET: estado y offsets faltantes (para reanudar). DELETE: cancela la subida."""
+    subida = _subida_del_usuario(request, subida_id)
+    if request.method == 'DELETE':
+        cancelar_subida(subida)
+    elif request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    return JsonResponse(estado_subida(subida))
+
+@login_required_custom
+def subida_fragmento(request, subida_id):
+    """PUT ?offset=N con el fragmento en el cuerpo y su SHA-256 en X-Fragmento-Sha256"""
+    if request.method != 'PUT':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    subida = _subida_del_usuario(request, subida_id)
+    try:
+        # Se lee el stream del request por bloques; el cuerpo nunca queda entero en memoria
+        recibir_fragmento(
+            subida,
+            int(request.GET.get('offset', -1)),
+            request,
+            int(request.META.get('CONTENT_LENGTH') or 0),
+            request.META.get('HTTP_X_FRAGMENTO_SHA256', '')
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(estado_subida(subida))
+
+@login_required_custom
+@require_POST
+def subida_completar(request, subida_id):
+    """Arma el archivo y lo envía a la cola de cargas ({"forzar_recarga": true} omite la deduplicación)"""
+    subida = _subida_del_usuario(request, subida_id)
+    try:
+        datos = _datos_request(request)
+        carga, repetida = completar_subida(subida, forzar=datos.get('forzar_recarga') in (True, 'on', 'true', '1'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'carga_id': carga.id_archivo,
+        'estado': carga.estado,
+        'resultado': carga.resultado,
+        'repetida': repetida,
+        'progreso_url': reverse('progreso_carga', args=[carga.id_archivo]),
+    })
+
 @login_required_custom
 def descargar_reporte_carga(request, carga_id):
     """Vista para descargar reporte de una carga"""
@@ -895,11 +973,9 @@ def carga_pdf_factores(request):
             
             with pdfplumber.open(archivo_pdf) as pdf:
                 for page in pdf.pages:
-                    text = page.extract_text()
-                    
-                    patrones = re.findall(r'Factor:\s*(\w+)\s*Valor:\s*(\d+)', text)
+                    text = page.extract_text() or ''
                     
-                    for factor, valor in patrones:
+                    for factor, valor in escaner_utils.factores_valor(text):
                         datos_extraidos.append({
                             'nombre_factor': factor,
                             'valor_factor': int(valor),
@@ -907,8 +983,13 @@ def carga_pdf_factores(request):
                             'fecha_fin': date(2025, 12, 31)
                         })
             
+            # Upsert sobre la clave natural para no duplicar factores al recargar
             for dato in datos_extraidos:
-                Factor.objects.create(**dato)
+                Factor.objects.update_or_create(
+                    nombre_factor=dato.pop('nombre_factor'),
+                    fecha_inicio=dato.pop('fecha_inicio'),
+                    defaults=dato
+                )
             
             messages.success(request, f'PDF procesado: {len(datos_extraidos)} factores extraídos')
             return redirect('listado_cargas')
@@ -925,88 +1006,35 @@ def carga_pdf(request):
         try:
             usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
             corredor = Corredor.objects.get(fk_usuario=usuario)
-            datos_extraidos = []
-
-            with pdfplumber.open(archivo_pdf) as pdf:
-                for page_num, page in enumerate(pdf.pages, start=1):
-                    text = page.extract_text()
-                    if not text: 
-                        continue
-                    
-                    print(f"=== DEBUG Página {page_num} ===")
-                    print(text[:500])  # Ver primeros 500 caracteres para debug
-                    
-                    # PATRONES MEJORADOS para extracción de datos
-                    patrones = [
-                        # Patrón 1: Fecha - Mercado - Año - Monto/Factor
-                        r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})[^\d]*([A-Za-zñÑáéíóúÁÉÍÓÚ\s]+)[^\d]*(\d{4})[^\d]*([\d\.,]+)',
-                        
-                        # Patrón 2: Buscar montos grandes (con separadores de miles)
-                        r'(\d{4}-\d{2}-\d{2})[^0-9]*([\d]{1,3}(?:\.\d{3})*(?:,\d{2})?)',
-                        
-                        # Patrón 3: Buscar por etiquetas específicas
-                        r'Fecha[:\s]*(\d{4}-\d{2}-\d{2}).*?Mercado[:\s]*([A-Za-z]+).*?Año[:\s]*(\d{4}).*?(?:Monto|Factor)[:\s]*([\d\.,]+)',
-                    ]
-                    
-                    for patron in patrones:
-                        matches = re.findall(patron, text, re.IGNORECASE | re.DOTALL)
-                        
-                        for match in matches:
-                            if len(match) >= 4:
-                                try:
-                                    fecha = match[0]
-                                    mercado = match[1].strip()
-                                    ano = match[2]
-                                    monto_str = match[3]
-                                    
-                                    # Limpiar y convertir monto
-                                    monto_str = monto_str.replace('.', '').replace(',', '.')
-                                    monto_val = float(monto_str)
-                                    
-                                    # Validar mercado
-                                    mercados_validos = ['Acciones', 'Bonos', 'Derivados', 'Monedas', 'Acción', 'Bono', 'Derivado', 'Moneda']
-                                    mercado_validado = next((m for m in mercados_validos if m.lower() in mercado.lower()), 'Otro')
-                                    
-                                    datos_extraidos.append({
-                                        'fecha': fecha,
-                                        'mercado': mercado_validado,
-                                        'ano': ano,
-                                        'factor': monto_val,
-                                        'descripcion': f'PDF Página {page_num} - Extracción automática'
-                                    })
-                                except Exception as e:
-                                    print(f"Error procesando match: {match}, error: {e}")
-                                    continue
-
-            registros = 0
-            for dato in datos_extraidos:
-                try:
-                    # Convertir fecha
-                    fecha_dt = datetime.strptime(dato['fecha'], '%Y-%m-%d').date() if '-' in dato['fecha'] else datetime.strptime(dato['fecha'], '%d/%m/%Y').date()
-                    
-                    Calificacion.objects.create(
-                        fecha=fecha_dt,
-                        mercado=dato['mercado'],
-                        ano=int(dato['ano']),
-                        factor_actualizado=dato['factor'],
-                        descripcion=dato['descripcion'],
-                        fk_id_corredor=corredor
-                    )
-                    registros += 1
-                except Exception as e:
-                    print(f"Error guardando registro: {dato}, error: {e}")
-                    continue
-
-            # Crear registro de carga
-            Archivocarga.objects.create(
+            hash_sha256 = calcular_sha256(archivo_pdf)
+            previa = _carga_repetida(request, usuario, 'pdf_calificaciones', hash_sha256)
+            if previa:
+                return redirect('detalles_carga', carga_id=previa.id_archivo)
+            carga = Archivocarga.objects.create(
                 tipo_archivo='pdf_calificaciones',
-                fecha_carga=datetime.now(),
-                estado='completado',
-                archivo_url=archivo_pdf.name,
-                fk_id_usuario=usuario
+                fecha_carga=timezone.now(),
+                estado='procesando',
+                archivo_url=archivo_pdf.name[:150],
+                fk_id_usuario=usuario,
+                hash_sha256=hash_sha256
             )
 
-            messages.success(request, f'{registros} registros extraídos del PDF')
+            try:
+                datos_extraidos, omitidas, memoria_pico = extraer_calificaciones_pdf(archivo_pdf)
+                registros, fallidos, _ = guardar_calificaciones_pdf(carga, corredor, datos_extraidos)
+            except Exception as e:
+                carga.estado = 'error'
+                carga.resultado = f'Error procesando PDF: {str(e)}'[:500]
+                carga.save()
+                raise
+
+            cerrar_carga_pdf(carga, registros, fallidos, omitidas, memoria_pico)
+            carga.save()
+
+            if omitidas:
+                messages.warning(request, f'Carga parcial: {carga.resultado}')
+            else:
+                messages.success(request, f'{registros} registros extraídos del PDF')
             return redirect('dashboard_corredor')
         except Exception as e:
             messages.error(request, f'Error procesando PDF: {str(e)}')
@@ -1158,11 +1186,42 @@ def eliminar_usuario(request, usuario_id):
         return redirect('gestion_usuarios')
     
     nombre = usuario.nombre
-    usuario.delete()
+    # Borra en cascada sus calificaciones y auditorías: un ajuste de los resúmenes por clave
+    with transaction.atomic(), agrupar_estadisticas():
+        usuario.delete()
     
     messages.success(request, f'Usuario {nombre} eliminado')
     return redirect('gestion_usuarios')
 
+def _cargas_pdf_recientes(usuario):
+    """Últimas cargas de PDF del usuario, para el sidebar"""
+    return Archivocarga.objects.filter(
+        fk_id_usuario=usuario,
+        tipo_archivo='pdf_calificaciones'
+    ).order_by('-fecha_carga')[:5]
+
+def _render_confirmacion(request, usuario, carga, total_registros):
+    """Página de confirmación con los registros en staging de una carga 'por_confirmar'"""
+    return render(request, 'template_cargas/extraer_datos_pdf.html', {
+        'datos_extraidos': carga.registros_extraidos.order_by('indice'),
+        'carga_id': carga.id_archivo,
+        'archivo_nombre': carga.archivo_url,
+        'total_registros': total_registros,
+        'mostrar_confirmacion': True,
+        'cargas_recientes': _cargas_pdf_recientes(usuario)
+    })
+
+MENSAJE_PDF_SIN_DATOS = (
+    'No se encontraron datos extraíbles en el PDF "{nombre}". '
+    'Verifica que el PDF contenga información estructurada con:'
+    '<ul class="mb-0 mt-2">'
+    '<li>Fechas (ej: 2023-12-15 o 15/12/2023)</li>'
+    '<li>Mercados (Acciones, Bonos, Derivados, Monedas)</li>'
+    '<li>Montos o factores (números grandes)</li>'
+    '<li>Años (2023, 2024, etc.)</li>'
+    '</ul>'
+)
+
 @login_required_custom
 def extraer_datos_pdf(request):
     """Vista mejorada para extraer datos de PDF - Compatible con el template actual"""
@@ -1173,6 +1232,12 @@ def extraer_datos_pdf(request):
             usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
             corredor = Corredor.objects.get(fk_usuario=usuario)
             
+            # Un PDF ya guardado no se vuelve a extraer (salvo forzar recarga)
+            hash_sha256 = calcular_sha256(archivo_pdf)
+            previa = _carga_repetida(request, usuario, 'pdf_calificaciones', hash_sha256)
+            if previa:
+                return redirect('detalles_carga', carga_id=previa.id_archivo)
+            
             # Registrar auditoría
             Auditoria.objects.create(
                 accion='CARGA_PDF_INICIO',
@@ -1181,221 +1246,37 @@ def extraer_datos_pdf(request):
                 fk_usuario=usuario
             )
             
-            datos_extraidos = []
-            registros_validos = []
-            
-            with pdfplumber.open(archivo_pdf) as pdf:
-                total_paginas = len(pdf.pages)
-                
-                for page_num, page in enumerate(pdf.pages, start=1):
-                    # Extraer texto de la página
-                    text = page.extract_text()
-                    
-                    if not text or len(text.strip()) < 10:
-                        continue  # Saltar páginas vacías
-                    
-                    print(f"=== DEBUG: Procesando página {page_num} ===")
-                    print(f"Texto extraído (primeros 500 chars): {text[:500]}")
-                    
-                    # ====== PATRONES DE BÚSQUEDA MEJORADOS ======
-                    
-                    # 1. Patrón: Fecha - Mercado - Año - Monto
-                    patron1 = r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})[^\d]*(Acciones|Bonos|Derivados|Monedas)[^\d]*(\d{4})[^\d]*([\d\.,]+)'
-                    matches1 = re.findall(patron1, text, re.IGNORECASE | re.DOTALL)
-                    
-                    for match in matches1:
-                        if len(match) == 4:
-                            registro = {
-                                'fecha': match[0],
-                                'mercado': match[1],
-                                'ano': match[2],
-                                'monto_original': match[3],
-                                'descripcion': f'PDF Página {page_num} - Patrón directo',
-                                'pagina': page_num
-                            }
-                            registros_validos.append(registro)
-                    
-                    # 2. Patrón: Buscar líneas con montos grandes
-                    lineas = text.split('\n')
-                    for linea_num, linea in enumerate(lineas):
-                        linea = linea.strip()
-                        if len(linea) < 20:
-                            continue
-                        
-                        # Buscar números grandes (montos)
-                        montos = re.findall(r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+(?:,\d{2})?)', linea)
-                        if montos:
-                            # Filtrar montos válidos (grandes)
-                            montos_validos = []
-                            for monto in montos:
-                                try:
-                                    # Limpiar monto
-                                    monto_limpio = monto.replace('.', '').replace(',', '.')
-                                    valor = float(monto_limpio)
-                                    if valor > 100:  # Solo montos significativos
-                                        montos_validos.append({
-                                            'texto': monto,
-                                            'valor': valor,
-                                            'posicion': linea.find(monto)
-                                        })
-                                except:
-                                    continue
-                            
-                            if montos_validos:
-                                # Ordenar por valor (más grande primero)
-                                montos_validos.sort(key=lambda x: x['valor'], reverse=True)
-                                monto_seleccionado = montos_validos[0]
-                                
-                                # Buscar fecha en la misma línea
-                                fecha_match = re.search(r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})', linea)
-                                fecha = fecha_match.group(1) if fecha_match else None
-                                
-                                # Buscar mercado en la misma línea
-                                mercado = None
-                                mercados = ['Acciones', 'Bonos', 'Derivados', 'Monedas']
-                                for m in mercados:
-                                    if m.lower() in linea.lower():
-                                        mercado = m
-                                        break
-                                
-                                # Buscar año en la misma línea
-                                ano_match = re.search(r'(?:20\d{2})', linea)
-                                ano = ano_match.group(0) if ano_match else str(date.today().year)
-                                
-                                if fecha and mercado:
-                                    registro = {
-                                        'fecha': fecha,
-                                        'mercado': mercado,
-                                        'ano': ano,
-                                        'monto_original': monto_seleccionado['texto'],
-                                        'descripcion': f'PDF Página {page_num} - Línea {linea_num+1}',
-                                        'pagina': page_num,
-                                        'linea': linea
-                                    }
-                                    registros_validos.append(registro)
-                    
-                    # 3. Patrón: Buscar tablas estructuradas
-                    # Si la página tiene tablas, extraerlas
-                    if page.extract_tables():
-                        tables = page.extract_tables()
-                        for table_num, table in enumerate(tables):
-                            for row_num, row in enumerate(table):
-                                # Unir todas las celdas del row
-                                row_text = ' '.join([str(cell) for cell in row if cell])
-                                
-                                # Buscar fecha
-                                fecha_match = re.search(r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})', row_text)
-                                # Buscar monto
-                                monto_match = re.search(r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)', row_text)
-                                # Buscar mercado
-                                mercado = None
-                                for m in ['Acciones', 'Bonos', 'Derivados', 'Monedas']:
-                                    if m.lower() in row_text.lower():
-                                        mercado = m
-                                        break
-                                # Buscar año
-                                ano_match = re.search(r'(?:20\d{2})', row_text)
-                                
-                                if fecha_match and monto_match and mercado:
-                                    registro = {
-                                        'fecha': fecha_match.group(1),
-                                        'mercado': mercado,
-                                        'ano': ano_match.group(0) if ano_match else str(date.today().year),
-                                        'monto_original': monto_match.group(1),
-                                        'descripcion': f'PDF Página {page_num} - Tabla {table_num+1}, Fila {row_num+1}',
-                                        'pagina': page_num
-                                    }
-                                    registros_validos.append(registro)
-            
-            # Procesar y formatear los registros encontrados
-            for i, registro in enumerate(registros_validos):
-                try:
-                    # Formatear fecha
-                    fecha_str = registro['fecha']
-                    fecha_formateada = fecha_str
-                    
-                    if '/' in fecha_str:
-                        partes = fecha_str.split('/')
-                        if len(partes) == 3:
-                            dia, mes, ano = partes
-                            if len(ano) == 2:
-                                ano = '20' + ano
-                            fecha_formateada = f"{ano}-{mes.zfill(2)}-{dia.zfill(2)}"
-                    elif '-' in fecha_str:
-                        # Ya está en formato ISO o similar
-                        pass
-                    
-                    # Limpiar y convertir monto
-                    monto_str = str(registro['monto_original'])
-                    monto_limpio = monto_str.replace('.', '').replace(',', '.').strip()
-                    # Remover caracteres no numéricos excepto punto
-                    monto_limpio = re.sub(r'[^\d.]', '', monto_limpio)
-                    
-                    try:
-                        monto_valor = float(monto_limpio)
-                    except:
-                        monto_valor = 0.0
-                    
-                    datos_extraidos.append({
-                        'index': i,
-                        'fecha': registro['fecha'],
-                        'fecha_formateada': fecha_formateada,
-                        'mercado': registro['mercado'],
-                        'ano': registro['ano'],
-                        'monto_original': registro['monto_original'],
-                        'monto_valor': monto_valor,
-                        'descripcion': registro['descripcion'],
-                        'pagina': registro['pagina']
-                    })
-                    
-                except Exception as e:
-                    print(f"Error procesando registro {i}: {e}")
-                    continue
+            # Las páginas se reparten en un pool de procesos que abren el PDF por su ruta;
+            # las que ya se extrajeron antes (mismo SHA-256) salen del caché. Las páginas
+            # donde calza una plantilla del corredor se leen con ella
+            presupuesto = Presupuesto()
+            with ruta_local(archivo_pdf) as ruta:
+                registros, omitidas, descartadas = extraer_registros_pdf(ruta, hash_sha256, presupuesto,
+                                                                         plantillas_pdf(corredor))
+            if omitidas:
+                messages.warning(request, f'Extracción parcial: {resumir_omitidas(omitidas)}')
+            if descartadas:
+                messages.info(request, resumir_descartadas(descartadas))
             
-            # Filtrar duplicados (misma fecha, mercado, año y monto similar)
-            datos_unicos = []
-            visto = set()
-            for dato in datos_extraidos:
-                clave = f"{dato['fecha_formateada']}_{dato['mercado']}_{dato['ano']}_{dato['monto_valor']:.2f}"
-                if clave not in visto:
-                    visto.add(clave)
-                    datos_unicos.append(dato)
+            # Los registros quedan en staging (asociados a una carga 'por_confirmar');
+            # el formulario de confirmación solo devuelve los ids seleccionados
+            carga, total_unicos = preparar_confirmacion(usuario, archivo_pdf.name, hash_sha256, registros,
+                                                        omitidas, presupuesto.memoria_pico, descartadas)
             
             # Registrar resultados
             Auditoria.objects.create(
                 accion='CARGA_PDF_EXTRAIDO',
                 fecha_hora=timezone.now(),
-                resultado=f'Encontrados {len(datos_unicos)} registros únicos de {len(registros_validos)} posibles',
+                resultado=f'Encontrados {total_unicos} registros únicos de {len(registros)} posibles',
                 fk_usuario=usuario
             )
             
             # Si se encontraron datos, mostrar para confirmación
-            if datos_unicos:
-                # Obtener cargas recientes para el sidebar
-                cargas_recientes = Archivocarga.objects.filter(
-                    fk_id_usuario=usuario,
-                    tipo_archivo='pdf_calificaciones'
-                ).order_by('-fecha_carga')[:5]
-                
-                return render(request, 'template_cargas/extraer_datos_pdf.html', {
-                    'datos_extraidos': datos_unicos,
-                    'archivo_nombre': archivo_pdf.name,
-                    'total_registros': len(datos_unicos),
-                    'mostrar_confirmacion': True,
-                    'cargas_recientes': cargas_recientes
-                })
+            if carga:
+                return _render_confirmacion(request, usuario, carga, total_unicos)
             else:
                 # No se encontraron datos
-                messages.warning(request, 
-                    f'No se encontraron datos extraíbles en el PDF "{archivo_pdf.name}". '
-                    f'Verifica que el PDF contenga información estructurada con:'
-                    f'<ul class="mb-0 mt-2">'
-                    f'<li>Fechas (ej: 2023-12-15 o 15/12/2023)</li>'
-                    f'<li>Mercados (Acciones, Bonos, Derivados, Monedas)</li>'
-                    f'<li>Montos o factores (números grandes)</li>'
-                    f'<li>Años (2023, 2024, etc.)</li>'
-                    f'</ul>'
-                )
+                messages.warning(request, MENSAJE_PDF_SIN_DATOS.format(nombre=escape(archivo_pdf.name)))
                 
                 # Obtener cargas recientes para el sidebar
                 cargas_recientes = Archivocarga.objects.filter(
@@ -1457,24 +1338,142 @@ def extraer_datos_pdf(request):
     })
 
 
+def _evento_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+def _stream_extraccion_pdf(usuario, archivo_pdf, hash_sha256, plantillas=()):
+    """
+    Eventos server-sent de la extracción: 'inicio' con el total de
+    páginas, un 'pagina' por cada página terminada (con sus registros y el
+    avance) y 'fin' con la URL de la confirmación. Los registros se dejan
+    en staging al final, cuando se pueden descartar los duplicados.
+
+    Corre después de que el middleware procesó la respuesta: aquí no se
+    pueden agregar mensajes ni tocar la sesión, por eso los avisos viajan
+    en el propio evento.
+    """
+    try:
+        Auditoria.objects.create(
+            accion='CARGA_PDF_INICIO',
+            fecha_hora=timezone.now(),
+            resultado=f'Inicio procesamiento PDF: {archivo_pdf.name}',
+            fk_usuario=usuario
+        )
+        por_pagina = {}
+        omitidas = []
+        descartadas = []
+        presupuesto = Presupuesto()
+        with ruta_local(archivo_pdf) as ruta:
+            total_paginas = contar_paginas(ruta, hash_sha256)
+            yield _evento_sse('inicio', {'archivo': archivo_pdf.name, 'total_paginas': total_paginas})
+            for page_num, registros, motivo in iterar_registros_pdf(ruta, hash_sha256, total_paginas, presupuesto,
+                                                                    plantillas):
+                descarte = motivo if motivo in MOTIVOS_DESCARTE else None
+                if descarte:
+                    descartadas.append((page_num, descarte))
+                elif motivo:
+                    omitidas.append((page_num, motivo))
+                else:
+                    por_pagina[page_num] = registros
+                yield _evento_sse('pagina', {
+                    'pagina': page_num,
+                    'procesadas': len(por_pagina) + len(omitidas) + len(descartadas),
+                    'total_paginas': total_paginas,
+                    'registros': [dict(zip(CAMPOS_REGISTRO_PDF, registro)) for registro in registros or []],
+                    'omitida': None if descarte else motivo,
+                    'descartada': descarte,
+                })
+
+        registros = [registro for page_num in sorted(por_pagina) for registro in por_pagina[page_num]]
+        carga, total_unicos = preparar_confirmacion(usuario, archivo_pdf.name, hash_sha256, registros,
+                                                    omitidas, presupuesto.memoria_pico, descartadas)
+        Auditoria.objects.create(
+            accion='CARGA_PDF_EXTRAIDO',
+            fecha_hora=timezone.now(),
+            resultado=f'Encontrados {total_unicos} registros únicos de {len(registros)} posibles',
+            fk_usuario=usuario
+        )
+        omitidas_texto = resumir_omitidas(omitidas) if omitidas else None
+        descartadas_texto = resumir_descartadas(descartadas) if descartadas else None
+        if carga:
+            yield _evento_sse('fin', {
+                'total_registros': total_unicos,
+                'omitidas': omitidas_texto,
+                'descartadas': descartadas_texto,
+                'url': reverse('confirmar_datos_pdf', args=[carga.id_archivo]),
+            })
+        else:
+            yield _evento_sse('fin', {
+                'total_registros': 0,
+                'omitidas': omitidas_texto,
+                'descartadas': descartadas_texto,
+                'mensaje': MENSAJE_PDF_SIN_DATOS.format(nombre=escape(archivo_pdf.name)),
+            })
+    except Exception as e:
+        # El error llega al navegador como evento; la traza queda en el log del servidor
+        logger.exception('Error en extraer_datos_pdf_stream (%s)', archivo_pdf.name)
+        Auditoria.objects.create(
+            accion='CARGA_PDF_ERROR',
+            fecha_hora=timezone.now(),
+            resultado=f'Error: {str(e)[:100]}...',
+            fk_usuario=usuario
+        )
+        yield _evento_sse('error', {'mensaje': f'Error procesando PDF: {str(e)}'})
+
+@login_required_custom
+@require_POST
+def extraer_datos_pdf_stream(request):
+    """
+    Igual que extraer_datos_pdf pero responde con server-sent events a
+    medida que se procesa cada página, en vez de esperar el PDF completo.
+    """
+    archivo_pdf = request.FILES.get('archivo_pdf')
+    if not archivo_pdf:
+        return JsonResponse({'error': 'Falta el archivo PDF'}, status=400)
+    usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
+    corredor = Corredor.objects.filter(fk_usuario=usuario).first()
+    if corredor is None:
+        return JsonResponse({'error': 'El usuario no tiene un corredor asociado'}, status=400)
+
+    hash_sha256 = calcular_sha256(archivo_pdf)
+    previa = _carga_repetida(request, usuario, 'pdf_calificaciones', hash_sha256)
+    if previa:
+        eventos = iter([_evento_sse('fin', {'url': reverse('detalles_carga', args=[previa.id_archivo])})])
+    else:
+        eventos = _stream_extraccion_pdf(usuario, archivo_pdf, hash_sha256, plantillas_pdf(corredor))
+
+    response = StreamingHttpResponse(eventos, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sin esto nginx acumula la respuesta y el cliente no ve el avance
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required_custom
+def confirmar_datos_pdf(request, carga_id):
+    """Confirmación de una extracción que quedó en staging (destino del modo streaming)"""
+    usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
+    carga = Archivocarga.objects.filter(id_archivo=carga_id, fk_id_usuario=usuario, estado='por_confirmar').first()
+    if carga is None:
+        messages.warning(request, 'Esta extracción ya fue guardada o expiró. Vuelve a subir el PDF.')
+        return redirect('extraer_datos_pdf')
+    if carga.paginas_omitidas:
+        messages.warning(request, f'Extracción parcial: {carga.resultado}')
+    elif carga.paginas_descartadas:
+        messages.info(request, carga.resultado)
+    return _render_confirmacion(request, usuario, carga, carga.registros_extraidos.count())
+
+
 def buscar_patrones_calificaciones(texto, pagina):
     resultados = []
-
-    patrones = {
-        "fecha": r"\d{4}-\d{2}-\d{2}",
-        "mercado": r"(Acciones|Bonos|Derivados|Monedas)",
-        "ano": r"Año[:\s]+(\d{4})",
-        "factor": r"Factor[:\s]+([\d\.]+)",
-        "monto": r"\b\d{1,3}(?:\.\d{3})*(?:,\d{2})?\b"
-    }
+    aciertos = escaner_utils.escanear(texto, etiquetas=True)
 
     encontrado = {
         "pagina": pagina,
-        "fechas": re.findall(patrones["fecha"], texto),
-        "mercados": re.findall(patrones["mercado"], texto),
-        "anos": re.findall(patrones["ano"], texto),
-        "factores": re.findall(patrones["factor"], texto),
-        "montos": re.findall(patrones["monto"], texto),
+        "fechas": [a.texto for a in aciertos if a.tipo == 'fecha'],
+        "mercados": [a.texto for a in aciertos if a.tipo == 'mercado'],
+        "anos": escaner_utils.etiquetados(aciertos, 'etiqueta_ano'),
+        "factores": escaner_utils.etiquetados(aciertos, 'etiqueta_factor'),
+        "montos": [a.texto for a in aciertos if a.tipo == 'monto'],
         "texto_completo": texto[:300]
     }
 
@@ -1491,82 +1490,24 @@ def guardar_datos_extraidos(request):
             usuario = Usuario.objects.get(id_usuario=request.session['usuario_id'])
             corredor = Corredor.objects.get(fk_usuario=usuario)
             
-            registros_guardados = 0
-            registros_fallidos = 0
-            
-            # Obtener todos los registros del formulario
-            i = 0
-            while True:
-                # Buscar campos con el patrón registro_X
-                fecha = request.POST.get(f'fecha_{i}')
-                if fecha is None:  # No hay más registros
-                    break
-                
-                mercado = request.POST.get(f'mercado_{i}')
-                ano = request.POST.get(f'ano_{i}')
-                monto = request.POST.get(f'monto_{i}')
-                descripcion = request.POST.get(f'descripcion_{i}', '')
-                incluir = request.POST.get(f'incluir_{i}', 'off')
-                
-                # Solo procesar si está marcado para incluir
-                if incluir == 'on' and fecha and mercado and ano and monto:
-                    try:
-                        # Convertir fecha
-                        try:
-                            fecha_dt = datetime.strptime(fecha, '%Y-%m-%d').date()
-                        except:
-                            # Intentar otros formatos
-                            if '/' in fecha:
-                                partes = fecha.split('/')
-                                if len(partes) == 3:
-                                    fecha_dt = date(int(partes[2]), int(partes[1]), int(partes[0]))
-                                else:
-                                    fecha_dt = date.today()
-                            else:
-                                fecha_dt = date.today()
-                        
-                        # Limpiar monto
-                        monto_limpio = str(monto).replace('.', '').replace(',', '.').strip()
-                        # Remover símbolos de moneda
-                        monto_limpio = re.sub(r'[^\d.]', '', monto_limpio)
-                        
-                        # Verificar que sea un número válido
-                        if not monto_limpio.replace('.', '', 1).isdigit():
-                            raise ValueError(f"Monto no válido: {monto}")
-                            
-                        monto_valor = float(monto_limpio)
-                        
-                        # Crear calificación
-                        Calificacion.objects.create(
-                            fecha=fecha_dt,
-                            mercado=mercado.capitalize(),
-                            ano=int(ano),
-                            factor_actualizado=monto_valor,
-                            descripcion=descripcion,
-                            fk_id_corredor=corredor,
-                            origen='pdf'
-                        )
-                        
-                        registros_guardados += 1
-                        print(f"✅ Registro guardado: {fecha_dt} - {mercado} - {monto_valor}")
-                        
-                    except Exception as e:
-                        registros_fallidos += 1
-                        print(f"❌ Error guardando registro {i}: {e}")
-                
-                i += 1
+            # Solo llegan los ids seleccionados (en rangos) y las descripciones editadas;
+            # el resto de cada registro ya está en el staging de la carga
+            carga = Archivocarga.objects.filter(
+                id_archivo=request.POST.get('carga_id') or 0,
+                fk_id_usuario=usuario,
+                estado='por_confirmar'
+            ).first()
+            if carga is None:
+                messages.warning(request, 'Esta extracción ya fue guardada o expiró. Vuelve a subir el PDF.')
+                return redirect('extraer_datos_pdf')
             
-            # Registrar carga en Archivocarga si se guardó algo
-            if registros_guardados > 0:
-                Archivocarga.objects.create(
-                    tipo_archivo='pdf_calificaciones',
-                    fecha_carga=timezone.now(),
-                    estado='completado',
-                    archivo_url=request.POST.get('archivo_nombre', 'desconocido.pdf'),
-                    fk_id_usuario=usuario,
-                    registros_procesados=registros_guardados,
-                    registros_fallidos=registros_fallidos
-                )
+            seleccion = parsear_seleccion(request.POST.get('seleccionados', ''))
+            descripciones = {
+                int(campo[len('descripcion_'):]): valor
+                for campo, valor in request.POST.items()
+                if campo.startswith('descripcion_') and campo[len('descripcion_'):].isdigit()
+            }
+            registros_guardados, registros_fallidos = confirmar_registros(carga, corredor, seleccion, descripciones)
             
             # Mensaje de resultado
             if registros_guardados > 0:
@@ -1574,11 +1515,13 @@ def guardar_datos_extraidos(request):
                     f'✅ {registros_guardados} registros guardados exitosamente desde PDF'
                     + (f' ({registros_fallidos} fallidos)' if registros_fallidos > 0 else '')
                 )
-            else:
-                messages.warning(request, 
-                    'No se guardaron registros. '
-                    + ('Ninguno fue seleccionado.' if registros_fallidos == 0 else 'Todos los registros seleccionados tuvieron errores.')
+            elif registros_fallidos > 0:
+                messages.warning(request,
+                    'No se guardaron registros: todos los registros seleccionados tuvieron errores. '
+                    'Descarga el reporte de errores de la carga.'
                 )
+            else:
+                messages.warning(request, 'No se guardaron registros. Ninguno fue seleccionado.')
             
             # Auditoría
             Auditoria.objects.create(
@@ -1588,6 +1531,9 @@ def guardar_datos_extraidos(request):
                 fk_usuario=usuario
             )
             
+            if registros_guardados == 0 and registros_fallidos > 0:
+                # La carga quedó en 'error' con su reporte
+                return redirect('detalles_carga', carga_id=carga.id_archivo)
             return redirect('dashboard_corredor')
             
         except Exception as e:
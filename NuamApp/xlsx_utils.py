@@ -0,0 +1,229 @@
+# NuamApp/xlsx_utils.py
+import posixpath
+import re
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from xml.etree.ElementTree import iterparse
+from xml.parsers import expat
+
+# Lector de .xlsx de solo lectura y en streaming (sin openpyxl): el XLSX es
+# un ZIP con XML, así que la hoja se descomprime y parsea por bloques y
+# cada fila se descarta apenas se entrega. Lo único que queda en memoria es
+# la tabla de textos compartidos (sharedStrings), que tiene un valor por
+# texto distinto y no por celda. Los .xls (formato binario antiguo) no se
+# soportan.
+
+FIRMA_XLSX = b'PK\x03\x04'
+BLOQUE_LECTURA = 64 * 1024
+
+# Formatos de número integrados de Excel que corresponden a fechas
+FORMATOS_FECHA = set(range(14, 23)) | set(range(27, 37)) | set(range(45, 48)) | set(range(50, 59))
+_CODIGO_FECHA = re.compile(r'[dmy]', re.IGNORECASE)
+_LITERALES_FORMATO = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+EPOCA_EXCEL = date(1899, 12, 30)
+
+def es_xlsx(binario):
+    """True si el archivo empieza con la firma ZIP (un CSV nunca la tiene)"""
+    binario.seek(0)
+    firma = binario.read(len(FIRMA_XLSX))
+    binario.seek(0)
+    return firma == FIRMA_XLSX
+
+def _local(tag):
+    """Nombre de la etiqueta sin namespace (sirve para OOXML normal y strict)"""
+    return tag.rsplit('}', 1)[-1]
+
+def _atributo(elem, nombre):
+    """Atributo sin importar su namespace (r:id, por ejemplo)"""
+    for clave, valor in elem.attrib.items():
+        if _local(clave) == nombre:
+            return valor
+    return None
+
+@lru_cache(maxsize=1024)
+def _indice_letras(letras):
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+def _indice_columna(referencia):
+    """'A1' -> 0, 'AB7' -> 27"""
+    return _indice_letras(referencia.rstrip('0123456789'))
+
+# ========== PARTES DEL LIBRO ==========
+
+def _ruta_primera_hoja(zf):
+    """Ruta dentro del ZIP de la primera hoja del libro"""
+    try:
+        with zf.open('xl/workbook.xml') as origen:
+            r_id = next(_atributo(elem, 'id') for _, elem in iterparse(origen) if _local(elem.tag) == 'sheet')
+        with zf.open('xl/_rels/workbook.xml.rels') as origen:
+            destino = next(elem.get('Target') for _, elem in iterparse(origen)
+                           if _local(elem.tag) == 'Relationship' and elem.get('Id') == r_id)
+    except (KeyError, StopIteration):
+        return 'xl/worksheets/sheet1.xml'
+    if destino.startswith('/'):
+        return destino.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', destino))
+
+def _textos_compartidos(zf):
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    textos = []
+    with zf.open('xl/sharedStrings.xml') as origen:
+        for _, elem in iterparse(origen):
+            if _local(elem.tag) == 'si':
+                # Se omiten las guías fonéticas (rPh), que no son parte del texto
+                textos.append(''.join(
+                    t.text or '' for hijo in elem if _local(hijo.tag) != 'rPh'
+                    for t in hijo.iter() if _local(t.tag) == 't'
+                ))
+                elem.clear()
+    return textos
+
+def _estilos_fecha(zf):
+    """Índices de estilo de celda (atributo s) cuyo formato de número es una fecha"""
+    if 'xl/styles.xml' not in zf.namelist():
+        return set()
+    formatos_fecha = set(FORMATOS_FECHA)
+    estilos = []
+    with zf.open('xl/styles.xml') as origen:
+        en_cell_xfs = False
+        for evento, elem in iterparse(origen, events=('start', 'end')):
+            nombre = _local(elem.tag)
+            if evento == 'start':
+                en_cell_xfs = en_cell_xfs or nombre == 'cellXfs'
+                continue
+            if nombre == 'numFmt':
+                codigo = _LITERALES_FORMATO.sub('', elem.get('formatCode', ''))
+                if _CODIGO_FECHA.search(codigo):
+                    formatos_fecha.add(int(elem.get('numFmtId')))
+            elif nombre == 'xf' and en_cell_xfs:
+                estilos.append(int(elem.get('numFmtId', 0)))
+            elif nombre == 'cellXfs':
+                en_cell_xfs = False
+    return {i for i, formato in enumerate(estilos) if formato in formatos_fecha}
+
+# ========== VALORES DE CELDA ==========
+
+def _numero_a_texto(valor):
+    """
+    Número de Excel a texto con coma decimal, para que parsear_monto no
+    confunda 1.234 (decimal) con separador de miles.
+    """
+    try:
+        numero = Decimal(valor)
+    except InvalidOperation:
+        return valor
+    texto = format(numero.normalize(), 'f') if numero != numero.to_integral_value() else str(int(numero))
+    return texto.replace('.', ',')
+
+def _serial_a_fecha(valor):
+    return (EPOCA_EXCEL + timedelta(days=int(float(valor)))).isoformat()
+
+def _valor_celda(tipo, estilo, texto, textos, estilos_fecha):
+    if tipo == 'inlineStr' or tipo == 'str':
+        return texto
+    if not texto or tipo == 'e':
+        return ''
+    if tipo == 's':
+        return textos[int(texto)]
+    if tipo == 'd':
+        return texto[:10]
+    if tipo == 'n':
+        if estilo in estilos_fecha:
+            return _serial_a_fecha(texto)
+        return _numero_a_texto(texto)
+    return texto
+
+# ========== LECTOR ==========
+
+class LectorXlsx:
+    """
+    Recorre la primera hoja de un .xlsx como un csv.DictReader.
+
+    La primera fila es el encabezado (`fieldnames`); cada fila siguiente
+    se entrega como dict de textos, con '' en las celdas vacías. Las filas
+    vacías se omiten, igual que en el DictReader. Las fechas y números se
+    convierten a texto en formatos que entienden parse_utils.
+    """
+
+    def __init__(self, archivo):
+        binario = getattr(archivo, 'file', archivo)
+        binario.seek(0)
+        try:
+            self._zf = zipfile.ZipFile(binario)
+        except zipfile.BadZipFile:
+            raise ValueError('El archivo no es un XLSX válido')
+        self._hoja = _ruta_primera_hoja(self._zf)
+        if self._hoja not in self._zf.namelist():
+            raise ValueError('El XLSX no tiene hojas')
+        self._textos = _textos_compartidos(self._zf)
+        self._estilos_fecha = _estilos_fecha(self._zf)
+        self._filas = self._recorrer_hoja()
+        encabezado = next(self._filas, [])
+        self.fieldnames = [str(columna).strip().replace('\ufeff', '') for columna in encabezado]
+
+    def _recorrer_hoja(self):
+        """
+        Entrega las filas como listas de textos. Se usa expat directo (sin
+        armar elementos) y se alimenta por bloques, así solo viven en
+        memoria las filas del bloque actual.
+        """
+        listas = []
+        estado = {'valores': None, 'celda': None, 'partes': None, 'posicion': 0}
+        textos, estilos_fecha = self._textos, self._estilos_fecha
+
+        def inicio(nombre, atributos):
+            nombre = nombre.rpartition(':')[2]
+            if nombre == 'c':
+                estado['celda'] = (atributos.get('t', 'n'), int(atributos.get('s', 0)), atributos.get('r'))
+                estado['partes'] = []
+            elif nombre == 'row':
+                estado['valores'] = []
+                estado['posicion'] = 0
+            elif nombre in ('v', 't') and estado['celda'] is not None:
+                parser.CharacterDataHandler = estado['partes'].append
+
+        def fin(nombre):
+            nombre = nombre.rpartition(':')[2]
+            if nombre in ('v', 't'):
+                parser.CharacterDataHandler = None
+            elif nombre == 'c':
+                tipo, estilo, referencia = estado['celda']
+                valores = estado['valores']
+                indice = _indice_columna(referencia) if referencia else estado['posicion']
+                if indice >= len(valores):
+                    valores.extend([''] * (indice - len(valores) + 1))
+                valores[indice] = _valor_celda(tipo, estilo, ''.join(estado['partes']), textos, estilos_fecha)
+                estado['posicion'] = indice + 1
+                estado['celda'] = None
+            elif nombre == 'row':
+                if any(valor.strip() for valor in estado['valores']):
+                    listas.append(estado['valores'])
+                estado['valores'] = None
+
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = inicio
+        parser.EndElementHandler = fin
+        parser.buffer_text = True
+        with self._zf.open(self._hoja) as origen:
+            for bloque in iter(lambda: origen.read(BLOQUE_LECTURA), b''):
+                parser.Parse(bloque, False)
+                yield from listas
+                listas.clear()
+            parser.Parse(b'', True)
+            yield from listas
+
+    def __iter__(self):
+        columnas = self.fieldnames
+        for valores in self._filas:
+            valores.extend([''] * (len(columnas) - len(valores)))
+            yield dict(zip(columnas, valores))
+
+def leer_encabezados_xlsx(archivo):
+    """Columnas de la primera hoja, leyendo solo hasta la fila de encabezado"""
+    return LectorXlsx(archivo).fieldnames
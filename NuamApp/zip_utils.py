@@ -0,0 +1,146 @@
+# NuamApp/zip_utils.py
+import os
+import zipfile
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import Archivocarga, Corredor
+from .carga_utils import COLUMNAS_REQUERIDAS, EXTENSIONES_CARGA, leer_encabezados
+from .cola_utils import calcular_sha256, buscar_carga_previa, crear_trabajo, encolar_carga, guardar_archivo_carga
+
+# ========== MIEMBROS DEL ZIP ==========
+
+EXTENSIONES_ZIP = EXTENSIONES_CARGA + ('.pdf',)
+
+def _miembros_validos(zf):
+    """Entradas del ZIP que son CSV, XLSX o PDF (sin carpetas ni basura de macOS)"""
+    for info in zf.infolist():
+        nombre = os.path.basename(info.filename)
+        if info.is_dir() or not nombre or nombre.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        if nombre.lower().endswith(EXTENSIONES_ZIP):
+            yield info
+
+def _abrir_miembro(zf, info):
+    """Abre una entrada como File de Django; se descomprime a medida que se lee"""
+    archivo = File(zf.open(info), name=os.path.basename(info.filename))
+    archivo.size = info.file_size
+    return archivo
+
+def detectar_tipo_csv(columnas):
+    """Deduce el tipo de carga por las columnas del CSV o XLSX (None si no calza con ninguno)"""
+    for tipo in ('calificaciones', 'montos', 'factores'):
+        if all(col in columnas for col in COLUMNAS_REQUERIDAS[tipo]):
+            return tipo
+    return None
+
+def validar_zip(zf):
+    """Rechaza ZIPs con demasiadas entradas o demasiado grandes al descomprimir"""
+    miembros = list(_miembros_validos(zf))
+    max_miembros = getattr(settings, 'CARGA_ZIP_MAX_MIEMBROS', 200)
+    max_bytes = getattr(settings, 'CARGA_ZIP_MAX_BYTES', 500 * 1024 * 1024)
+    if not miembros:
+        raise ValueError('El ZIP no contiene archivos CSV, XLSX ni PDF')
+    if len(miembros) > max_miembros:
+        raise ValueError(f'El ZIP tiene {len(miembros)} archivos (máximo {max_miembros})')
+    if sum(info.file_size for info in miembros) > max_bytes:
+        raise ValueError(f'El ZIP descomprimido supera {max_bytes // (1024 * 1024)}MB')
+    return miembros
+
+# ========== ENCOLADO Y REPARTO ==========
+
+def _registrar_miembro(padre, usuario, nombre, tipo_archivo, estado, resultado=None, hash_sha256=None):
+    return Archivocarga.objects.create(
+        tipo_archivo=tipo_archivo,
+        fecha_carga=timezone.now(),
+        estado=estado,
+        archivo_url=nombre[:150],
+        fk_id_usuario=usuario,
+        resultado=resultado,
+        hash_sha256=hash_sha256,
+        fk_id_archivo_padre=padre
+    )
+
+def encolar_zip(archivo_zip, usuario, forzar=False):
+    """
+    Valida el ZIP y lo deja en la cola como una carga 'zip'.
+
+    Dentro del request solo se revisa el índice del ZIP (cantidad y tamaño
+    de sus archivos); el reparto lo hace el worker con repartir_zip. Los
+    archivos ya cargados por el usuario se omiten salvo `forzar`.
+    """
+    with zipfile.ZipFile(getattr(archivo_zip, 'file', archivo_zip)) as zf:
+        validar_zip(zf)
+    return encolar_carga('zip', archivo_zip, usuario, forzar=forzar)
+
+def _planificar_miembros(zf, usuario, corredor, forzar, guardados, heartbeat):
+    """
+    Lee cada entrada del ZIP y retorna (nombre, tipo, estado, resultado,
+    hash, ruta, tamaño) de su futura carga. Las que se van a procesar se
+    copian al storage (sus rutas quedan en `guardados`); las repetidas o
+    de tipo desconocido se registran sin trabajo.
+    """
+    plan = []
+    leidos = 0
+    for info in validar_zip(zf):
+        miembro = _abrir_miembro(zf, info)
+        leidos += info.compress_size
+        if miembro.name.lower().endswith('.pdf'):
+            tipo = 'pdf_calificaciones'
+        else:
+            tipo = detectar_tipo_csv(leer_encabezados(miembro))
+
+        if tipo is None:
+            plan.append((miembro.name, 'desconocido', 'error', 'Las columnas no corresponden a ningún tipo de carga',
+                         None, None, 0))
+            continue
+        if tipo != 'factores' and corredor is None:
+            plan.append((miembro.name, tipo, 'error', 'El usuario no tiene un corredor asociado', None, None, 0))
+            continue
+
+        hash_sha256 = calcular_sha256(miembro)
+        previa = None if forzar else buscar_carga_previa(usuario, tipo, hash_sha256)
+        if previa:
+            plan.append((miembro.name, tipo, 'repetido', f'Ya cargado en la carga #{previa.id_archivo}',
+                         hash_sha256, None, 0))
+            continue
+
+        ruta = guardar_archivo_carga(miembro)
+        guardados.append(ruta)
+        plan.append((miembro.name, tipo, 'pendiente', None, hash_sha256, ruta, miembro.size or 0))
+        heartbeat(0, 0, leidos)
+    return plan
+
+def repartir_zip(trabajo, heartbeat=lambda *avance: None):
+    """
+    Reparte el ZIP de un trabajo en un trabajo de la cola por archivo.
+
+    Cada CSV, XLSX o PDF queda como una carga propia bajo la del ZIP (con
+    el tipo deducido de sus columnas) y la procesa cualquier worker, igual
+    que una carga suelta; también se registran los que se omiten por
+    repetidos o desconocidos. Las cargas y sus trabajos se crean en una
+    sola transacción: si el reparto falla no queda ninguna y se borran los
+    archivos ya copiados, así un reintento parte de cero.
+    """
+    padre = trabajo.fk_id_archivo
+    if padre.miembros.exists():
+        # Un reintento después de que el reparto ya se confirmó
+        return
+    usuario = padre.fk_id_usuario
+    corredor = Corredor.objects.filter(fk_usuario=usuario).first()
+    guardados = []
+    try:
+        with default_storage.open(trabajo.ruta_archivo, 'rb') as archivo, zipfile.ZipFile(archivo) as zf:
+            plan = _planificar_miembros(zf, usuario, corredor, trabajo.forzar_recarga, guardados, heartbeat)
+        with transaction.atomic():
+            for nombre, tipo, estado, resultado, hash_sha256, ruta, tamano in plan:
+                if ruta is None:
+                    _registrar_miembro(padre, usuario, nombre, tipo, estado, resultado, hash_sha256)
+                else:
+                    crear_trabajo(tipo, ruta, nombre, tamano, usuario, hash_sha256=hash_sha256, padre=padre)
+    except Exception:
+        for ruta in guardados:
+            default_storage.delete(ruta)
+        raise
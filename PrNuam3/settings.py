@@ -88,7 +88,47 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Archivos subidos por usuarios
 # -----------------------------
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+# El worker de la cola de cargas lee los archivos subidos desde aquí: debe ver la misma carpeta que la web
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+
+# -----------------------------
+# Cargas masivas
+# -----------------------------
+CARGA_BATCH_SIZE = int(os.environ.get('CARGA_BATCH_SIZE', 1000))
+# Con True las cargas se encolan y las procesa `manage.py procesar_cargas` (ver Procfile y render.yaml);
+# activarlo solo donde corre ese worker. Con False se procesan dentro del request (desarrollo local)
+CARGAS_ASINCRONAS = os.environ.get('CARGAS_ASINCRONAS', 'False') == 'True'
+CARGA_TRABAJO_TIMEOUT = int(os.environ.get('CARGA_TRABAJO_TIMEOUT', 300))  # segundos sin heartbeat
+CARGA_TRABAJO_MAX_INTENTOS = int(os.environ.get('CARGA_TRABAJO_MAX_INTENTOS', 3))
+# Máximo de filas con error que se guardan en el reporte de cada carga (el conteo es exacto)
+CARGA_ERRORES_MAX_MUESTRAS = int(os.environ.get('CARGA_ERRORES_MAX_MUESTRAS', 1000))
+# Procesos para extraer PDFs en paralelo (por defecto, uno por CPU)
+CARGA_PROCESOS = int(os.environ.get('CARGA_PROCESOS', os.cpu_count() or 1))
+# Páginas por tarea al repartir la extracción de un PDF entre esos procesos
+CARGA_PDF_PAGINAS_POR_TAREA = int(os.environ.get('CARGA_PDF_PAGINAS_POR_TAREA', 10))
+# Caché en disco de la extracción por página de los PDF (se poda por LRU al superar el máximo)
+CARGA_PDF_CACHE_DIR = os.environ.get('CARGA_PDF_CACHE_DIR', str(BASE_DIR / 'cache' / 'pdf_paginas'))
+CARGA_PDF_CACHE_MAX_BYTES = int(os.environ.get('CARGA_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Límites de la extracción de un PDF; las páginas que no caben se omiten y la carga queda 'parcial'
+CARGA_PDF_MAX_PAGINAS = int(os.environ.get('CARGA_PDF_MAX_PAGINAS', 500))
+CARGA_PDF_SEGUNDOS_POR_PAGINA = int(os.environ.get('CARGA_PDF_SEGUNDOS_POR_PAGINA', 10))
+CARGA_PDF_SEGUNDOS_TOTAL = int(os.environ.get('CARGA_PDF_SEGUNDOS_TOTAL', 120))
+# Triaje: las páginas sin mercados o casi sin dígitos (portadas, texto legal) no pasan por el análisis completo
+CARGA_PDF_TRIAJE = os.environ.get('CARGA_PDF_TRIAJE', 'True') == 'True'
+CARGA_PDF_TRIAJE_MIN_DIGITOS = int(os.environ.get('CARGA_PDF_TRIAJE_MIN_DIGITOS', 6))
+CARGA_PDF_TRIAJE_DENSIDAD_DIGITOS = float(os.environ.get('CARGA_PDF_TRIAJE_DENSIDAD_DIGITOS', 0.01))
+# Límites de un ZIP de cargas (protección contra zip bombs)
+CARGA_ZIP_MAX_MIEMBROS = int(os.environ.get('CARGA_ZIP_MAX_MIEMBROS', 200))
+CARGA_ZIP_MAX_BYTES = int(os.environ.get('CARGA_ZIP_MAX_BYTES', 500 * 1024 * 1024))  # descomprimido
+# Subidas fragmentadas (reanudables) para archivos grandes
+CARGA_SUBIDA_MAX_BYTES = int(os.environ.get('CARGA_SUBIDA_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+CARGA_FRAGMENTO_BYTES = int(os.environ.get('CARGA_FRAGMENTO_BYTES', 5 * 1024 * 1024))
+CARGA_FRAGMENTO_MAX_BYTES = int(os.environ.get('CARGA_FRAGMENTO_MAX_BYTES', 16 * 1024 * 1024))
+CARGA_SUBIDA_EXPIRACION = int(os.environ.get('CARGA_SUBIDA_EXPIRACION', 24 * 3600))  # segundos sin actividad
+# Extracciones de PDF que quedan en staging sin confirmar
+CARGA_CONFIRMACION_EXPIRACION = int(os.environ.get('CARGA_CONFIRMACION_EXPIRACION', 24 * 3600))  # segundos
+# En PostgreSQL, ingesta de calificaciones con COPY + INSERT ... SELECT (en SQLite se ignora)
+CARGA_INGESTA_COPY = os.environ.get('CARGA_INGESTA_COPY', 'False') == 'True'
 
 # -----------------------------
 # Login
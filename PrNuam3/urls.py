@@ -29,9 +29,19 @@ urlpatterns = [
     path('carga-montos/', views.carga_masiva_montos, name='carga_montos'),
     path('listado-cargas/', views.listado_cargas, name='listado_cargas'),
     path('carga-masiva-calificaciones/', views.carga_masiva_calificaciones, name='carga_masiva_calificaciones'),
+    path('carga-zip/', views.carga_zip, name='carga_zip'),
     path('detalles-carga/<int:carga_id>/', views.ver_detalles_carga, name='detalles_carga'),
+    path('detalles-carga/<int:carga_id>/progreso/', views.progreso_carga, name='progreso_carga'),
+    path('detalles-carga/<int:carga_id>/errores/', views.descargar_errores_carga, name='descargar_errores_carga'),
     path('descargar-carga/<int:carga_id>/', views.descargar_reporte_carga, name='descargar_carga'),
+    # SUBIDA FRAGMENTADA (archivos grandes, reanudable)
+    path('api/subidas/', views.subida_iniciar, name='subida_iniciar'),
+    path('api/subidas/<int:subida_id>/', views.subida_detalle, name='subida_detalle'),
+    path('api/subidas/<int:subida_id>/fragmento/', views.subida_fragmento, name='subida_fragmento'),
+    path('api/subidas/<int:subida_id>/completar/', views.subida_completar, name='subida_completar'),
     path('extraer-datos-pdf/', views.extraer_datos_pdf, name='extraer_datos_pdf'),
+    path('extraer-datos-pdf/stream/', views.extraer_datos_pdf_stream, name='extraer_datos_pdf_stream'),
+    path('confirmar-datos-pdf/<int:carga_id>/', views.confirmar_datos_pdf, name='confirmar_datos_pdf'),
     path('guardar-datos-pdf/', views.guardar_datos_extraidos, name='guardar_datos_extraidos'),
     # ERROR DE PERMISOS
     path("no-autorizado/", views.no_autorizado, name="no_autorizado"),